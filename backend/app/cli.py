@@ -0,0 +1,109 @@
+"""
+maintenance commands, run from the backend directory:
+
+    python -m app.cli rebuild-rollups [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+    python -m app.cli partitions list
+    python -m app.cli partitions create --start YYYY-MM --end YYYY-MM
+    python -m app.cli partitions detach --before YYYY-MM [--drop] [--keep-aggregates]
+"""
+import argparse
+import logging
+from datetime import date
+from app.database import SessionLocal, engine
+from app.models import create_tables
+from app.services import category_service, partition_service, rollup_service
+
+
+def rebuild_rollups(args):
+    db = SessionLocal()
+    try:
+        rows = rollup_service.rebuild_rollup(db, start_date=args.start, end_date=args.end)
+        customers = rollup_service.rebuild_customer_totals(db)
+    finally:
+        db.close()
+    print(f"rebuilt {rows} daily rollup rows and totals for {customers} customers")
+
+
+def list_partitions(args):
+    db = SessionLocal()
+    try:
+        partitions = partition_service.list_partitions(db)
+    finally:
+        db.close()
+    if not partitions:
+        print("no partitions, the sales table is not partitioned")
+        return
+    for partition in partitions:
+        print(f"{partition['month']}  {partition['name']}  ~{partition['estimated_rows']} rows")
+
+
+def create_partitions(args):
+    db = SessionLocal()
+    try:
+        created = partition_service.create_partitions(db, args.start, args.end)
+    finally:
+        db.close()
+    print(f"created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+
+
+def detach_partitions(args):
+    db = SessionLocal()
+    try:
+        removed = partition_service.detach_partitions(
+            db, args.before, drop=args.drop, keep_aggregates=args.keep_aggregates
+        )
+    finally:
+        db.close()
+    action = "dropped" if args.drop else "detached"
+    print(f"{action} {len(removed)} partitions" + (f": {', '.join(removed)}" if removed else ""))
+
+
+def month(value: str) -> date:
+    # YYYY-MM, or a full date in that month
+    return date.fromisoformat(value + "-01" if len(value) == 7 else value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="business dashboard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-rollups",
+        help="recompute the daily revenue rollup and customer totals from the sales table (pause uploads while it runs)"
+    )
+    rebuild.add_argument("--start", type=date.fromisoformat, default=None, help="first day of the daily rollup to rebuild")
+    rebuild.add_argument("--end", type=date.fromisoformat, default=None, help="last day of the daily rollup to rebuild")
+    rebuild.set_defaults(handler=rebuild_rollups)
+
+    partitions = commands.add_parser("partitions", help="manage the monthly partitions of the sales table (postgres)")
+    actions = partitions.add_subparsers(dest="action", required=True)
+    actions.add_parser("list", help="list the attached partitions").set_defaults(handler=list_partitions)
+
+    create = actions.add_parser("create", help="create partitions ahead of time (uploads create missing ones anyway)")
+    create.add_argument("--start", type=month, required=True, help="first month, YYYY-MM")
+    create.add_argument("--end", type=month, required=True, help="last month, YYYY-MM")
+    create.set_defaults(handler=create_partitions)
+
+    detach = actions.add_parser(
+        "detach",
+        help="detach the partitions of months before --before, they're kept as <name>_detached tables"
+    )
+    detach.add_argument("--before", type=month, required=True, help="first month to keep, YYYY-MM")
+    detach.add_argument("--drop", action="store_true", help="drop the partitions instead of keeping them")
+    detach.add_argument(
+        "--keep-aggregates", action="store_true",
+        help="leave the rollup and customer totals alone, stats keep counting the removed sales"
+    )
+    detach.set_defaults(handler=detach_partitions)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if partition_service.PARTITIONING_ENABLED:
+        partition_service.create_partitioned_sales(engine)
+    create_tables()
+    category_service.migrate_category_column(engine)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
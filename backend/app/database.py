@@ -12,7 +12,10 @@ if env_path.exists():
 # default to sqlite for local dev, can override with DATABASE_URL env var for postgres
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./business_dashboard.db")
 
-engine = create_engine(DATABASE_URL)
+# sqlite connections get handed between request threads and background ingest workers
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # fastapi dependency that gives each request its own db session
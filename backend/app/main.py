@@ -5,6 +5,8 @@ from pathlib import Path
 
 from app.routers import upload, stats, sales, transform, auth, ai
 from app.models import create_tables
+from app.database import SessionLocal, engine
+from app.services import category_service, columnar_service, ingest_service, partition_service, rollup_service, sales_service, upload_session_service
 
 # load .env file if it exists in the backend directory
 env_path = Path(__file__).parent.parent / '.env'
@@ -41,10 +43,29 @@ app.include_router(sales.router)
 app.include_router(transform.router)
 app.include_router(ai.router)
 
-# create tables when the app starts
+# create tables when the app starts and pick up upload jobs a restart interrupted
 @app.on_event("startup")
 async def startup_event():
+    # a new postgres database gets a partitioned sales table when it's turned on
+    if partition_service.PARTITIONING_ENABLED:
+        partition_service.create_partitioned_sales(engine)
     create_tables()
+    # databases from before the categories table still have the text column
+    category_service.migrate_category_column(engine)
+    # and the ones from before re-uploads were deduped have no row hashes
+    sales_service.migrate_row_hash_column(engine)
+    db = SessionLocal()
+    try:
+        # first start after upgrading an existing database
+        rollup_service.ensure_rollup(db)
+        upload_session_service.expire_stale_sessions(db)
+    finally:
+        db.close()
+    # only once the schema and the rollup are in place, resumed jobs write to both
+    ingest_service.resume_pending_jobs(SessionLocal)
+    # loads in the background, stats use sql until it's ready
+    if columnar_service.COLUMNAR_STORE_ENABLED:
+        columnar_service.schedule_reload(engine)
 
 # health check endpoint
 @app.get("/")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, Date, Index, DateTime
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Date, Index, DateTime, Text, JSON, ForeignKey, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from app.database import engine
@@ -6,6 +6,16 @@ from app.database import engine
 Base = declarative_base()
 
 
+class Category(Base):
+    """
+    category names, sales and the rollup store the small integer id instead of the text
+    """
+    __tablename__ = "categories"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
 class Sale(Base):
     """
     single sale transaction in the database
@@ -15,16 +25,64 @@ class Sale(Base):
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False, index=True)
     amount = Column(Float, nullable=False)
-    category = Column(String, nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     customerID = Column(Integer, nullable=False)
+    # natural-key hash of the row, the unique index makes re-uploads idempotent
+    row_hash = Column(String(32), nullable=True)
     
     # indexes on date and category since we query by those a lot
     __table_args__ = (
         Index('idx_date', 'date'),
-        Index('idx_category', 'category'),
+        # keyset pagination walks this backwards, newest first
+        Index('idx_date_id', 'date', 'id'),
+        Index('idx_category_id', 'category_id'),
+        Index('idx_row_hash', 'row_hash', unique=True),
     )
 
 
+class DailyCategoryRevenue(Base):
+    """
+    revenue and sale count per day and category, kept up to date by every sales insert
+    so stats queries don't have to scan the sales table
+    """
+    __tablename__ = "daily_category_revenue"
+    
+    date = Column(Date, primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    revenue = Column(Float, nullable=False, default=0)
+    sale_count = Column(BigInteger, nullable=False, default=0)
+
+
+class CustomerTotal(Base):
+    """
+    lifetime spend per customer, kept up to date by every sales insert
+    """
+    __tablename__ = "customer_totals"
+    
+    customerID = Column(Integer, primary_key=True)
+    total_spent = Column(Float, nullable=False, default=0)
+    transaction_count = Column(BigInteger, nullable=False, default=0)
+    first_purchase = Column(Date, nullable=False)
+    last_purchase = Column(Date, nullable=False)
+    
+    # top customers are read straight off this index
+    __table_args__ = (
+        Index('idx_customer_totals_spent', 'total_spent'),
+    )
+
+
+class SalesSummary(Base):
+    """
+    single row of running totals so counts don't need a scan
+    """
+    __tablename__ = "sales_summary"
+    
+    id = Column(Integer, primary_key=True)
+    sale_count = Column(BigInteger, nullable=False, default=0)
+    customer_count = Column(BigInteger, nullable=False, default=0)
+    total_revenue = Column(Float, nullable=False, default=0)
+
+
 class User(Base):
     """
     user account in the database
@@ -37,5 +95,101 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
 
+class UploadedFile(Base):
+    """
+    content fingerprint of every file that was fully ingested, so an identical
+    re-upload can be skipped with one index lookup
+    """
+    __tablename__ = "uploaded_files"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    rows_inserted = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class IngestJob(Base):
+    """
+    background upload ingest job, kept in the database so it survives an api restart
+    """
+    __tablename__ = "ingest_jobs"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    # staged copy of the upload the worker reads from
+    file_path = Column(String, nullable=False)
+    fingerprint = Column(String(64), nullable=True)
+    # csv, parquet or arrow
+    file_format = Column(String, nullable=False, default="csv")
+    # gzip, bz2, xz or zstd when the staged file is compressed
+    compression = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="queued")
+    chunk_size = Column(Integer, nullable=False)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    bytes_processed = Column(BigInteger, nullable=False, default=0)
+    chunks_processed = Column(Integer, nullable=False, default=0)
+    rows_processed = Column(BigInteger, nullable=False, default=0)
+    rows_inserted = Column(BigInteger, nullable=False, default=0)
+    rows_rejected = Column(BigInteger, nullable=False, default=0)
+    rows_duplicate = Column(BigInteger, nullable=False, default=0)
+    # merged validation results so far, and the final summary once done
+    warnings = Column(JSON, nullable=False, default=list)
+    errors = Column(JSON, nullable=False, default=list)
+    summary = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class UploadSession(Base):
+    """
+    resumable upload, the parts are staged on disk until the client completes it
+    """
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    # number of parts the client said it will send, if it knew up front
+    total_parts = Column(Integer, nullable=True)
+    # open, completed, failed or aborted
+    status = Column(String, nullable=False, default="open")
+    fingerprint = Column(String(64), nullable=True)
+    # background job that ingests the assembled file
+    job_id = Column(String, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # last part received, stale sessions are expired on this
+    last_activity_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# indexes added to tables that already existed, create_all only indexes new tables
+ADDED_INDEXES = ("idx_date_id",)
+
+# nullable columns added to tables that already existed, as (table, column)
+ADDED_COLUMNS = (("upload_sessions", "last_activity_at"),)
+
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    for table_name, column_name in ADDED_COLUMNS:
+        if column_name in {column["name"] for column in inspector.get_columns(table_name)}:
+            continue
+        column = Base.metadata.tables[table_name].c[column_name]
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN "
+                f"{preparer.quote(column_name)} {column.type.compile(dialect=engine.dialect)}"
+            ))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in ADDED_INDEXES:
+                index.create(bind=engine, checkfirst=True)
\ No newline at end of file
@@ -1,14 +1,13 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, false, or_, tuple_
 from datetime import datetime, date
 from typing import Optional, List
-import pandas as pd
-import io
 from app.database import get_db
-from app.models import Sale, User
+from app.models import Category, Sale, User
 from app.routers.auth import get_current_user
+from app.services import category_service, export_service, search_service
 
 router = APIRouter(prefix="/sales", tags=["sales"])
 
@@ -24,21 +23,37 @@ async def search_sales(
     max_amount: Optional[float] = Query(None, description="Maximum amount"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of results"),
     offset: int = Query(0, ge=0, description="Number of results to skip"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page, use instead of offset"),
+    exact_total: bool = Query(False, description="Count every match instead of estimating the total"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     search and filter sales with pagination
     supports filtering by date, category, customer, and amount ranges
+    pages are newest first, following next_cursor (after=) reads each page straight off
+    the (date, id) index however deep it is, offset still works but gets slower with depth
+    total is exact when only date and category filters are used (it comes from the
+    rollup), otherwise it's the planner's estimate unless exact_total is set
     """
-    query = db.query(Sale)
+    if after and offset:
+        raise HTTPException(status_code=400, detail="use either after or offset, not both")
+    
+    query = db.query(
+        Sale.id, Sale.date, Sale.amount, Category.name.label('category'), Sale.customerID
+    ).join(Category, Category.id == Sale.category_id)
     
     # build up filters based on query params
     filters = []
+    # the date range and category, if those are the only filters the rollup can count them
+    range_start = None
+    range_end = None
+    category_id = None
     
-    # exact category match (for drill-down)
+    # exact category match (for drill-down), filtered on the integer key
     if category:
-        filters.append(Sale.category == category)
+        category_id = category_service.find_category_id(category, db)
+        filters.append(Sale.category_id == category_id if category_id is not None else false())
     
     if customer_id:
         filters.append(Sale.customerID == customer_id)
@@ -48,6 +63,7 @@ async def search_sales(
         try:
             target_date = datetime.strptime(date, "%Y-%m-%d").date()
             filters.append(Sale.date == target_date)
+            range_start = range_end = target_date
         except ValueError:
             raise HTTPException(status_code=400, detail="invalid date format. use YYYY-MM-DD")
     
@@ -56,6 +72,7 @@ async def search_sales(
         try:
             start = datetime.strptime(start_date, "%Y-%m-%d").date()
             filters.append(Sale.date >= start)
+            range_start = max(start, range_start) if range_start else start
         except ValueError:
             raise HTTPException(status_code=400, detail="invalid start_date format. use YYYY-MM-DD")
     
@@ -63,6 +80,7 @@ async def search_sales(
         try:
             end = datetime.strptime(end_date, "%Y-%m-%d").date()
             filters.append(Sale.date <= end)
+            range_end = min(end, range_end) if range_end else end
         except ValueError:
             raise HTTPException(status_code=400, detail="invalid end_date format. use YYYY-MM-DD")
     
@@ -76,11 +94,34 @@ async def search_sales(
     if filters:
         query = query.filter(and_(*filters))
     
-    # get total count before pagination
-    total_count = query.count()
-    
-    # apply pagination and order by date descending
-    sales = query.order_by(Sale.date.desc()).offset(offset).limit(limit).all()
+    # total before pagination, counting every match is the slow part so avoid it
+    total_is_estimate = False
+    if category and category_id is None:
+        total_count = 0
+    elif customer_id is None and min_amount is None and max_amount is None:
+        total_count = search_service.rollup_count(db, range_start, range_end, category_id)
+    else:
+        total_count = None if exact_total else search_service.estimate_count(query, db)
+        if total_count is None:
+            total_count = query.count()
+        else:
+            total_is_estimate = True
+    
+    # newest first, id breaks ties so the order (and the cursor) is stable
+    page = query.order_by(Sale.date.desc(), Sale.id.desc())
+    if after:
+        try:
+            cursor_date, cursor_id = search_service.decode_cursor(after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        page = page.filter(tuple_(Sale.date, Sale.id) < tuple_(cursor_date, cursor_id))
+    else:
+        page = page.offset(offset)
+    
+    # one extra row tells us if there's another page without relying on the total
+    sales = page.limit(limit + 1).all()
+    has_more = len(sales) > limit
+    sales = sales[:limit]
     
     # format results as list of dicts
     results = [
@@ -97,9 +138,11 @@ async def search_sales(
     return {
         "results": results,
         "total": total_count,
+        "total_is_estimate": total_is_estimate,
         "limit": limit,
         "offset": offset,
-        "has_more": (offset + limit) < total_count
+        "has_more": has_more,
+        "next_cursor": search_service.encode_cursor(sales[-1].date, sales[-1].id) if has_more else None
     }
 
 
@@ -109,18 +152,27 @@ async def export_sales(
     customer_id: Optional[int] = Query(None, description="Filter by customer ID"),
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    export_format: str = Query("csv", alias="format", description="csv, ndjson, parquet or arrow"),
     db: Session = Depends(get_db)
 ):
     """
-    export filtered sales as csv file download
+    export filtered sales as a csv, ndjson, parquet or arrow ipc stream file download
+    rows are streamed from the database in batches and written as they arrive, so
+    memory stays flat however big the export is
     """
-    query = db.query(Sale)
+    if export_format not in export_service.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"format must be one of: {', '.join(export_service.EXPORT_FORMATS)}"
+        )
+    if export_format in export_service.ARROW_FORMATS and not export_service.PYARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail=f"pyarrow library not installed, can't export {export_format}")
     
     # same filter logic as search endpoint
     filters = []
     
     if category:
-        filters.append(Sale.category.ilike(f"%{category}%"))
+        filters.append(Category.name.ilike(f"%{category}%"))
     
     if customer_id:
         filters.append(Sale.customerID == customer_id)
@@ -139,40 +191,17 @@ async def export_sales(
         except ValueError:
             raise HTTPException(status_code=400, detail="invalid end_date format. use YYYY-MM-DD")
     
-    if filters:
-        query = query.filter(and_(*filters))
-    
-    sales = query.order_by(Sale.date.desc()).all()
-    
-    if not sales:
+    statement = export_service.export_statement(filters)
+    if not export_service.has_rows(statement, db):
         raise HTTPException(status_code=404, detail="no sales found matching the criteria")
     
-    # convert to dataframe
-    data = [
-        {
-            "id": sale.id,
-            "date": str(sale.date),
-            "amount": sale.amount,
-            "category": sale.category,
-            "customerID": sale.customerID
-        }
-        for sale in sales
-    ]
-    
-    df = pd.DataFrame(data)
-    
-    # create csv in memory
-    output = io.StringIO()
-    df.to_csv(output, index=False)
-    output.seek(0)
-    
     # generate filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"sales_export_{timestamp}.csv"
+    media_type, extension = export_service.EXPORT_FORMATS[export_format]
+    filename = f"sales_export_{timestamp}.{extension}"
     
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        export_service.stream_export(statement, db.get_bind(), export_format),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
-
@@ -1,7 +1,9 @@
+from typing import Optional
+from datetime import date
 from fastapi import APIRouter, Query, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 from app.database import get_db
-from app.services import sales_service, forecast_service, anomaly_service
+from app.services import sales_service, forecast_service, forecast_job_service, anomaly_service, dashboard_service, fitting_service, stats_cache_service
 from app.routers.auth import get_current_user
 from app.models import User
 
@@ -10,15 +12,55 @@ router = APIRouter(prefix="/stats", tags=["stats"])
 
 @router.get("/revenue")
 async def get_revenue(
-    range_days: int = Query(30, ge=1, le=365),
+    range_days: int = Query(30, ge=1, le=3650),
+    granularity: str = Query("day", description="Bucket size: day, week, month or quarter"),
+    start_date: Optional[date] = Query(None, description="First day of the range, overrides range_days"),
+    end_date: Optional[date] = Query(None, description="Last day of the range, defaults to today"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    get revenue stats for the last N days
+    get revenue stats for the last N days (or start_date..end_date), bucketed by granularity
     """
-    revenue_data = sales_service.get_revenue(range_days, db)
-    return {"data": revenue_data, "range_days": range_days}
+    if granularity not in sales_service.GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"granularity must be one of: {', '.join(sales_service.GRANULARITIES)}"
+        )
+    # end_date defaults to today, a start_date in the future is just as empty a range
+    if start_date is not None and start_date > (end_date or date.today()):
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date (today if not given)")
+    
+    def compute():
+        revenue_data = sales_service.get_revenue(
+            range_days, db, granularity=granularity, start_date=start_date, end_date=end_date
+        )
+        return {"data": revenue_data, "range_days": range_days, "granularity": granularity}
+    
+    return stats_cache_service.cached(db, "revenue", (range_days, granularity, start_date, end_date), compute)
+
+
+@router.get("/dashboard")
+def get_dashboard(
+    range_days: int = Query(30, ge=1, le=3650),
+    top_k: int = Query(5, ge=1, le=100, description="Number of top customers to return"),
+    include_anomalies: bool = Query(True, description="Run anomaly detection on the revenue window"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    revenue, category breakdown, customer stats and anomalies in one request
+    same results as the separate endpoints, which stay for other clients
+    """
+    try:
+        return stats_cache_service.cached(
+            db, "dashboard", (range_days, top_k, include_anomalies),
+            lambda: dashboard_service.get_dashboard(
+                db, range_days=range_days, top_k=top_k, include_anomalies=include_anomalies
+            )
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"dashboard error: {str(e)}")
 
 
 @router.get("/by-category")
@@ -29,43 +71,129 @@ async def get_by_category(
     """
     get sales broken down by category with totals and percentages
     """
-    category_data = sales_service.get_sales_by_category(db)
+    category_data = stats_cache_service.cached(
+        db, "by-category", (), lambda: sales_service.get_sales_by_category(db)
+    )
     return category_data
 
 
 @router.get("/customers")
 async def get_customer_stats(
+    top_k: int = Query(5, ge=1, le=100, description="Number of top customers to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     get customer stats like total customers, avg spending, top customers
     """
-    customer_stats = sales_service.get_customer_stats(db)
+    customer_stats = stats_cache_service.cached(
+        db, "customers", (top_k,), lambda: sales_service.get_customer_stats(db, top_k=top_k)
+    )
     return customer_stats
 
 
 @router.get("/forecast")
-async def get_forecast(
+def get_forecast(
     period: int = Query(30, ge=7, le=90, description="Forecast period in days"),
+    engine: Optional[str] = Query(None, description="prophet, ets or auto (default FORECAST_ENGINE)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     forecast revenue for the next N days using prophet time-series model
     returns predicted values with 95% confidence intervals
+    a plain def so it waits for the fit on a threadpool thread, not the event loop
     """
     try:
-        forecast_data = forecast_service.forecast_revenue(period, db)
+        forecast_data = forecast_service.forecast_revenue(period, db, engine=engine)
         return forecast_data
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except fitting_service.FitTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"forecasting error: {str(e)}")
 
 
+@router.get("/forecast/by-category")
+def get_forecast_by_category(
+    period: int = Query(30, ge=7, le=90, description="Forecast period in days"),
+    engine: Optional[str] = Query(None, description="prophet, ets or auto (default FORECAST_ENGINE)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    forecast every category's revenue for the next N days in one payload
+    models are fitted in parallel and only for categories whose history changed
+    """
+    try:
+        return forecast_service.forecast_by_category(period, db, engine=engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except fitting_service.FitTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"forecasting error: {str(e)}")
+
+
+@router.post("/forecast/jobs", status_code=202)
+async def submit_forecast_job(
+    period: int = Query(30, ge=7, le=90, description="Forecast period in days"),
+    engine: Optional[str] = Query(None, description="prophet, ets or auto (default FORECAST_ENGINE)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    start a forecast in the background, poll /stats/forecast/jobs/{job_id} for the result
+    """
+    try:
+        return forecast_job_service.submit_forecast_job(
+            period, current_user.id, sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False), engine=engine
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/forecast/jobs")
+async def list_forecast_jobs(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    list the current user's forecast jobs, newest first
+    """
+    return {"jobs": forecast_job_service.list_jobs(current_user.id)}
+
+
+@router.get("/forecast/jobs/{job_id}")
+async def get_forecast_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    status of a forecast job, with the forecast once it's completed
+    """
+    job = forecast_job_service.get_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="forecast job not found")
+    return job
+
+
+@router.delete("/forecast/jobs/{job_id}")
+async def cancel_forecast_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    cancel a queued or running forecast job
+    """
+    job = forecast_job_service.cancel_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="forecast job not found")
+    return job
+
+
 @router.get("/anomalies")
-async def get_anomalies(
+def get_anomalies(
     range_days: int = Query(90, ge=7, le=365, description="Number of days to analyze"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -75,9 +203,24 @@ async def get_anomalies(
     returns dates, revenue values, and detected anomalies with scores
     """
     try:
-        anomaly_data = anomaly_service.detect_anomalies(range_days, db)
+        anomaly_data = stats_cache_service.cached(
+            db, "anomalies", (range_days,), lambda: anomaly_service.detect_anomalies(range_days, db)
+        )
         return anomaly_data
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except fitting_service.FitTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"anomaly detection error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"anomaly detection error: {str(e)}")
+
+
+@router.get("/cache")
+async def get_cache_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    hit/miss counters, size and data version of the stats cache
+    """
+    return stats_cache_service.cache_stats(db.get_bind())
@@ -1,10 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
 from sqlalchemy.orm import Session
-import pandas as pd
 import json
 from typing import Optional
 from app.database import get_db
-from app.services import transform_service
+from app.services import transform_service, reader_service
 from app.routers.auth import get_current_user
 from app.models import User
 
@@ -21,26 +20,27 @@ async def preview_transform(
     current_user: User = Depends(get_current_user)
 ):
     """
-    preview transformations on csv data
+    preview transformations on csv, parquet or arrow data
     returns first 20 rows of transformed data
     """
     
-    # validate file is csv
-    if not file.filename or not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="file must be a csv file")
+    # validate file is a format we can read
+    file_format = reader_service.detect_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="file must be a csv, parquet or arrow file")
     
-    # read csv into dataframe
+    compression = reader_service.detect_compression(file.filename)
+    if compression is not None and file_format != "csv":
+        raise HTTPException(status_code=400, detail="only csv files can be compressed")
+    
+    # read file into dataframe
     try:
-        df = pd.read_csv(file.file)
-    except pd.errors.EmptyDataError:
-        raise HTTPException(status_code=400, detail="csv file is empty")
-    except pd.errors.ParserError as e:
-        raise HTTPException(status_code=400, detail=f"error parsing csv: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"error reading csv: {str(e)}")
+        df = reader_service.read_frame(reader_service.open_upload(file.file, compression), file_format)
+    except reader_service.FileReadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     if df.empty:
-        raise HTTPException(status_code=400, detail="csv file contains no data rows")
+        raise HTTPException(status_code=400, detail=f"{file_format} file contains no data rows")
     
     # parse transform rules from json strings
     rename_dict = None
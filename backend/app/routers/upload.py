@@ -1,60 +1,114 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
-import pandas as pd
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Path, Request
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session, sessionmaker
 from app.database import get_db
-from app.services import sales_service, validation_service
+from app.services import sales_service, validation_service, ingest_service, reader_service, batch_service, upload_session_service
 from app.routers.auth import get_current_user
-from app.models import User
+from app.models import User, IngestJob, UploadSession
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
 
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_parts: Optional[int] = Field(None, ge=1, le=upload_session_service.MAX_PARTS)
+
+
+# size limit for in-memory uploads, for compressed files it applies to the decompressed bytes
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+
 @router.post("/csv")
-async def upload_csv(
+def upload_csv(
     file: UploadFile = File(...),
+    stream: bool = Query(False, description="Read the file in chunks, committing each chunk separately (no size limit)"),
+    background: bool = Query(False, description="Queue the file as a background job and return a job id right away"),
+    chunk_size: int = Query(ingest_service.DEFAULT_CHUNK_SIZE, ge=10, le=1000000, description="Rows per chunk in stream/background mode"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    upload csv file and insert sales data into the database
+    upload a csv, parquet or arrow ipc file and insert sales data into the database
+    csv can be gzip, bz2, xz or zstd compressed (sales.csv.gz), it is decompressed while parsing
+    parquet and arrow are read column-wise, typed date and number columns skip string parsing
+    in stream mode the file is validated and inserted chunk by chunk so memory stays flat
+    in background mode the same chunked ingest runs in a worker, poll /upload/jobs/{job_id}
     """
     
-    # make sure it's actually a csv file
-    if not file.filename or not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="file must be a csv file")
+    # make sure it's a format we can read
+    file_format = reader_service.detect_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="file must be a csv, parquet or arrow file")
+    
+    compression = reader_service.detect_compression(file.filename)
+    if compression is not None and file_format != "csv":
+        raise HTTPException(status_code=400, detail="only csv files can be compressed")
     
     # check file size, limit to 10mb
     file.file.seek(0, 2)
     file_size = file.file.tell()
     file.file.seek(0)
     
-    if file_size > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="file size exceeds 10mb limit")
-    
     if file_size == 0:
         raise HTTPException(status_code=400, detail="file is empty")
     
-    # read the csv into a dataframe
+    # refused before it's read at all, only stream and background take bigger files
+    if file_size > MAX_UPLOAD_BYTES and not (stream or background):
+        raise HTTPException(status_code=400, detail="file size exceeds 10mb limit, use stream=true for large files")
+    
+    # an identical file that was already ingested is skipped without reading it again
+    fingerprint = ingest_service.fingerprint_file(file.file)
+    previous = ingest_service.find_uploaded_file(fingerprint, db)
+    if previous is not None:
+        return {
+            "message": "file was already uploaded, skipped",
+            "skipped": True,
+            "rows_inserted": 0,
+            "filename": file.filename,
+            "fingerprint": fingerprint,
+            "previous_upload": {
+                "filename": previous.filename,
+                "rows_inserted": previous.rows_inserted,
+                "uploaded_at": previous.created_at.isoformat() if previous.created_at else None
+            }
+        }
+    
+    if background:
+        job = ingest_service.create_ingest_job(
+            file.file, file.filename, current_user.id, db,
+            chunk_size=chunk_size, fingerprint=fingerprint,
+            file_format=file_format, compression=compression
+        )
+        # the worker gets its own sessions on the same database as this request
+        ingest_service.submit_ingest_job(job.id, sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False))
+        return {
+            "message": f"{file_format} queued for background ingestion",
+            "job_id": job.id,
+            "status": job.status,
+            "filename": file.filename
+        }
+    
+    if stream:
+        return _upload_stream(file, file_format, compression, chunk_size, fingerprint, current_user, db)
+    
+    # read the file into a dataframe, compressed files are inflated as they are parsed
     try:
-        df = pd.read_csv(file.file)
-    except pd.errors.EmptyDataError:
-        raise HTTPException(status_code=400, detail="csv file is empty")
-    except pd.errors.ParserError as e:
-        raise HTTPException(status_code=400, detail=f"error parsing csv: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"error reading csv: {str(e)}")
+        source = reader_service.open_upload(file.file, compression, max_bytes=MAX_UPLOAD_BYTES)
+        df = reader_service.read_frame(source, file_format)
+    except reader_service.DecompressedSizeError as e:
+        raise HTTPException(status_code=400, detail=f"{str(e)}, use stream=true for large files")
+    except reader_service.FileReadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     if df.empty:
-        raise HTTPException(status_code=400, detail="csv file contains no data rows")
+        raise HTTPException(status_code=400, detail=f"{file_format} file contains no data rows")
     
     # validate the data using validation service
     warnings, errors = validation_service.validate_csv_data(df)
     
-    # if there are severe errors (missing columns, empty data, >50% type errors), block upload
-    severe_error_types = ['missing_columns', 'empty_data']
-    has_severe_errors = any(error.get('type') in severe_error_types for error in errors)
-    
-    if has_severe_errors:
+    # if there are severe errors (missing columns, empty data), block upload
+    if validation_service.has_severe_errors(errors):
         error_messages = [error.get('message', 'unknown error') for error in errors]
         raise HTTPException(
             status_code=400,
@@ -62,33 +116,247 @@ async def upload_csv(
         )
     
     # drop rows with missing required data before insertion
-    required_columns = ['date', 'amount', 'category', 'customerID']
-    df_clean = df.dropna(subset=required_columns)
+    df_clean = df.dropna(subset=sales_service.REQUIRED_COLUMNS)
     
     if df_clean.empty:
         raise HTTPException(status_code=400, detail="no valid data rows after removing empty entries")
     
-    # convert cleaned dataframe to list of dicts for the service layer
-    sales_list = df_clean.to_dict('records')
-    
-    # insert into database
+    # insert the dataframe directly, no per-row dicts or orm objects
     try:
-        count = sales_service.insert_sales(sales_list, db)
+        result = sales_service.bulk_insert_sales(df_clean, db)
+        ingest_service.record_uploaded_file(fingerprint, file.filename, current_user.id, result["inserted"], db)
         
         # generate validation summary
         summary = validation_service.get_validation_summary(df, warnings, errors)
         
         return {
-            "message": "csv uploaded successfully",
-            "rows_inserted": count,
+            "message": f"{file_format} uploaded successfully",
+            "rows_inserted": result["inserted"],
+            "rows_duplicate": result["duplicates"],
+            "rows_rejected": len(df) - result["inserted"] - result["duplicates"],
             "filename": file.filename,
             "warnings": warnings,
             "errors": errors,
             "summary": summary
         }
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"error inserting data: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+def _upload_stream(
+    file: UploadFile,
+    file_format: str,
+    compression: Optional[str],
+    chunk_size: int,
+    fingerprint: str,
+    current_user: User,
+    db: Session
+):
+    """
+    chunked ingest for large files, each chunk is committed in its own transaction
+    parquet is read one row group at a time, compressed csv is decompressed as it streams
+    """
+    try:
+        source = reader_service.open_upload(file.file, compression)
+        result = ingest_service.ingest_stream(source, db, chunk_size=chunk_size, file_format=file_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"error inserting data: {str(e)}")
+    
+    failed_chunks = sum(1 for chunk in result["chunks"] if "error" in chunk)
+    message = f"{file_format} uploaded successfully"
+    if result.get("aborted"):
+        message = f"{file_format} upload stopped early: {result['aborted']}"
+    elif failed_chunks:
+        message = f"{file_format} uploaded, {failed_chunks} chunks could not be inserted"
+    if ingest_service.fully_ingested(result):
+        ingest_service.record_uploaded_file(fingerprint, file.filename, current_user.id, result["rows_inserted"], db)
+    
+    return {
+        "message": message,
+        "mode": "stream",
+        "filename": file.filename,
+        **result
+    }
+
+
+@router.post("/batch")
+def upload_batch(
+    files: List[UploadFile] = File(..., description="csv, parquet or arrow files (optionally compressed), or zips of them"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    upload many files in one request, e.g. a month of daily exports
+    files are parsed and validated in parallel worker processes and written one at a time,
+    each file in its own transaction, so one bad file doesn't stop the others
+    returns a report per file and the batch totals
+    """
+    uploads = [(file.filename or "unnamed", file.file) for file in files]
+    try:
+        result = batch_service.ingest_batch(uploads, current_user.id, db)
+    except batch_service.BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    totals = result["totals"]
+    return {
+        "message": f"{totals['files'] - totals['files_failed']} of {totals['files']} files processed",
+        **result
+    }
+
+
+@router.get("/jobs")
+async def list_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    list the current user's background upload jobs, newest first
+    """
+    jobs = db.query(IngestJob).filter(
+        IngestJob.user_id == current_user.id
+    ).order_by(
+        IngestJob.created_at.desc()
+    ).limit(limit).all()
+    
+    return {"jobs": [ingest_service.job_to_dict(job) for job in jobs]}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    progress of a background upload job (rows processed, rows/sec, eta) and its
+    validation summary once finished
+    """
+    job = db.get(IngestJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="job not found")
+    
+    return ingest_service.job_to_dict(job)
+
+
+@router.post("/sessions")
+async def create_upload_session(
+    body: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    start a resumable upload for a big file
+    PUT the parts to /upload/sessions/{upload_id}/parts/{n} (in any order, in parallel if
+    you like), GET the session to see which parts arrived, then POST .../complete
+    """
+    file_format = reader_service.detect_format(body.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="file must be a csv, parquet or arrow file")
+    if reader_service.detect_compression(body.filename) is not None and file_format != "csv":
+        raise HTTPException(status_code=400, detail="only csv files can be compressed")
+    
+    session = upload_session_service.create_session(body.filename, current_user.id, db, total_parts=body.total_parts)
+    return upload_session_service.session_to_dict(session)
+
+
+@router.put("/sessions/{upload_id}/parts/{part_number}")
+async def upload_part(
+    request: Request,
+    upload_id: str,
+    part_number: int = Path(..., ge=1, le=upload_session_service.MAX_PARTS),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    store one part, the request body is the raw bytes of the part
+    sending a part again replaces it, so a failed part can simply be retried
+    """
+    session = _get_open_session(upload_id, db, current_user)
+    if session.total_parts is not None and part_number > session.total_parts:
+        raise HTTPException(status_code=400, detail=f"part number is above total_parts ({session.total_parts})")
+    
+    try:
+        return await upload_session_service.save_part(session, part_number, request.stream(), db)
+    except upload_session_service.PartTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@router.get("/sessions/{upload_id}")
+async def get_upload_session(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    session status with the parts received so far and the ones still missing
+    """
+    return upload_session_service.session_to_dict(_get_session(upload_id, db, current_user))
+
+
+@router.post("/sessions/{upload_id}/complete")
+def complete_upload_session(
+    upload_id: str,
+    background: bool = Query(False, description="Ingest the assembled file as a background job"),
+    chunk_size: int = Query(ingest_service.DEFAULT_CHUNK_SIZE, ge=10, le=1000000, description="Rows per chunk"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    finish a resumable upload once every part is in and ingest it like stream=true,
+    or as a background job with background=true
+    """
+    session = _get_open_session(upload_id, db, current_user)
+    
+    try:
+        result = upload_session_service.complete_session(
+            session, db, chunk_size=chunk_size, background=background,
+            session_factory=sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"error inserting data: {str(e)}")
+    
+    return {"upload_id": session.id, "filename": session.filename, **result}
+
+
+@router.delete("/sessions/{upload_id}")
+async def abort_upload_session(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    abort a resumable upload and delete the parts received so far
+    """
+    session = _get_open_session(upload_id, db, current_user)
+    upload_session_service.abort_session(session, db)
+    return {"upload_id": session.id, "status": session.status}
+
+
+def _get_session(upload_id: str, db: Session, current_user: User) -> UploadSession:
+    session = db.get(UploadSession, upload_id)
+    if session is None or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="upload session not found")
+    return session
+
+
+def _get_open_session(upload_id: str, db: Session, current_user: User) -> UploadSession:
+    session = _get_session(upload_id, db, current_user)
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"upload session is {session.status}")
+    return session
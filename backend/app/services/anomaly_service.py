@@ -1,8 +1,9 @@
+from typing import Dict, List
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta
 from app.models import Sale
-from app.services import sales_service
+from app.services import fitting_service, sales_service
 import numpy as np
 from sklearn.ensemble import IsolationForest
 import logging
@@ -17,10 +18,25 @@ def detect_anomalies(range_days: int, db: Session):
     """
     # get historical revenue data
     revenue_data = sales_service.get_revenue(range_days, db)
-    
+    return find_anomalies(revenue_data)
+
+
+def find_anomalies(revenue_data: List[Dict]):
+    """
+    detect anomalies in an already loaded revenue series ({date, revenue} dicts, as
+    returned by sales_service.get_revenue), so callers that have it don't query again
+    """
     if not revenue_data or len(revenue_data) < 7:
         raise ValueError("insufficient data for anomaly detection (need at least 7 days)")
     
+    # the model is fitted in a worker process, off the api's threads
+    return fitting_service.run(fit_anomalies, revenue_data)
+
+
+def fit_anomalies(revenue_data: List[Dict]):
+    """
+    runs in a fitting worker: score the series with isolation forest
+    """
     # extract dates and revenue values
     dates = [item["date"] for item in revenue_data]
     revenue_values = [item["revenue"] for item in revenue_data]
@@ -0,0 +1,272 @@
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from sqlalchemy.orm import Session
+import multiprocessing
+import logging
+import os
+import shutil
+import threading
+import uuid
+import zipfile
+from app.services import ingest_service, reader_service, sales_service, validation_service
+
+logger = logging.getLogger(__name__)
+
+# worker processes that parse and validate batch files, defaults to one per core
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(os.cpu_count() or 1)))
+
+# most files (including the ones inside a zip) accepted in one batch
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "100"))
+
+# decompressed size limit per file, each file is parsed in memory by a worker
+MAX_BATCH_FILE_BYTES = int(os.getenv("MAX_BATCH_FILE_BYTES", str(200 * 1024 * 1024)))
+
+# size limit for all files of a batch together as they are staged (compressed files count
+# at their compressed size), bounds the staging disk use
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(1024 * 1024 * 1024)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# only one batch writes to the sales table at a time, the workers keep parsing meanwhile
+_writer_lock = threading.Lock()
+
+
+class BatchTooLargeError(ValueError):
+    """
+    a batch went over MAX_BATCH_FILES or MAX_BATCH_BYTES
+    """
+
+
+def ingest_batch(uploads: List[Tuple[str, BinaryIO]], user_id: int, db: Session) -> Dict:
+    """
+    ingest many files at once, zips are unpacked into their members
+    files are parsed, validated and hashed in parallel worker processes, and the
+    prepared rows are written one file at a time by this process as results come in
+    returns a report per file (in upload order) and the batch totals
+    raises BatchTooLargeError as soon as staging goes over the file count or size limit
+    """
+    batch_dir = ingest_service.STAGING_DIR / f"batch_{uuid.uuid4().hex}"
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        reports, staged = _stage_batch(uploads, batch_dir, db)
+        _process_staged(staged, reports, user_id, db)
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+    return {
+        "files": reports,
+        "totals": {
+            "files": len(reports),
+            "files_failed": sum(1 for report in reports if report["status"] == "failed"),
+            "files_skipped": sum(1 for report in reports if report["status"] == "skipped"),
+            "rows_inserted": sum(report.get("rows_inserted", 0) for report in reports),
+            "rows_duplicate": sum(report.get("rows_duplicate", 0) for report in reports),
+            "rows_rejected": sum(report.get("rows_rejected", 0) for report in reports),
+        }
+    }
+
+
+def parse_batch_file(path: str, file_format: str, compression: Optional[str]) -> Dict:
+    """
+    runs in a worker process: read one staged file, validate it and prepare its rows
+    everything is returned (not raised) so one bad file can't break the pool
+    """
+    try:
+        with open(path, "rb") as f:
+            source = reader_service.open_upload(f, compression, max_bytes=MAX_BATCH_FILE_BYTES)
+            df = reader_service.read_frame(source, file_format)
+    except reader_service.FileReadError as e:
+        return {"error": str(e)}
+
+    if df.empty:
+        return {"error": f"{file_format} file contains no data rows"}
+
+    warnings, errors = validation_service.validate_csv_data(df)
+    result = {"rows": len(df), "warnings": warnings, "errors": errors}
+
+    if validation_service.has_severe_errors(errors):
+        error_messages = [error.get('message', 'unknown error') for error in errors]
+        result["error"] = f"upload blocked due to severe data quality issues: {'; '.join(error_messages)}"
+        return result
+
+    result["summary"] = validation_service.get_validation_summary(df, warnings, errors)
+
+    df_clean = df.dropna(subset=sales_service.REQUIRED_COLUMNS)
+    if df_clean.empty:
+        result["error"] = "no valid data rows after removing empty entries"
+        return result
+
+    result["clean"], result["rejected"], result["row_errors"] = sales_service.prepare_sales_rows(df_clean)
+    return result
+
+
+def _stage_batch(uploads: List[Tuple[str, BinaryIO]], batch_dir: Path, db: Session) -> Tuple[List[Dict], List[Tuple[Dict, Path]]]:
+    """
+    copy every file (and zip member) to disk so worker processes can open it
+    the limits are checked as it goes, so an oversized batch or zip stops at the first
+    file too many instead of filling the disk first
+    returns the reports in upload order and the (report, path) pairs left to parse
+    """
+    reports = []
+    staged = []
+    seen = set()
+    total_bytes = 0
+
+    def add(filename: str, fileobj: BinaryIO):
+        nonlocal total_bytes
+        if len(reports) >= MAX_BATCH_FILES:
+            raise BatchTooLargeError(f"batch has more than {MAX_BATCH_FILES} files")
+        report = _append(reports, filename)
+        file_format = reader_service.detect_format(filename)
+        compression = reader_service.detect_compression(filename)
+        if file_format is None:
+            return _fail(report, "file must be a csv, parquet or arrow file")
+        if compression is not None and file_format != "csv":
+            return _fail(report, "only csv files can be compressed")
+
+        path = batch_dir / f"{len(reports)}.upload"
+        try:
+            total_bytes += _copy_limited(fileobj, path, MAX_BATCH_BYTES - total_bytes)
+        except reader_service.DecompressedSizeError as e:
+            return _fail(report, str(e))
+
+        with open(path, "rb") as f:
+            fingerprint = ingest_service.fingerprint_file(f)
+        previous = ingest_service.find_uploaded_file(fingerprint, db)
+        if previous is not None or fingerprint in seen:
+            report["status"] = "skipped"
+            report["message"] = "file was already uploaded, skipped"
+            return
+        seen.add(fingerprint)
+
+        report.update({"fingerprint": fingerprint, "format": file_format, "compression": compression})
+        staged.append((report, path))
+
+    for filename, fileobj in uploads:
+        if filename.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(fileobj) as archive:
+                    members = [info for info in archive.infolist() if not info.is_dir()]
+                    for info in members:
+                        with archive.open(info) as member:
+                            add(f"{filename}/{info.filename}", member)
+            except zipfile.BadZipFile as e:
+                _fail(_append(reports, filename), f"invalid zip file: {str(e)}")
+        else:
+            add(filename, fileobj)
+
+    return reports, staged
+
+
+def _process_staged(staged: List[Tuple[Dict, Path]], reports: List[Dict], user_id: int, db: Session):
+    if not staged:
+        return
+
+    pool = _get_pool()
+    futures = {}
+    for report, path in staged:
+        future = pool.submit(parse_batch_file, str(path), report["format"], report["compression"])
+        futures[future] = report
+
+    for future in as_completed(futures):
+        # drop each future once it's handled so its parsed frame can be freed
+        report = futures.pop(future)
+        try:
+            parsed = future.result()
+        except BrokenProcessPool:
+            _reset_pool()
+            _fail(report, "worker process died while parsing the file")
+            continue
+        except Exception as e:
+            _fail(report, f"error parsing file: {str(e)}")
+            continue
+
+        _write_parsed(parsed, report, user_id, db)
+        del parsed
+
+
+def _write_parsed(parsed: Dict, report: Dict, user_id: int, db: Session):
+    """
+    the single writer: insert one file's prepared rows in its own transaction
+    """
+    report["warnings"] = parsed.get("warnings", [])
+    report["errors"] = parsed.get("errors", [])
+    if "summary" in parsed:
+        report["summary"] = parsed["summary"]
+    if "error" in parsed:
+        return _fail(report, parsed["error"])
+
+    try:
+        with _writer_lock:
+            result = sales_service.insert_prepared_sales(
+                parsed["clean"], parsed["rejected"], parsed["row_errors"], db
+            )
+    except ValueError as e:
+        db.rollback()
+        return _fail(report, str(e))
+    except Exception as e:
+        db.rollback()
+        logger.error(f"batch insert of {report['filename']} failed: {str(e)}")
+        return _fail(report, f"error inserting data: {str(e)}")
+
+    ingest_service.record_uploaded_file(report["fingerprint"], report["filename"], user_id, result["inserted"], db)
+    report.update({
+        "status": "inserted",
+        "rows_inserted": result["inserted"],
+        "rows_duplicate": result["duplicates"],
+        "rows_rejected": parsed["rows"] - result["inserted"] - result["duplicates"],
+    })
+
+
+def _copy_limited(fileobj: BinaryIO, path: Path, batch_remaining: int) -> int:
+    """
+    copy to disk, refusing anything over MAX_BATCH_FILE_BYTES (a zip member's declared
+    size can't be trusted) or over what's left of the batch's MAX_BATCH_BYTES
+    returns the number of bytes written
+    """
+    written = 0
+    with open(path, "wb") as out:
+        for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+            written += len(block)
+            if written > MAX_BATCH_FILE_BYTES:
+                raise reader_service.DecompressedSizeError(
+                    f"file exceeds {MAX_BATCH_FILE_BYTES // (1024 * 1024)}mb limit"
+                )
+            if written > batch_remaining:
+                raise BatchTooLargeError(f"batch exceeds {MAX_BATCH_BYTES // (1024 * 1024)}mb limit")
+            out.write(block)
+    return written
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the api process has threads and open database connections
+            _pool = ProcessPoolExecutor(
+                max_workers=max(BATCH_WORKERS, 1),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _append(reports: List[Dict], filename: str) -> Dict:
+    report = {"filename": filename, "status": "queued"}
+    reports.append(report)
+    return report
+
+
+def _fail(report: Dict, error: str):
+    report["status"] = "failed"
+    report["error"] = error
@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import numpy as np
+import pandas as pd
+import logging
+import threading
+import weakref
+from app.models import Category, DailyCategoryRevenue
+
+logger = logging.getLogger(__name__)
+
+# names looked up per round trip when new categories are created
+LOOKUP_BATCH_SIZE = 500
+
+# key in Session.info for ids created in a transaction that hasn't committed yet
+_PENDING_KEY = "category_pending"
+
+# engine -> {name: id}, ids only land here once the transaction that made them commits
+_caches = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+
+def category_ids(names: pd.Series, db: Session) -> np.ndarray:
+    """
+    integer id for every category name, unseen names are added to the categories table
+    in the caller's transaction
+    names already seen come from an in-memory cache, so most uploads don't query at all
+    """
+    cache = _cache(db.get_bind())
+    pending = db.info.get(_PENDING_KEY, {})
+    mapping = {}
+    missing = []
+    for name in pd.unique(names.to_numpy(dtype=object)).tolist():
+        category_id = pending.get(name, cache.get(name))
+        if category_id is None:
+            missing.append(name)
+        else:
+            mapping[name] = category_id
+
+    if missing:
+        created = _create_missing(sorted(missing), db)
+        db.info.setdefault(_PENDING_KEY, {}).update(created)
+        mapping.update(created)
+    return names.map(mapping).to_numpy(dtype=np.int64)
+
+
+def find_category_id(name: str, db: Session) -> Optional[int]:
+    """
+    id of an existing category, None if there's no category with that name
+    """
+    category_id = _cache(db.get_bind()).get(name)
+    if category_id is None:
+        category_id = db.query(Category.id).filter(Category.name == name).scalar()
+    return category_id
+
+
+def migrate_category_column(engine) -> bool:
+    """
+    move a sales table from before the categories table over to it: fill categories from
+    the distinct names, point every sale at its id and drop the text column
+    the daily rollup is recreated empty on its category_id key, ensure_rollup rebuilds it
+    returns True if a migration ran
+    """
+    inspector = inspect(engine)
+    if "category" not in {column["name"] for column in inspector.get_columns("sales")}:
+        return False
+    old_rollup = "category" in {column["name"] for column in inspector.get_columns("daily_category_revenue")}
+
+    logger.info("moving sales.category over to the categories table")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO categories (name) SELECT DISTINCT category FROM sales "
+            "WHERE category NOT IN (SELECT name FROM categories)"
+        ))
+        conn.execute(text("ALTER TABLE sales ADD COLUMN category_id INTEGER REFERENCES categories (id)"))
+        conn.execute(text(
+            "UPDATE sales SET category_id = (SELECT id FROM categories WHERE categories.name = sales.category)"
+        ))
+        conn.execute(text("DROP INDEX IF EXISTS idx_category"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_sales_category"))
+        conn.execute(text("ALTER TABLE sales DROP COLUMN category"))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE sales ALTER COLUMN category_id SET NOT NULL"))
+        conn.execute(text("CREATE INDEX idx_category_id ON sales (category_id)"))
+
+        if old_rollup:
+            DailyCategoryRevenue.__table__.drop(conn)
+            DailyCategoryRevenue.__table__.create(conn)
+    return True
+
+
+def _create_missing(names: List[str], db: Session) -> Dict[str, int]:
+    """
+    insert the names (skipping ones another upload just added) and read back their ids
+    """
+    table = Category.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = postgresql.insert(table)
+    else:
+        stmt = sqlite.insert(table)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["name"])
+
+    created = {}
+    for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+        batch = names[start:start + LOOKUP_BATCH_SIZE]
+        db.execute(stmt, [{"name": name} for name in batch])
+        created.update(db.execute(select(table.c.name, table.c.id).where(table.c.name.in_(batch))).all())
+    return created
+
+
+def _cache(engine) -> Dict[str, int]:
+    with _cache_lock:
+        cache = _caches.get(engine)
+        if cache is None:
+            cache = _caches[engine] = {}
+        return cache
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _cache(session.get_bind()).update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session):
+    session.info.pop(_PENDING_KEY, None)
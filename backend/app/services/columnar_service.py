@@ -0,0 +1,312 @@
+from typing import Dict, List, Optional
+from datetime import date
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+import numpy as np
+import pandas as pd
+import logging
+import os
+import threading
+import time
+from app.models import Category, Sale, SalesSummary
+from app.services import rollup_service
+
+logger = logging.getLogger(__name__)
+
+# keep a copy of the sales table in memory as numpy columns and answer the stats
+# aggregations from it, roughly 20 bytes per sale
+COLUMNAR_STORE_ENABLED = os.getenv("COLUMNAR_STORE", "false").lower() in ("1", "true", "yes")
+
+# rows fetched per round trip while loading
+LOAD_BATCH_SIZE = 200000
+
+# key in Session.info where inserted rows wait for the commit
+_PENDING_KEY = "columnar_pending"
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+_store: Optional["ColumnStore"] = None
+_store_lock = threading.Lock()
+_reloading = threading.Event()
+
+
+class ColumnStore:
+    """
+    sales as parallel numpy columns: day number (days since 1970-01-01), amount, and
+    dictionary-encoded category and customer codes
+    per-customer totals are kept next to the columns and updated on append, so top
+    customers don't need a pass over every sale
+    """
+
+    def __init__(self, engine):
+        # the engine the store was loaded from, sessions on other databases use sql
+        self.engine = engine
+        self.size = 0
+        self.total_revenue = 0.0
+        self.days = np.empty(0, dtype=np.int32)
+        self.amounts = np.empty(0, dtype=np.float64)
+        self.category_codes = np.empty(0, dtype=np.int32)
+        self.customer_codes = np.empty(0, dtype=np.int32)
+        self.categories = pd.Index([], dtype=object)
+        self.customers = pd.Index([], dtype=np.int64)
+        self.customer_spent = np.empty(0, dtype=np.float64)
+        self.customer_counts = np.empty(0, dtype=np.int64)
+        self.customer_first = np.empty(0, dtype=np.int32)
+        self.customer_last = np.empty(0, dtype=np.int32)
+        self.lock = threading.RLock()
+
+    def append(self, rows: pd.DataFrame):
+        """
+        add sales (date, amount, category, customerID columns) to the store
+        """
+        if rows.empty:
+            return
+        days = (rows['date'].to_numpy(dtype="datetime64[D]") - _EPOCH).astype(np.int32)
+        amounts = rows['amount'].to_numpy(dtype=np.float64)
+        customer_ids = rows['customerID'].to_numpy(dtype=np.int64)
+
+        with self.lock:
+            category_codes, self.categories = _encode(rows['category'].to_numpy(dtype=object), self.categories)
+            customer_codes, self.customers = _encode(customer_ids, self.customers)
+            self._grow(self.size + len(rows))
+            end = self.size + len(rows)
+            self.days[self.size:end] = days
+            self.amounts[self.size:end] = amounts
+            self.category_codes[self.size:end] = category_codes
+            self.customer_codes[self.size:end] = customer_codes
+            self.size = end
+            self.total_revenue += float(amounts.sum())
+            self._update_customers(customer_codes, amounts, days)
+
+    def revenue(self, start_date: date, end_date: date, granularity: str = "day") -> List[Dict]:
+        """
+        same result as sales_service.get_revenue, buckets without sales are left out
+        """
+        start = _day_number(start_date)
+        end = _day_number(end_date)
+        if end < start:
+            return []
+        with self.lock:
+            days = self.days[:self.size]
+            amounts = self.amounts[:self.size]
+            in_range = (days >= start) & (days <= end)
+            offsets = days[in_range] - start
+            totals = np.bincount(offsets, weights=amounts[in_range], minlength=end - start + 1)
+            counts = np.bincount(offsets, minlength=end - start + 1)
+
+        present = np.flatnonzero(counts)
+        # sum the daily totals into buckets, the days are sorted so the buckets are too
+        buckets, positions = np.unique(_bucket_start(present + start, granularity), return_inverse=True)
+        revenue = np.bincount(positions, weights=totals[present], minlength=len(buckets))
+        dates = (_EPOCH + buckets).astype(str)
+        return [
+            {"date": day, "revenue": float(total)}
+            for day, total in zip(dates.tolist(), revenue.tolist())
+        ]
+
+    def category_totals(self) -> Dict[str, float]:
+        """
+        revenue per category for categories that have sales
+        """
+        with self.lock:
+            codes = self.category_codes[:self.size]
+            totals = np.bincount(codes, weights=self.amounts[:self.size], minlength=len(self.categories))
+            counts = np.bincount(codes, minlength=len(self.categories))
+            categories = self.categories
+        present = np.flatnonzero(counts)
+        return dict(zip(categories[present].tolist(), totals[present].tolist()))
+
+    def customer_stats(self, top_k: int) -> Dict:
+        """
+        same result as sales_service.get_customer_stats
+        """
+        with self.lock:
+            spent = self.customer_spent.copy()
+            counts = self.customer_counts.copy()
+            first = self.customer_first.copy()
+            last = self.customer_last.copy()
+            customer_ids = self.customers.to_numpy()
+            total_revenue = self.total_revenue
+
+        total_customers = len(customer_ids)
+        top = _top_k(spent, customer_ids, top_k)
+        first_dates = (_EPOCH + first[top]).astype(str).tolist()
+        last_dates = (_EPOCH + last[top]).astype(str).tolist()
+        avg_spent = total_revenue / total_customers if total_customers > 0 else 0
+
+        return {
+            "total_customers": total_customers,
+            "total_revenue": total_revenue,
+            "avg_spent_per_customer": round(float(avg_spent), 2),
+            "top_customers": [
+                {
+                    "customerID": int(customer_ids[index]),
+                    "total_spent": float(spent[index]),
+                    "transaction_count": int(counts[index]),
+                    "first_purchase": first_dates[position],
+                    "last_purchase": last_dates[position]
+                }
+                for position, index in enumerate(top.tolist())
+            ]
+        }
+
+    def _grow(self, needed: int):
+        # double the capacity so appends are amortized O(rows added)
+        capacity = len(self.days)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name in ("days", "amounts", "category_codes", "customer_codes"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _update_customers(self, codes: np.ndarray, amounts: np.ndarray, days: np.ndarray):
+        known = len(self.customer_spent)
+        count = len(self.customers)
+        if count > known:
+            added = count - known
+            self.customer_spent = np.concatenate([self.customer_spent, np.zeros(added)])
+            self.customer_counts = np.concatenate([self.customer_counts, np.zeros(added, dtype=np.int64)])
+            self.customer_first = np.concatenate([self.customer_first, np.full(added, np.iinfo(np.int32).max, dtype=np.int32)])
+            self.customer_last = np.concatenate([self.customer_last, np.full(added, np.iinfo(np.int32).min, dtype=np.int32)])
+
+        self.customer_spent += np.bincount(codes, weights=amounts, minlength=count)
+        self.customer_counts += np.bincount(codes, minlength=count)
+        np.minimum.at(self.customer_first, codes, days)
+        np.maximum.at(self.customer_last, codes, days)
+
+
+def active_store(db: Session) -> Optional[ColumnStore]:
+    """
+    the store, if it's enabled, loaded from this session's database and up to date
+    a store that disagrees with sales_summary (sales written by another process, a
+    rebuild, a rolled back race) is reloaded in the background, callers fall back to sql
+    """
+    if not COLUMNAR_STORE_ENABLED:
+        return None
+    store = _store
+    if store is None or store.engine is not db.get_bind():
+        return None
+
+    summary = db.get(SalesSummary, rollup_service.SUMMARY_ID)
+    expected = summary.sale_count if summary else 0
+    if store.size != expected:
+        logger.info(f"column store is stale ({store.size} rows, {expected} in the database), reloading")
+        schedule_reload(db.get_bind())
+        return None
+    return store
+
+
+def load_store(db: Session) -> ColumnStore:
+    """
+    read every sale into a new store and make it the active one
+    """
+    started = time.perf_counter()
+    store = ColumnStore(db.get_bind())
+    query = select(
+        Sale.date, Sale.amount, Category.name, Sale.customerID
+    ).join(Category, Category.id == Sale.category_id).execution_options(yield_per=LOAD_BATCH_SIZE)
+    for batch in db.execute(query).partitions():
+        frame = pd.DataFrame(batch, columns=["date", "amount", "category", "customerID"])
+        frame['date'] = pd.to_datetime(frame['date'])
+        store.append(frame)
+
+    global _store
+    with _store_lock:
+        _store = store
+    logger.info(f"column store loaded {store.size} sales in {time.perf_counter() - started:.2f}s")
+    return store
+
+
+def schedule_reload(bind):
+    """
+    reload the store in a background thread, at most one reload runs at a time
+    """
+    if _reloading.is_set():
+        return
+    _reloading.set()
+
+    def reload():
+        db = Session(bind=bind)
+        try:
+            load_store(db)
+        except Exception as e:
+            logger.error(f"column store reload failed: {str(e)}")
+        finally:
+            db.close()
+            _reloading.clear()
+
+    threading.Thread(target=reload, name="column-store-reload", daemon=True).start()
+
+
+def stage_inserted(rows: pd.DataFrame, db: Session):
+    """
+    remember rows inserted in this session's transaction, they're appended to the
+    store when the transaction commits and dropped if it rolls back
+    """
+    if not COLUMNAR_STORE_ENABLED or rows.empty:
+        return
+    db.info.setdefault(_PENDING_KEY, []).append(rows[['date', 'amount', 'category', 'customerID']])
+
+
+@event.listens_for(Session, "after_commit")
+def _append_committed(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    store = _store
+    if not pending or store is None or store.engine is not session.get_bind():
+        return
+    for rows in pending:
+        store.append(rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _encode(values: np.ndarray, dictionary: pd.Index):
+    """
+    codes for values in dictionary, unseen values are added to the end of it
+    """
+    codes = dictionary.get_indexer(values)
+    unseen = codes < 0
+    if unseen.any():
+        dictionary = dictionary.append(pd.Index(pd.unique(values[unseen])))
+        codes[unseen] = dictionary.get_indexer(values[unseen])
+    return codes.astype(np.int32), dictionary
+
+
+def _top_k(spent: np.ndarray, customer_ids: np.ndarray, k: int) -> np.ndarray:
+    """
+    indices of the k biggest spenders, ties broken by customer id like the sql query
+    """
+    if len(spent) <= k:
+        candidates = np.arange(len(spent))
+    else:
+        # everyone tied with the k-th value is a candidate, so ties resolve the same as sql
+        threshold = np.partition(spent, len(spent) - k)[len(spent) - k]
+        candidates = np.flatnonzero(spent >= threshold)
+    order = np.lexsort((customer_ids[candidates], -spent[candidates]))
+    return candidates[order][:k]
+
+
+def _bucket_start(days: np.ndarray, granularity: str) -> np.ndarray:
+    """
+    day number of the first day of each day's week (monday), month or quarter
+    """
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        # 1970-01-01 was a thursday, 3 days after monday
+        return days - (days + 3) % 7
+    months = (_EPOCH + days).astype("datetime64[M]")
+    if granularity == "quarter":
+        # months count from january 1970, so quarters start at multiples of 3
+        months = months - months.astype(np.int64) % 3
+    return (months.astype("datetime64[D]") - _EPOCH).astype(np.int64)
+
+
+def _day_number(value: date) -> int:
+    return int((np.datetime64(value, "D") - _EPOCH).astype(np.int64))
@@ -0,0 +1,31 @@
+from typing import Dict
+from sqlalchemy.orm import Session
+import logging
+from app.services import anomaly_service, fitting_service, sales_service
+
+logger = logging.getLogger(__name__)
+
+
+def get_dashboard(db: Session, range_days: int = 30, top_k: int = 5, include_anomalies: bool = True) -> Dict:
+    """
+    everything the dashboard page shows, in one payload: the revenue series, category
+    breakdown, customer stats and the anomalies in that same revenue window
+    revenue and anomalies share one rollup query, categories and customers each read
+    their own small aggregate table
+    not having enough data for anomalies (or a fit that times out) doesn't fail the
+    bundle, it's reported in anomalies_error instead
+    """
+    revenue_data = sales_service.get_revenue(range_days, db)
+    dashboard = {
+        "revenue": {"data": revenue_data, "range_days": range_days, "granularity": "day"},
+        "by_category": sales_service.get_sales_by_category(db),
+        "customers": sales_service.get_customer_stats(db, top_k=top_k),
+        "anomalies": None,
+        "anomalies_error": None,
+    }
+    if include_anomalies:
+        try:
+            dashboard["anomalies"] = anomaly_service.find_anomalies(revenue_data)
+        except (ValueError, fitting_service.FitTimeoutError) as e:
+            dashboard["anomalies_error"] = str(e)
+    return dashboard
@@ -0,0 +1,119 @@
+from typing import Dict
+from statistics import NormalDist
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# weekly seasonality on daily data
+SEASON_LENGTH = 7
+
+# smoothing parameters tried when fitting, every combination is run at once as a batch
+_ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7])
+# trend smoothing as a share of alpha, so it never reacts faster than the level
+_BETA_SHARES = np.array([0.0, 0.05, 0.15, 0.3])
+_GAMMAS = np.array([0.0, 0.05, 0.1, 0.2, 0.3])
+# damping, forecasts flatten out instead of extrapolating the trend forever
+_PHIS = np.array([0.8, 0.9, 0.98])
+
+
+class EtsModel:
+    """
+    additive holt-winters with a damped trend, ETS(A,Ad,A) in the usual notation
+    fitted by picking the smoothing parameters with the smallest one-step-ahead squared
+    error, prediction intervals are the analytic ones for this model class
+    """
+
+    def __init__(self, alpha: float, beta: float, gamma: float, phi: float,
+                 level: float, trend: float, season: np.ndarray, sigma2: float, n: int):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.phi = phi
+        self.level = level
+        self.trend = trend
+        # season[i] is the seasonal term of days t with t % SEASON_LENGTH == i
+        self.season = season
+        self.sigma2 = sigma2
+        self.n = n
+
+    def forecast(self, period_days: int, interval_width: float = 0.95) -> Dict[str, np.ndarray]:
+        """
+        point forecast and interval bounds for the next period_days, revenue can't go
+        below zero so neither can they
+        """
+        steps = np.arange(1, period_days + 1)
+        # phi + phi^2 + ... + phi^h
+        damped = np.cumsum(self.phi ** steps)
+        predicted = self.level + damped * self.trend + self.season[(self.n + steps - 1) % SEASON_LENGTH]
+
+        # h-step variance: sigma^2 * (1 + sum of c_j^2 for j < h)
+        seasonal_hits = (steps % SEASON_LENGTH == 0) * self.gamma
+        c = self.alpha + self.beta * damped + seasonal_hits
+        variance = self.sigma2 * (1 + np.concatenate([[0.0], np.cumsum(c[:-1] ** 2)]))
+        z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+        spread = z * np.sqrt(variance)
+
+        return {
+            "predicted": np.maximum(predicted, 0),
+            "lower": np.maximum(predicted - spread, 0),
+            "upper": np.maximum(predicted + spread, 0),
+        }
+
+
+def fit_ets(y: np.ndarray) -> EtsModel:
+    """
+    fit the model to a daily series (at least one week), the weekly season is only
+    used once there are two full weeks to start it from
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n < SEASON_LENGTH:
+        raise ValueError(f"need at least {SEASON_LENGTH} days to fit ets")
+    seasonal = n >= 2 * SEASON_LENGTH
+
+    alpha, beta_share, gamma, phi = (grid.ravel() for grid in np.meshgrid(
+        _ALPHAS, _BETA_SHARES, _GAMMAS if seasonal else np.array([0.0]), _PHIS, indexing="ij"
+    ))
+    beta = alpha * beta_share
+    # keeps the seasonal update stable
+    keep = gamma <= 1 - alpha
+    alpha, beta, gamma, phi = alpha[keep], beta[keep], gamma[keep], phi[keep]
+    candidates = len(alpha)
+
+    if seasonal:
+        first_week = y[:SEASON_LENGTH].mean()
+        level0 = first_week
+        trend0 = (y[SEASON_LENGTH:2 * SEASON_LENGTH].mean() - first_week) / SEASON_LENGTH
+        season0 = y[:SEASON_LENGTH] - first_week
+    else:
+        level0, trend0, season0 = y[0], 0.0, np.zeros(SEASON_LENGTH)
+
+    level = np.full(candidates, level0)
+    trend = np.full(candidates, trend0)
+    season = np.tile(season0, (candidates, 1))
+    sse = np.zeros(candidates)
+    # the first week mostly fits the starting values, it isn't scored
+    for t in range(n):
+        slot = t % SEASON_LENGTH
+        damped_trend = phi * trend
+        error = y[t] - (level + damped_trend + season[:, slot])
+        level = level + damped_trend + alpha * error
+        trend = damped_trend + beta * error
+        season[:, slot] += gamma * error
+        if t >= SEASON_LENGTH:
+            sse += error ** 2
+
+    best = int(np.argmin(sse))
+    scored = max(n - SEASON_LENGTH, 1)
+    return EtsModel(
+        alpha=float(alpha[best]),
+        beta=float(beta[best]),
+        gamma=float(gamma[best]),
+        phi=float(phi[best]),
+        level=float(level[best]),
+        trend=float(trend[best]),
+        season=season[best].copy(),
+        sigma2=float(sse[best] / scored),
+        n=n,
+    )
@@ -0,0 +1,194 @@
+from typing import Iterator, List, Optional
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+import csv
+import io
+import json
+import logging
+import os
+from app.models import Category, Sale
+
+logger = logging.getLogger(__name__)
+
+# try to import pyarrow, csv and ndjson exports still work without it
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow library not installed. parquet and arrow exports will not work.")
+
+# rows fetched per round trip and written per response chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+# rows per parquet row group, each one is fetched, written and sent as a unit
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("EXPORT_PARQUET_ROW_GROUP_SIZE", "100000"))
+
+# columns of an export, in order
+EXPORT_COLUMNS = ["id", "date", "amount", "category", "customerID"]
+
+# export format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# formats written with pyarrow
+ARROW_FORMATS = ("parquet", "arrow")
+
+
+def export_statement(filters: List):
+    """
+    select for the exported sales, newest first
+    """
+    return select(
+        Sale.id, Sale.date, Sale.amount, Category.name.label("category"), Sale.customerID
+    ).join(
+        Category, Category.id == Sale.category_id
+    ).where(
+        *filters
+    ).order_by(
+        Sale.date.desc(), Sale.id.desc()
+    )
+
+
+def has_rows(statement, db: Session) -> bool:
+    """
+    whether the export would have any rows, without reading them
+    """
+    return db.execute(select(exists(statement.order_by(None)))).scalar()
+
+
+def iter_row_batches(statement, bind, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List]:
+    """
+    the statement's rows in batches of batch_size, on postgres through a server-side
+    cursor so only one batch is ever in memory
+    uses its own session, the response keeps streaming after the request's is closed
+    """
+    db = Session(bind=bind)
+    try:
+        result = db.execute(statement.execution_options(yield_per=batch_size))
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def stream_csv(statement, bind, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    csv export written one batch at a time, the header goes out before the first query
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield _drain(buffer)
+
+    for batch in iter_row_batches(statement, bind, batch_size):
+        writer.writerows(batch)
+        yield _drain(buffer)
+
+
+def stream_export(statement, bind, fmt: str) -> Iterator[bytes]:
+    """
+    the export in one of EXPORT_FORMATS, as response chunks
+    """
+    if fmt == "csv":
+        return stream_csv(statement, bind)
+    if fmt == "ndjson":
+        return stream_ndjson(statement, bind)
+    if fmt in ARROW_FORMATS:
+        if not PYARROW_AVAILABLE:
+            raise ValueError(f"pyarrow library not installed, can't export {fmt}")
+        return stream_arrow(statement, bind, fmt)
+    raise ValueError(f"unknown export format '{fmt}', expected one of: {', '.join(EXPORT_FORMATS)}")
+
+
+def stream_ndjson(statement, bind, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    one json object per line, dates as YYYY-MM-DD strings
+    """
+    for batch in iter_row_batches(statement, bind, batch_size):
+        lines = [
+            json.dumps({
+                "id": sale_id,
+                "date": sale_date.isoformat(),
+                "amount": amount,
+                "category": category,
+                "customerID": customer_id
+            })
+            for sale_id, sale_date, amount, category, customer_id in batch
+        ]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def stream_arrow(statement, bind, fmt: str, batch_size: Optional[int] = None) -> Iterator[bytes]:
+    """
+    parquet (one row group per fetched batch) or the arrow ipc stream format (one record
+    batch per fetched batch), dates stay date32 and amounts float64
+    each batch is sent as soon as it's encoded, parquet's footer goes out last
+    """
+    if batch_size is None:
+        batch_size = PARQUET_ROW_GROUP_SIZE if fmt == "parquet" else EXPORT_BATCH_SIZE
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else ipc.new_stream(sink, schema)
+
+    try:
+        yield sink.drain()
+        for batch in iter_row_batches(statement, bind, batch_size):
+            columns = list(zip(*batch))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    file object pyarrow writes into, the bytes are collected until the next drain
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.date32()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("customerID", pa.int64()),
+    ])
+
+
+def _drain(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data.encode()
@@ -0,0 +1,218 @@
+from typing import Callable, List, Optional
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# worker processes that fit forecast and anomaly models, 0 fits in the calling thread
+FIT_WORKERS = int(os.getenv("FIT_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+# seconds a single model fit may take before it's stopped
+FIT_TIMEOUT_SECONDS = float(os.getenv("FIT_TIMEOUT_SECONDS", "120"))
+
+# how often a waiting caller checks whether it was cancelled
+_POLL_SECONDS = 0.1
+
+# how long a caller waits past the timeout for the worker to report it stopped the fit
+_TIMEOUT_GRACE_SECONDS = 5.0
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# fits submitted and not finished in their worker yet, queued ones included
+_active = 0
+_active_lock = threading.Lock()
+
+
+class FitTimeoutError(Exception):
+    """
+    a model fit ran past its timeout and was stopped
+    """
+
+
+class FitCancelledError(Exception):
+    """
+    a model fit was cancelled before it finished
+    """
+
+
+def run(fn: Callable, *args, timeout: Optional[float] = None, cancelled: Optional[threading.Event] = None):
+    """
+    fn(*args) in a worker process, so cpu heavy fitting doesn't hold up the api
+    fn and its arguments have to be picklable (a module level function and plain data)
+    raises FitTimeoutError after timeout seconds of fitting (waiting for a busy worker
+    doesn't count) and FitCancelledError once `cancelled` is set
+    the timeout is enforced inside the worker, so only this fit is stopped, the workers
+    are shared and never killed: a cancelled fit that's already running finishes in its
+    worker and the result is dropped
+    """
+    if timeout is None:
+        timeout = FIT_TIMEOUT_SECONDS
+    if FIT_WORKERS <= 0:
+        return fn(*args)
+
+    # one retry for a fit lost when a worker crashed
+    for attempt in range(2):
+        pool = _get_pool()
+        deadline = _deadline(1, timeout)
+        future = _submit(pool, fn, args, timeout)
+        try:
+            return _wait(future, deadline, timeout, cancelled)
+        except (BrokenProcessPool, CancelledError):
+            _reset_pool(pool)
+            if attempt == 1:
+                raise RuntimeError("model fitting worker process died")
+            logger.warning("model fitting worker pool was reset, resubmitting the fit")
+
+
+def run_many(fn: Callable, calls: List[tuple], timeout: Optional[float] = None, cancelled: Optional[threading.Event] = None) -> List:
+    """
+    fn(*args) for every args tuple in calls, spread over all the workers at once
+    returns the results in order, a call that raised gives back its exception instead so
+    one bad series doesn't lose the others
+    each call gets `timeout` seconds once a worker is free for it, running out or being
+    cancelled stops the whole batch (FitTimeoutError, FitCancelledError), calls that are
+    still queued are dropped then
+    """
+    if timeout is None:
+        timeout = FIT_TIMEOUT_SECONDS
+    if not calls:
+        return []
+    if FIT_WORKERS <= 0:
+        return [_call(fn, args) for args in calls]
+
+    pool = _get_pool()
+    deadline = _deadline(len(calls), timeout)
+    futures = [_submit(pool, fn, args, timeout) for args in calls]
+    # the calls queue behind each other, FIT_WORKERS at a time
+    rounds = -(-len(calls) // FIT_WORKERS)
+    results = []
+    for future in futures:
+        try:
+            results.append(_wait(future, deadline, timeout * rounds, cancelled))
+        except (FitTimeoutError, FitCancelledError):
+            for other in futures:
+                other.cancel()
+            raise
+        except (BrokenProcessPool, CancelledError):
+            _reset_pool(pool)
+            results.append(RuntimeError("model fitting worker process died"))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def is_busy() -> bool:
+    """
+    whether every worker already has a fit, a new one would have to queue
+    """
+    return FIT_WORKERS > 0 and _active >= FIT_WORKERS
+
+
+def _call(fn: Callable, args: tuple):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+
+def _fit_with_timeout(fn: Callable, timeout: float, *args):
+    """
+    runs in the worker: fn(*args), stopped with FitTimeoutError once timeout seconds pass
+    the alarm only interrupts this fit, the worker goes on with the next one
+    """
+    if not hasattr(signal, "setitimer"):
+        # windows, the caller stops waiting but the fit runs to the end
+        return fn(*args)
+
+    message = f"model fitting took longer than {timeout:g}s"
+    expired = threading.Event()
+
+    def expire(signum, frame):
+        expired.set()
+        raise FitTimeoutError(message)
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    except Exception:
+        # fn may have wrapped it in an error of its own
+        if expired.is_set():
+            raise FitTimeoutError(message) from None
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _deadline(calls: int, timeout: float) -> float:
+    """
+    when a caller about to submit `calls` fits stops waiting for them
+    the fits already in the pool go first and each holds a worker for up to its own
+    timeout, so time spent queued behind them doesn't count against this caller's
+    """
+    ahead = -(-_active // FIT_WORKERS) * max(timeout, FIT_TIMEOUT_SECONDS)
+    own = -(-calls // FIT_WORKERS) * timeout
+    return time.monotonic() + ahead + own + _TIMEOUT_GRACE_SECONDS
+
+
+def _submit(pool: ProcessPoolExecutor, fn: Callable, args: tuple, timeout: float) -> Future:
+    global _active
+    future = pool.submit(_fit_with_timeout, fn, timeout, *args)
+    with _active_lock:
+        _active += 1
+    # counted until the worker is done with it, a fit whose caller gave up still holds a worker
+    future.add_done_callback(_finished)
+    return future
+
+
+def _finished(future: Future):
+    global _active
+    with _active_lock:
+        _active -= 1
+
+
+def _wait(future: Future, deadline: float, timeout: float, cancelled: Optional[threading.Event]):
+    while True:
+        if cancelled is not None and cancelled.is_set():
+            # drops it if it's still queued, a running fit is left to finish
+            future.cancel()
+            raise FitCancelledError("model fitting was cancelled")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # the worker didn't stop it in time (or it was queued all along)
+            future.cancel()
+            raise FitTimeoutError(f"model fitting took longer than {timeout:g}s")
+        try:
+            return future.result(timeout=min(remaining, _POLL_SECONDS) if cancelled is not None else remaining)
+        except FutureTimeoutError:
+            continue
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the api process has threads and open database connections
+            _pool = ProcessPoolExecutor(
+                max_workers=FIT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        # another caller may have replaced it already
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
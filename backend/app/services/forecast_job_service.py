@@ -0,0 +1,173 @@
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+import logging
+import os
+import threading
+import time
+import uuid
+from app.services import fitting_service, forecast_service
+
+logger = logging.getLogger(__name__)
+
+# finished jobs are forgotten after this many seconds
+FORECAST_JOB_RETENTION_SECONDS = int(os.getenv("FORECAST_JOB_RETENTION_SECONDS", "3600"))
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# job id -> job, jobs only live in this process, a restart forgets them (resubmitting is cheap)
+_jobs: Dict[str, Dict] = {}
+_jobs_lock = threading.Lock()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def submit_forecast_job(
+    period_days: int,
+    user_id: int,
+    session_factory: Callable[[], Session],
+    engine: Optional[str] = None
+) -> Dict:
+    """
+    queue a forecast, poll get_job for its status and result
+    the job's thread only waits, the model is fitted in a fitting worker process
+    """
+    if engine is not None and engine not in forecast_service.ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(forecast_service.ENGINES)}")
+    if period_days > forecast_service.MAX_FORECAST_DAYS:
+        raise ValueError(f"forecast period can be at most {forecast_service.MAX_FORECAST_DAYS} days")
+    _prune_finished()
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "period": period_days,
+        "engine": engine,
+        "status": "queued",
+        "result": None,
+        "error": None,
+        "created_at": _utcnow(),
+        "started_at": None,
+        "finished_at": None,
+        "cancelled": threading.Event(),
+    }
+    with _jobs_lock:
+        _jobs[job["job_id"]] = job
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # waiting threads, one per fitting worker is enough to keep them busy
+            _executor = ThreadPoolExecutor(
+                max_workers=max(fitting_service.FIT_WORKERS, 1), thread_name_prefix="forecast"
+            )
+    _executor.submit(run_forecast_job, job["job_id"], session_factory)
+    return job_to_dict(job)
+
+
+def run_forecast_job(job_id: str, session_factory: Callable[[], Session]):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        job["status"] = "running"
+        job["started_at"] = _utcnow()
+
+    db = session_factory()
+    try:
+        result = forecast_service.forecast_revenue(
+            job["period"], db, cancelled=job["cancelled"], engine=job["engine"]
+        )
+        _finish(job, "completed", result=result)
+    except fitting_service.FitCancelledError:
+        _finish(job, "cancelled")
+    except Exception as e:
+        logger.error(f"forecast job {job_id} failed: {str(e)}")
+        _finish(job, "failed", error=str(e))
+    finally:
+        db.close()
+
+
+def get_job(job_id: str, user_id: int) -> Optional[Dict]:
+    """
+    a job of this user, None if there's no such job (or it belongs to someone else)
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["user_id"] != user_id:
+            return None
+        return job_to_dict(job)
+
+
+def list_jobs(user_id: int) -> List[Dict]:
+    """
+    this user's jobs, newest first
+    """
+    with _jobs_lock:
+        jobs = [job for job in _jobs.values() if job["user_id"] == user_id]
+        return [job_to_dict(job) for job in sorted(jobs, key=lambda job: job["created_at"], reverse=True)]
+
+
+def cancel_job(job_id: str, user_id: int) -> Optional[Dict]:
+    """
+    cancel a queued or running job, finished jobs are left as they are
+    a running job reports cancelled as soon as it notices, its fit (if one already
+    started) finishes in its worker and is thrown away, other users' fits aren't touched
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["user_id"] != user_id:
+            return None
+        if job["status"] == "queued":
+            job["status"] = "cancelled"
+            job["finished_at"] = _utcnow()
+        elif job["status"] == "running":
+            job["cancelled"].set()
+        return job_to_dict(job)
+
+
+def job_to_dict(job: Dict) -> Dict:
+    """
+    job status with how long it has been running
+    """
+    elapsed = None
+    if job["started_at"] is not None:
+        end = job["finished_at"] or _utcnow()
+        elapsed = round((end - job["started_at"]).total_seconds(), 3)
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "period": job["period"],
+        "engine": job["engine"],
+        "cancel_requested": job["cancelled"].is_set(),
+        "elapsed_seconds": elapsed,
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"].isoformat(),
+        "started_at": job["started_at"].isoformat() if job["started_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+    }
+
+
+def _finish(job: Dict, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+    with _jobs_lock:
+        job["status"] = status
+        job["result"] = result
+        job["error"] = error
+        job["finished_at"] = _utcnow()
+
+
+def _prune_finished():
+    cutoff = time.time() - FORECAST_JOB_RETENTION_SECONDS
+    with _jobs_lock:
+        for job_id in [
+            job_id for job_id, job in _jobs.items()
+            if job["status"] in FINISHED_STATUSES and job["finished_at"].timestamp() < cutoff
+        ]:
+            del _jobs[job_id]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
@@ -1,13 +1,50 @@
+from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta, date
-from app.models import Sale
+from app.models import Category, DailyCategoryRevenue
+from app.services import ets_service, fitting_service
+import numpy as np
 import pandas as pd
-from prophet import Prophet
+import hashlib
+import importlib.metadata
+import json
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
+# every forecast is predicted this many days ahead, shorter periods are slices of it
+MAX_FORECAST_DAYS = 90
+
+# prophet: prophet's model (seconds to fit, imported on first use), ets: holt-winters
+# in numpy (milliseconds), auto: ets for short histories or when every fitting worker
+# is busy, prophet otherwise
+ENGINES = ("prophet", "ets", "auto")
+FORECAST_ENGINE = os.getenv("FORECAST_ENGINE", "auto").lower()
+
+# histories shorter than this get ets under auto, prophet needs a few months of data to
+# find more than the weekly pattern ets already models
+AUTO_PROPHET_MIN_DAYS = int(os.getenv("FORECAST_AUTO_PROPHET_MIN_DAYS", "90"))
+
+# fitted models and their forecasts, one json file per history fingerprint
+MODEL_STORE_DIR = Path(os.getenv("MODEL_STORE_DIR", "./model_store"))
+
+# files kept in the model store, the least recently used ones are deleted first
+MODEL_STORE_MAX_ENTRIES = int(os.getenv("MODEL_STORE_MAX_ENTRIES", "256"))
+
+# bump when fitting or the post-processing changes, stored forecasts stop matching
+_MODEL_FORMAT = 1
+
+# forecasts served recently, so repeats don't even read the file
+_recent = OrderedDict()
+# room for a forecast per category, about 10kb each
+_RECENT_SIZE = 512
+_recent_lock = threading.Lock()
+
 
 def get_historical_revenue_data(db: Session, lookback_days: int = 365):
     """
@@ -17,17 +54,17 @@ def get_historical_revenue_data(db: Session, lookback_days: int = 365):
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=lookback_days)
     
-    # query all sales in the date range, group by date
+    # daily totals from the rollup table, group by date
     results = db.query(
-        Sale.date,
-        func.sum(Sale.amount).label('revenue')
+        DailyCategoryRevenue.date,
+        func.sum(DailyCategoryRevenue.revenue).label('revenue')
     ).filter(
-        Sale.date >= start_date,
-        Sale.date <= end_date
+        DailyCategoryRevenue.date >= start_date,
+        DailyCategoryRevenue.date <= end_date
     ).group_by(
-        Sale.date
+        DailyCategoryRevenue.date
     ).order_by(
-        Sale.date
+        DailyCategoryRevenue.date
     ).all()
     
     # convert to dataframe
@@ -55,91 +92,425 @@ def get_historical_revenue_data(db: Session, lookback_days: int = 365):
     return full_df
 
 
-def forecast_revenue(period_days: int, db: Session):
+def forecast_revenue(
+    period_days: int,
+    db: Session,
+    cancelled: Optional[threading.Event] = None,
+    engine: Optional[str] = None
+):
     """
-    forecast revenue for the next N days using prophet
-    returns dict with dates, predicted values, and confidence intervals
+    forecast revenue for the next N days using prophet or ets (see ENGINES)
+    returns dict with dates, predicted values, confidence intervals and the engine used
+    prophet is fitted and predicted MAX_FORECAST_DAYS ahead once per history, shorter
+    periods are slices of that, repeats are read from the model store
+    setting `cancelled` stops a fit that's still running (fitting_service.FitCancelledError)
     """
+    engine = _check_request(period_days, engine)
+    
     # get historical data (use last year)
     historical_data = get_historical_revenue_data(db, lookback_days=365)
     
     if historical_data is None or len(historical_data) < 7:
         raise ValueError("insufficient historical data for forecasting (need at least 7 days)")
     
+    forecast = None
+    if engine != "ets":
+        settings = model_settings(historical_data)
+        fingerprint = series_fingerprint(historical_data, settings)
+        # a stored prophet forecast is free, auto takes it whatever the load
+        forecast = _load_forecast(fingerprint, historical_data)
+        if forecast is None and engine == "auto" and _prefer_ets(historical_data):
+            engine = "ets"
+        elif forecast is None:
+            try:
+                # fitting takes the longest, it runs in a worker process
+                model_json, forecast = fitting_service.run(
+                    fit_forecast, historical_data, settings, MAX_FORECAST_DAYS, cancelled=cancelled
+                )
+                _store_forecast(fingerprint, model_json, forecast)
+            except ProphetUnavailableError:
+                if engine != "auto":
+                    raise
+                logger.warning("prophet is unavailable, forecasting with ets instead")
+                engine = "ets"
+    
+    if engine == "ets":
+        forecast, _ = _cached_ets_forecast(historical_data)
+    else:
+        engine = "prophet"
+    
+    result = {key: values[:period_days] for key, values in forecast.items()}
+    result["engine"] = engine
+    return result
+
+
+def forecast_by_category(
+    period_days: int,
+    db: Session,
+    cancelled: Optional[threading.Event] = None,
+    engine: Optional[str] = None
+) -> Dict:
+    """
+    forecast every category's revenue for the next N days, in one payload
+    the daily series of all categories come from one rollup query, prophet fits run in
+    parallel on the fitting workers, and every series is looked up by its fingerprint
+    first, so categories whose history didn't change are never refit
+    a category that can't be forecast (too little history, a failed fit) gets an error
+    instead of failing the others
+    """
+    engine = _check_request(period_days, engine)
+    histories = get_category_revenue_data(db, lookback_days=365)
+    if not histories:
+        raise ValueError("insufficient historical data for forecasting (no sales in the last year)")
+    
+    forecasts = {}
+    errors = {}
+    fitted = 0
+    prophet_fits = []
+    # decided once, the fits of this request shouldn't push their own siblings to ets
+    busy = fitting_service.is_busy()
+    for name, history in histories.items():
+        if len(history) < 7:
+            errors[name] = "insufficient historical data for forecasting (need at least 7 days)"
+            continue
+        if engine != "ets":
+            settings = model_settings(history)
+            fingerprint = series_fingerprint(history, settings)
+            forecast = _load_forecast(fingerprint, history)
+            if forecast is not None:
+                forecasts[name] = (forecast, "prophet")
+                continue
+            if engine == "prophet" or (len(history) >= AUTO_PROPHET_MIN_DAYS and not busy):
+                prophet_fits.append((name, fingerprint, history, settings))
+                continue
+        forecast, cached = _cached_ets_forecast(history)
+        forecasts[name] = (forecast, "ets")
+        fitted += not cached
+    
+    results = fitting_service.run_many(
+        fit_forecast, [(history, settings, MAX_FORECAST_DAYS) for _, _, history, settings in prophet_fits],
+        cancelled=cancelled
+    )
+    for (name, fingerprint, history, _), result in zip(prophet_fits, results):
+        if isinstance(result, ProphetUnavailableError) and engine == "auto":
+            forecasts[name] = (_cached_ets_forecast(history)[0], "ets")
+        elif isinstance(result, Exception):
+            logger.error(f"forecast for category {name} failed: {str(result)}")
+            errors[name] = str(result)
+            continue
+        else:
+            model_json, forecast = result
+            _store_forecast(fingerprint, model_json, forecast)
+            forecasts[name] = (forecast, "prophet")
+        fitted += 1
+    
+    categories = []
+    for name in sorted(histories):
+        if name in errors:
+            categories.append({"category": name, "error": errors[name]})
+            continue
+        forecast, series_engine = forecasts[name]
+        entry = {"category": name, "engine": series_engine}
+        entry.update({key: values[:period_days] for key, values in forecast.items()})
+        categories.append(entry)
+    
+    return {
+        "period": period_days,
+        "categories": categories,
+        "fitted": fitted,
+        "cached": len(forecasts) - fitted,
+    }
+
+
+def get_category_revenue_data(db: Session, lookback_days: int = 365) -> Dict[str, pd.DataFrame]:
+    """
+    daily revenue per category (ds/y frames like get_historical_revenue_data) from one
+    query over the rollup, pivoted to a date x category grid
+    each series starts at the category's first sale and runs to the last day with any
+    sales, missing days in between are 0
+    """
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=lookback_days)
+    
+    rows = db.query(
+        DailyCategoryRevenue.date,
+        Category.name,
+        DailyCategoryRevenue.revenue
+    ).join(
+        Category, Category.id == DailyCategoryRevenue.category_id
+    ).filter(
+        DailyCategoryRevenue.date >= start_date,
+        DailyCategoryRevenue.date <= end_date
+    ).all()
+    if not rows:
+        return {}
+    
+    frame = pd.DataFrame(rows, columns=["date", "category", "revenue"])
+    frame['date'] = pd.to_datetime(frame['date'])
+    grid = frame.pivot(index="date", columns="category", values="revenue")
+    grid = grid.reindex(pd.date_range(grid.index.min(), grid.index.max(), freq='D'))
+    
+    histories = {}
+    for name in grid.columns:
+        column = grid[name]
+        series = column.loc[column.first_valid_index():].fillna(0)
+        histories[name] = pd.DataFrame({'ds': series.index, 'y': series.to_numpy(dtype=np.float64)})
+    return histories
+
+
+def _check_request(period_days: int, engine: Optional[str]) -> str:
+    engine = engine or FORECAST_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(ENGINES)}")
+    if period_days > MAX_FORECAST_DAYS:
+        raise ValueError(f"forecast period can be at most {MAX_FORECAST_DAYS} days")
+    return engine
+
+
+def ets_forecast(historical_data: pd.DataFrame, period_days: int) -> Dict:
+    """
+    holt-winters forecast of the history, in the response format
+    """
+    model = ets_service.fit_ets(historical_data['y'].to_numpy())
+    bounds = model.forecast(period_days)
+    dates = pd.date_range(historical_data['ds'].max() + pd.Timedelta(days=1), periods=period_days, freq='D')
+    return {
+        "dates": [d.strftime("%Y-%m-%d") for d in dates],
+        "predicted": bounds["predicted"].tolist(),
+        "lower": bounds["lower"].tolist(),
+        "upper": bounds["upper"].tolist()
+    }
+
+
+def _cached_ets_forecast(historical_data: pd.DataFrame) -> Tuple[Dict, bool]:
+    """
+    the MAX_FORECAST_DAYS ets forecast of a history, and whether it was already cached
+    ets is cheap enough that it's only kept in memory
+    """
+    digest = hashlib.sha256(f"ets:{_MODEL_FORMAT}".encode())
+    digest.update(historical_data['ds'].to_numpy(dtype="datetime64[D]").astype(np.int64).tobytes())
+    digest.update(historical_data['y'].to_numpy(dtype=np.float64).tobytes())
+    fingerprint = digest.hexdigest()
+    
+    forecast = _recall(fingerprint)
+    if forecast is not None:
+        return forecast, True
+    forecast = ets_forecast(historical_data, MAX_FORECAST_DAYS)
+    _remember(fingerprint, forecast)
+    return forecast, False
+
+
+class ProphetUnavailableError(ValueError):
+    """
+    prophet or its stan backend isn't installed properly, nothing can be fitted with it
+    """
+
+
+def _prefer_ets(historical_data: pd.DataFrame) -> bool:
+    # short histories, or a prophet fit would have to wait for a worker
+    return len(historical_data) < AUTO_PROPHET_MIN_DAYS or fitting_service.is_busy()
+
+
+def model_settings(historical_data: pd.DataFrame) -> Dict:
+    """
+    prophet hyperparameters for a history, they're picked from the data so the same
+    history always gets the same ones
+    """
+    # Determine if we have enough data for yearly seasonality
+    data_days = len(historical_data)
+    has_yearly = data_days >= 365  # Need at least a year for yearly seasonality
+    
+    # Remove zero-revenue days for trend calculation (they're just missing data)
+    non_zero_data = historical_data[historical_data['y'] > 0].copy()
+    
+    if len(non_zero_data) < 7:
+        # If we don't have enough non-zero data, use all data
+        non_zero_data = historical_data.copy()
+    
+    # Calculate growth trend more conservatively
+    # Use median instead of mean to reduce impact of outliers
+    if len(non_zero_data) >= 14:
+        # Compare first half vs second half (more stable than head/tail)
+        mid_point = len(non_zero_data) // 2
+        early_median = non_zero_data.head(mid_point)['y'].median()
+        recent_median = non_zero_data.tail(mid_point)['y'].median()
+    else:
+        # For very short datasets, compare first 30% vs last 30%
+        early_size = max(1, int(len(non_zero_data) * 0.3))
+        recent_size = max(1, int(len(non_zero_data) * 0.3))
+        early_median = non_zero_data.head(early_size)['y'].median()
+        recent_median = non_zero_data.tail(recent_size)['y'].median()
+    
+    growth_rate = (recent_median - early_median) / max(early_median, 1) if early_median > 0 else 0
+    
+    # For short datasets (< 30 days), use flat growth to avoid misleading trends
+    # Only use linear growth if we have enough data AND a clear, sustained trend
+    if data_days < 30:
+        # Short dataset: use flat growth (mean-reverting)
+        growth = 'linear'
+        # Cap the growth to prevent extreme extrapolation
+        changepoint_scale = 0.01  # Very conservative for short data
+        seasonality_scale = 5.0   # Less seasonality for short data
+    elif abs(growth_rate) > 0.2 and data_days >= 30:
+        # Clear trend with enough data: use linear growth
+        growth = 'linear'
+        changepoint_scale = 0.05
+        seasonality_scale = 10.0
+    else:
+        # No clear trend or insufficient data: use flat growth
+        growth = 'linear'
+        changepoint_scale = 0.01  # Conservative
+        seasonality_scale = 5.0
+    
+    # For very short datasets, disable daily seasonality (not meaningful)
+    use_daily_seasonality = data_days >= 14
+    
+    return {
+        "daily_seasonality": use_daily_seasonality,
+        "weekly_seasonality": True if data_days >= 7 else False,
+        "yearly_seasonality": has_yearly,
+        "growth": growth,
+        "changepoint_prior_scale": changepoint_scale,  # More conservative for short data
+        "seasonality_prior_scale": seasonality_scale,
+        "interval_width": 0.95,  # 95% confidence interval
+        "mcmc_samples": 0,  # Use MAP estimation (faster, good for most cases)
+        "uncertainty_samples": 1000  # More samples for better confidence intervals
+    }
+
+
+def series_fingerprint(historical_data: pd.DataFrame, settings: Dict) -> str:
+    """
+    hash of the history, the model settings and everything else that changes a forecast,
+    equal fingerprints can share one fitted model
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        {"format": _MODEL_FORMAT, "prophet": _prophet_version(), "settings": settings},
+        sort_keys=True
+    ).encode())
+    digest.update(historical_data['ds'].to_numpy(dtype="datetime64[D]").astype(np.int64).tobytes())
+    digest.update(historical_data['y'].to_numpy(dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _load_forecast(fingerprint: str, historical_data: pd.DataFrame) -> Optional[Dict]:
+    """
+    the stored MAX_FORECAST_DAYS forecast for a fingerprint, None if it was never fitted
+    a stored model with a shorter forecast (MAX_FORECAST_DAYS went up) is predicted
+    again without refitting
+    """
+    forecast = _recall(fingerprint)
+    if forecast is not None:
+        return forecast
+
+    path = MODEL_STORE_DIR / f"{fingerprint}.json"
+    try:
+        entry = json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"ignoring unreadable model store entry {path.name}: {str(e)}")
+        path.unlink(missing_ok=True)
+        return None
+
+    forecast = entry["forecast"]
+    if len(forecast["dates"]) < MAX_FORECAST_DAYS:
+        from prophet.serialize import model_from_json
+        forecast = _predict(model_from_json(entry["model"]), historical_data, MAX_FORECAST_DAYS)
+        _store_forecast(fingerprint, entry["model"], forecast)
+        return forecast
+
+    # newer mtime = used more recently, pruning goes by it
+    os.utime(path)
+    _remember(fingerprint, forecast)
+    return forecast
+
+
+def _store_forecast(fingerprint: str, model_json: str, forecast: Dict):
+    """
+    write a fitted model and its forecast to the model store, then prune the oldest files
+    a store that can't be written to only costs the refit next time
+    """
+    _remember(fingerprint, forecast)
+    try:
+        MODEL_STORE_DIR.mkdir(parents=True, exist_ok=True)
+        path = MODEL_STORE_DIR / f"{fingerprint}.json"
+        partial = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        partial.write_text(json.dumps({"model": model_json, "forecast": forecast}))
+        # readers never see a half written file
+        os.replace(partial, path)
+
+        entries = sorted(MODEL_STORE_DIR.glob("*.json"), key=lambda entry: entry.stat().st_mtime)
+        for old in entries[:max(len(entries) - MODEL_STORE_MAX_ENTRIES, 0)]:
+            old.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"could not write the model store: {str(e)}")
+
+
+def _prophet_version() -> str:
+    # from the package metadata, importing prophet just for this would be slow
+    try:
+        return importlib.metadata.version("prophet")
+    except importlib.metadata.PackageNotFoundError:
+        return "missing"
+
+
+def _recall(fingerprint: str) -> Optional[Dict]:
+    with _recent_lock:
+        forecast = _recent.get(fingerprint)
+        if forecast is not None:
+            _recent.move_to_end(fingerprint)
+        return forecast
+
+
+def _remember(fingerprint: str, forecast: Dict):
+    with _recent_lock:
+        _recent[fingerprint] = forecast
+        _recent.move_to_end(fingerprint)
+        while len(_recent) > _RECENT_SIZE:
+            _recent.popitem(last=False)
+
+
+def fit_forecast(historical_data: pd.DataFrame, settings: Dict, period_days: int) -> Tuple[str, Dict]:
+    """
+    runs in a fitting worker: fit the model and predict period_days ahead
+    returns the serialized model and the forecast
+    """
+    from prophet.serialize import model_to_json
+    model = _fit_model(historical_data, settings)
+    return model_to_json(model), _predict(model, historical_data, period_days)
+
+
+def _fit_model(historical_data: pd.DataFrame, settings: Dict):
+    # prophet takes a second or more to import, ets-only processes never pay for it
+    try:
+        from prophet import Prophet
+    except ImportError as e:
+        raise ProphetUnavailableError(f"prophet is not installed: {str(e)}")
+    
     # initialize prophet model with improved parameters for accuracy
     # prophet works best with daily data and handles seasonality automatically
     try:
-        # Determine if we have enough data for yearly seasonality
-        data_days = len(historical_data)
-        has_yearly = data_days >= 365  # Need at least a year for yearly seasonality
-        
-        # Remove zero-revenue days for trend calculation (they're just missing data)
-        non_zero_data = historical_data[historical_data['y'] > 0].copy()
-        
-        if len(non_zero_data) < 7:
-            # If we don't have enough non-zero data, use all data
-            non_zero_data = historical_data.copy()
-        
-        # Calculate growth trend more conservatively
-        # Use median instead of mean to reduce impact of outliers
-        if len(non_zero_data) >= 14:
-            # Compare first half vs second half (more stable than head/tail)
-            mid_point = len(non_zero_data) // 2
-            early_median = non_zero_data.head(mid_point)['y'].median()
-            recent_median = non_zero_data.tail(mid_point)['y'].median()
-        else:
-            # For very short datasets, compare first 30% vs last 30%
-            early_size = max(1, int(len(non_zero_data) * 0.3))
-            recent_size = max(1, int(len(non_zero_data) * 0.3))
-            early_median = non_zero_data.head(early_size)['y'].median()
-            recent_median = non_zero_data.tail(recent_size)['y'].median()
-        
-        growth_rate = (recent_median - early_median) / max(early_median, 1) if early_median > 0 else 0
-        
-        # For short datasets (< 30 days), use flat growth to avoid misleading trends
-        # Only use linear growth if we have enough data AND a clear, sustained trend
-        if data_days < 30:
-            # Short dataset: use flat growth (mean-reverting)
-            growth = 'linear'
-            # Cap the growth to prevent extreme extrapolation
-            changepoint_scale = 0.01  # Very conservative for short data
-            seasonality_scale = 5.0   # Less seasonality for short data
-        elif abs(growth_rate) > 0.2 and data_days >= 30:
-            # Clear trend with enough data: use linear growth
-            growth = 'linear'
-            changepoint_scale = 0.05
-            seasonality_scale = 10.0
-        else:
-            # No clear trend or insufficient data: use flat growth
-            growth = 'linear'
-            changepoint_scale = 0.01  # Conservative
-            seasonality_scale = 5.0
-        
-        # For very short datasets, disable daily seasonality (not meaningful)
-        use_daily_seasonality = data_days >= 14
-        
-        model = Prophet(
-            daily_seasonality=use_daily_seasonality,
-            weekly_seasonality=True if data_days >= 7 else False,
-            yearly_seasonality=has_yearly,
-            growth=growth,
-            changepoint_prior_scale=changepoint_scale,  # More conservative for short data
-            seasonality_prior_scale=seasonality_scale,
-            interval_width=0.95,  # 95% confidence interval
-            mcmc_samples=0,  # Use MAP estimation (faster, good for most cases)
-            uncertainty_samples=1000  # More samples for better confidence intervals
-        )
+        model = Prophet(**settings)
         
         # fit the model
         model.fit(historical_data)
     except AttributeError as e:
         if 'stan_backend' in str(e):
             logger.error("Prophet stan_backend error - cmdstanpy may need reinstallation")
-            raise ValueError("Forecasting service configuration error. Please ensure cmdstanpy is properly installed.")
+            raise ProphetUnavailableError("Forecasting service configuration error. Please ensure cmdstanpy is properly installed.")
         raise ValueError(f"forecasting model initialization failed: {str(e)}")
     except Exception as e:
         logger.error(f"prophet model fitting failed: {str(e)}")
         raise ValueError(f"forecasting model failed: {str(e)}")
+    return model
+
+
+def _predict(model, historical_data: pd.DataFrame, period_days: int) -> Dict:
+    """
+    the next period_days of the fitted model, in the response format
+    """
+    data_days = len(historical_data)
     
     # create future dataframe for the forecast period
     future = model.make_future_dataframe(periods=period_days)
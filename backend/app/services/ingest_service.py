@@ -0,0 +1,481 @@
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+import pandas as pd
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from app.models import IngestJob, UploadedFile
+from app.services import reader_service, sales_service, validation_service
+
+try:
+    import fcntl
+except ImportError:
+    # windows, jobs are only claimed within one process there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# rows per chunk when streaming an upload, each chunk is validated and committed on its own
+DEFAULT_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "50000"))
+
+# where background uploads are staged until their job finishes
+STAGING_DIR = Path(os.getenv("UPLOAD_STAGING_DIR", "./uploads"))
+
+# number of background ingest jobs that run at the same time
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+FINISHED_STATUSES = ("completed", "failed")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def ingest_chunk(
+    chunk: pd.DataFrame,
+    db: Session,
+    commit: bool = True,
+    occurrences: Optional[sales_service.RowOccurrences] = None
+) -> Dict:
+    """
+    validate one chunk and insert its clean rows in a single transaction
+    with commit=False the caller commits, so it can record progress in the same transaction
+    occurrences is shared by all chunks of a file, so repeat purchases split over two
+    chunks are told apart like within one
+    returns a per-chunk report with the validation results attached
+    """
+    warnings, errors = validation_service.validate_csv_data(chunk)
+
+    if validation_service.has_severe_errors(errors):
+        error_messages = [error.get('message', 'unknown error') for error in errors]
+        raise ValueError(f"upload blocked due to severe data quality issues: {'; '.join(error_messages)}")
+
+    df_clean = chunk.dropna(subset=sales_service.REQUIRED_COLUMNS)
+
+    inserted = 0
+    duplicates = 0
+    failure = None
+    if not df_clean.empty:
+        try:
+            result = sales_service.bulk_insert_sales(df_clean, db, commit=commit, occurrences=occurrences)
+            inserted = result["inserted"]
+            duplicates = result["duplicates"]
+        except ValueError as e:
+            # every row in the chunk was invalid, nothing was written
+            failure = str(e)
+        except Exception as e:
+            db.rollback()
+            failure = f"error inserting data: {str(e)}"
+            logger.error(f"chunk insert failed: {failure}")
+
+    report = {
+        "start_row": int(chunk.index[0]) + 1,
+        "rows": len(chunk),
+        "inserted": inserted,
+        "duplicates": duplicates,
+        "rejected": len(chunk) - inserted - duplicates,
+        "warnings": warnings,
+        "errors": errors,
+    }
+    if failure:
+        report["error"] = failure
+    return report
+
+
+def ingest_stream(
+    fileobj: BinaryIO,
+    db: Session,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    file_format: str = "csv"
+) -> Dict:
+    """
+    stream an upload (csv, parquet or arrow) into the sales table chunk by chunk
+    only one chunk is held in memory at a time, so peak memory depends on
+    chunk_size and not on the size of the file
+    raises ValueError if the file can't be read or the first chunk is unusable
+    """
+    chunks: List[Dict] = []
+    merged = ([], [])
+    total_rows = 0
+    total_inserted = 0
+    total_duplicates = 0
+    aborted = None
+    occurrences = sales_service.RowOccurrences()
+
+    chunk_iter = reader_service.iter_frames(fileobj, file_format, chunk_size)
+    while True:
+        try:
+            chunk = next(chunk_iter)
+        except StopIteration:
+            break
+        except reader_service.FileReadError as e:
+            if not chunks:
+                raise
+            # earlier chunks are already committed, stop here and report what we have
+            aborted = str(e)
+            break
+
+        report = ingest_chunk(chunk, db, occurrences=occurrences)
+        total_rows += report["rows"]
+        total_inserted += report["inserted"]
+        total_duplicates += report["duplicates"]
+        chunk_warnings = report.pop("warnings")
+        chunk_errors = report.pop("errors")
+        merged = validation_service.merge_validation_results(
+            merged, (chunk_warnings, chunk_errors), total_rows
+        )
+
+        report["chunk"] = len(chunks) + 1
+        report["warning_count"] = len(chunk_warnings)
+        report["error_count"] = len(chunk_errors)
+        chunks.append(report)
+        logger.info(f"chunk {report['chunk']}: {report['inserted']}/{report['rows']} rows inserted")
+
+    if total_rows == 0:
+        raise ValueError(f"{file_format} file contains no data rows")
+
+    warnings, errors = merged
+    result = {
+        "rows_inserted": total_inserted,
+        "rows_duplicate": total_duplicates,
+        "rows_rejected": total_rows - total_inserted - total_duplicates,
+        "chunk_size": chunk_size,
+        "chunks": chunks,
+        "warnings": warnings,
+        "errors": errors,
+        "summary": validation_service.get_validation_summary(None, warnings, errors, total_rows=total_rows)
+    }
+    if aborted:
+        result["aborted"] = aborted
+    return result
+
+
+def fully_ingested(result: Dict) -> bool:
+    """
+    whether ingest_stream got through the whole file with every chunk written, only
+    then may the file be recorded as uploaded (a retry of it must not be skipped)
+    """
+    return not result.get("aborted") and not any("error" in chunk for chunk in result["chunks"])
+
+
+def fingerprint_file(fileobj: BinaryIO) -> str:
+    """
+    sha256 of the whole upload, read in 1mb blocks, the file position is reset afterwards
+    """
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def find_uploaded_file(fingerprint: str, db: Session) -> Optional[UploadedFile]:
+    """
+    the earlier upload with this exact content, if there was one
+    """
+    return db.query(UploadedFile).filter(UploadedFile.sha256 == fingerprint).first()
+
+
+def record_uploaded_file(fingerprint: str, filename: str, user_id: int, rows_inserted: int, db: Session):
+    """
+    remember a fully ingested file so an identical re-upload is skipped
+    """
+    db.add(UploadedFile(
+        sha256=fingerprint,
+        filename=filename,
+        user_id=user_id,
+        rows_inserted=rows_inserted
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent upload of the same file got there first
+        db.rollback()
+
+
+def stage_upload(fileobj: BinaryIO) -> Tuple[Path, int]:
+    """
+    copy an upload to the staging directory so a worker can read it after the request ends
+    returns (path, size in bytes)
+    """
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    path = STAGING_DIR / f"{uuid.uuid4().hex}.upload"
+    with open(path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, length=1024 * 1024)
+    return path, path.stat().st_size
+
+
+def create_ingest_job(
+    fileobj: BinaryIO,
+    filename: str,
+    user_id: int,
+    db: Session,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    fingerprint: Optional[str] = None,
+    file_format: str = "csv",
+    compression: Optional[str] = None
+) -> IngestJob:
+    """
+    stage the upload and record a queued job for it
+    compressed uploads are staged as they are and only decompressed by the worker
+    """
+    path, _ = stage_upload(fileobj)
+    return create_staged_ingest_job(
+        path, filename, user_id, db, chunk_size=chunk_size,
+        fingerprint=fingerprint, file_format=file_format, compression=compression
+    )
+
+
+def create_staged_ingest_job(
+    path: Path,
+    filename: str,
+    user_id: int,
+    db: Session,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    fingerprint: Optional[str] = None,
+    file_format: str = "csv",
+    compression: Optional[str] = None
+) -> IngestJob:
+    """
+    record a queued job for a file that is already in the staging directory,
+    the job takes ownership of the file and removes it when it finishes
+    """
+    job = IngestJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=filename,
+        file_path=str(path),
+        fingerprint=fingerprint,
+        file_format=file_format,
+        compression=compression,
+        status="queued",
+        chunk_size=chunk_size,
+        total_bytes=Path(path).stat().st_size,
+        warnings=[],
+        errors=[],
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def submit_ingest_job(job_id: str, session_factory: Callable[[], Session]):
+    """
+    hand a job to the worker pool, the worker opens its own session from session_factory
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+    return _executor.submit(run_ingest_job, job_id, session_factory)
+
+
+def run_ingest_job(job_id: str, session_factory: Callable[[], Session]):
+    """
+    parse, validate and insert a staged upload chunk by chunk
+    each chunk and the job's progress are committed together, so after a restart the
+    job picks up at the first chunk that wasn't committed
+    the worker claims the job by locking its staged file for as long as it runs, so a job
+    that another process (api worker, cli) is already running is left alone
+    """
+    db = session_factory()
+    try:
+        job = db.get(IngestJob, job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return
+
+        with _claim_staged_file(job.file_path) as staged:
+            # another process may have finished it since it was read
+            db.refresh(job)
+            if job.status in FINISHED_STATUSES:
+                return
+            if staged is None:
+                if os.path.exists(job.file_path):
+                    logger.info(f"ingest job {job_id} is running in another process")
+                    return
+                raise FileNotFoundError(f"staged upload file is missing: {job.file_path}")
+
+            job.status = "running"
+            if job.started_at is None:
+                job.started_at = _utcnow()
+            db.commit()
+
+            _process_job(job, staged, db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"ingest job {job_id} failed: {str(e)}")
+        job = db.get(IngestJob, job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = str(e)
+            job.finished_at = _utcnow()
+            db.commit()
+            _remove_staged_file(job.file_path)
+    finally:
+        db.close()
+
+
+def _process_job(job: IngestJob, f: BinaryIO, db: Session):
+    merged = (list(job.warnings or []), list(job.errors or []))
+    already_done = job.chunks_processed
+
+    file_format = job.file_format or "csv"
+    occurrences = sales_service.RowOccurrences()
+
+    source = reader_service.open_upload(f, job.compression)
+    chunks = reader_service.iter_frames(source, file_format, job.chunk_size)
+    for index, chunk in enumerate(chunks):
+        if index < already_done:
+            # committed before a restart, only its repeat purchases need counting again
+            sales_service.prepare_sales_rows(chunk, occurrences=occurrences)
+            continue
+
+        report = ingest_chunk(chunk, db, commit=False, occurrences=occurrences)
+        if "error" in report:
+            # the job goes on with the next chunk, but the file isn't fully in
+            job.error = f"chunk {index + 1}: {report['error']}"
+        job.rows_processed += report["rows"]
+        job.rows_inserted += report["inserted"]
+        job.rows_rejected += report["rejected"]
+        job.rows_duplicate += report["duplicates"]
+        merged = validation_service.merge_validation_results(
+            merged, (report["warnings"], report["errors"]), job.rows_processed
+        )
+        job.warnings, job.errors = merged
+        job.chunks_processed += 1
+        # progress is measured on the staged (possibly compressed) file
+        job.bytes_processed = min(f.tell(), job.total_bytes)
+        db.commit()
+
+    if job.rows_processed == 0:
+        raise ValueError(f"{file_format} file contains no data rows")
+
+    warnings, errors = merged
+    job.summary = validation_service.get_validation_summary(None, warnings, errors, total_rows=job.rows_processed)
+    job.status = "completed"
+    job.bytes_processed = job.total_bytes
+    job.finished_at = _utcnow()
+    db.commit()
+    _remove_staged_file(job.file_path)
+    
+    if job.fingerprint and job.error is None:
+        record_uploaded_file(job.fingerprint, job.filename, job.user_id, job.rows_inserted, db)
+
+
+def resume_pending_jobs(session_factory: Callable[[], Session]) -> int:
+    """
+    requeue jobs that were queued or running when the api last stopped
+    every process calls this when it starts, a job that another process is still running
+    is skipped by its worker (see run_ingest_job), so it's never ingested twice
+    returns the number of jobs resubmitted
+    """
+    db = session_factory()
+    try:
+        pending = db.query(IngestJob).filter(IngestJob.status.in_(["queued", "running"])).all()
+        resumed = 0
+        for job in pending:
+            if not os.path.exists(job.file_path):
+                # only if it's still pending, a process that just finished it removed the file
+                db.query(IngestJob).filter(
+                    IngestJob.id == job.id, IngestJob.status.in_(["queued", "running"])
+                ).update({
+                    "status": "failed",
+                    "error": "staged upload file is missing",
+                    "finished_at": _utcnow(),
+                }, synchronize_session=False)
+                continue
+            submit_ingest_job(job.id, session_factory)
+            resumed += 1
+        db.commit()
+    finally:
+        db.close()
+
+    if resumed:
+        logger.info(f"resumed {resumed} ingest jobs")
+    return resumed
+
+
+def job_to_dict(job: IngestJob) -> Dict:
+    """
+    job status with throughput and a rough eta based on bytes read so far
+    """
+    rows_per_sec = None
+    eta_seconds = None
+    if job.started_at is not None:
+        end = _as_utc(job.finished_at) if job.finished_at else _utcnow()
+        elapsed = max((end - _as_utc(job.started_at)).total_seconds(), 1e-6)
+        rows_per_sec = round(job.rows_processed / elapsed, 1)
+        if job.status == "running" and job.bytes_processed > 0:
+            remaining = job.total_bytes - job.bytes_processed
+            eta_seconds = round(elapsed * remaining / job.bytes_processed, 1)
+
+    progress = job.bytes_processed / job.total_bytes if job.total_bytes else 0
+
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "progress": round(progress, 4),
+        "chunks_processed": job.chunks_processed,
+        "rows_processed": job.rows_processed,
+        "rows_inserted": job.rows_inserted,
+        "rows_rejected": job.rows_rejected,
+        "rows_duplicate": job.rows_duplicate,
+        "rows_per_sec": rows_per_sec,
+        "eta_seconds": eta_seconds,
+        "warnings": job.warnings or [],
+        "errors": job.errors or [],
+        "summary": job.summary,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@contextmanager
+def _claim_staged_file(path: str):
+    """
+    open the staged file with an exclusive lock on it, gives None if it's gone or
+    another process holds the lock
+    the lock goes away with the file handle, also when the process holding it dies, so a
+    job whose worker crashed can be claimed again
+    (staging has to be shared by every process that resumes jobs anyway, they read from it)
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        yield None
+        return
+    with f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield None
+                return
+        yield f
+
+
+def _remove_staged_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # sqlite hands datetimes back without a timezone
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
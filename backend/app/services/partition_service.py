@@ -0,0 +1,215 @@
+from typing import Dict, Iterable, List, Optional
+from datetime import date
+from sqlalchemy import Column, ForeignKey, Index, MetaData, PrimaryKeyConstraint, Table, text
+from sqlalchemy.orm import Session
+import numpy as np
+import logging
+import os
+import re
+from app.models import Category, Sale
+from app.services import rollup_service
+
+logger = logging.getLogger(__name__)
+
+# "monthly" creates the sales table range partitioned by month on postgres, only
+# applies when the table doesn't exist yet (a new database), sqlite ignores it
+SALES_PARTITIONING = os.getenv("SALES_PARTITIONING", "none").lower()
+PARTITIONING_ENABLED = SALES_PARTITIONING == "monthly"
+
+# partitions are named sales_pYYYY_MM and hold [first of month, first of next month)
+_PARTITION_NAME = re.compile(r"^sales_p(\d{4})_(\d{2})$")
+
+# advisory lock taken while creating partitions so concurrent uploads don't race
+_PARTITION_LOCK_KEY = 7401
+
+# connection.info key caching whether the sales table is partitioned
+_PARTITIONED_KEY = "sales_partitioned"
+
+
+def create_partitioned_sales(engine) -> bool:
+    """
+    create the sales table partitioned by month, before create_tables runs
+    does nothing on sqlite or when the table already exists (partitioning an existing
+    table means copying it, which is left to a manual migration)
+    returns True if the table was created
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": Sale.__tablename__}).scalar() is not None:
+            return False
+        # sales references it
+        Category.__table__.create(conn, checkfirst=True)
+        _partitioned_sales_table().create(conn)
+    logger.info("created sales table partitioned by month")
+    return True
+
+
+def is_partitioned(db: Session) -> bool:
+    """
+    whether the sales table this session sees is partitioned, cached per connection
+    """
+    connection = db.connection()
+    if connection.dialect.name != "postgresql":
+        return False
+    if _PARTITIONED_KEY not in connection.info:
+        connection.info[_PARTITIONED_KEY] = connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"
+        ), {"name": Sale.__tablename__}).scalar()
+    return connection.info[_PARTITIONED_KEY]
+
+
+def row_hash_conflict_columns(db: Session) -> List[str]:
+    """
+    the ON CONFLICT target for skipping stored rows, a partitioned table's unique index
+    has to include the date (the hash covers the date, so it dedupes the same)
+    """
+    return ["row_hash", "date"] if is_partitioned(db) else ["row_hash"]
+
+
+def ensure_partitions(db: Session, days: Iterable) -> List[str]:
+    """
+    create the monthly partitions the given sale dates need, in the caller's transaction
+    called before every insert, a no-op unless the table is partitioned
+    returns the names of the partitions created
+    """
+    if not is_partitioned(db):
+        return []
+    months = np.unique(np.asarray(days, dtype="datetime64[M]")).astype(str)
+    existing = set(_attached_partitions(db))
+    missing = [month for month in months.tolist() if month not in existing]
+    if not missing:
+        return []
+
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PARTITION_LOCK_KEY})
+    # another upload may have created some of them while we waited for the lock
+    existing = set(_attached_partitions(db))
+    created = []
+    for month in missing:
+        if month in existing:
+            continue
+        created.append(_create_partition(db, month))
+    if created:
+        logger.info(f"created sales partitions: {', '.join(created)}")
+    return created
+
+
+def create_partitions(db: Session, start: date, end: date) -> List[str]:
+    """
+    create the partitions for every month from start to end ahead of time
+    """
+    if not is_partitioned(db):
+        raise ValueError("the sales table is not partitioned")
+    months = np.arange(np.datetime64(start, "M"), np.datetime64(end, "M") + 1)
+    created = ensure_partitions(db, months)
+    db.commit()
+    return created
+
+
+def list_partitions(db: Session) -> List[Dict]:
+    """
+    attached partitions in month order, with the planner's row estimate
+    """
+    if not is_partitioned(db):
+        return []
+    rows = db.execute(text(
+        "SELECT c.relname, c.reltuples FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+    ), {"name": Sale.__tablename__}).all()
+    return [
+        {"name": name, "month": _partition_month(name), "estimated_rows": max(int(tuples), 0)}
+        for name, tuples in rows
+        if _partition_month(name) is not None
+    ]
+
+
+def detach_partitions(db: Session, before: date, drop: bool = False, keep_aggregates: bool = False) -> List[str]:
+    """
+    take the partitions of months before `before` out of the sales table
+    detached partitions are renamed to <name>_detached and kept as plain tables (to archive
+    or query), with drop=True they're dropped instead, both only touch the catalog
+    unless keep_aggregates is set the rollup rows for those months are removed and the
+    customer totals rebuilt, so stats stop counting the removed sales
+    returns the partitions removed
+    """
+    if not is_partitioned(db):
+        raise ValueError("the sales table is not partitioned")
+    cutoff = np.datetime64(before, "M")
+    names = [name for month, name in _attached_partitions(db).items() if month < str(cutoff)]
+    for name in sorted(names):
+        if drop:
+            db.execute(text(f'DROP TABLE "{name}"'))
+        else:
+            db.execute(text(f'ALTER TABLE sales DETACH PARTITION "{name}"'))
+            db.execute(text(f'ALTER TABLE "{name}" RENAME TO "{name}_detached"'))
+    db.commit()
+
+    if names and not keep_aggregates:
+        last_day = (cutoff.astype("datetime64[D]") - 1).item()
+        rollup_service.rebuild_rollup(db, end_date=last_day)
+        rollup_service.rebuild_customer_totals(db)
+    return sorted(names)
+
+
+def _partitioned_sales_table() -> Table:
+    """
+    a copy of the Sale model's table, partitioned by date
+    postgres wants the partition key in the primary key and in every unique index, so
+    date is added to those, the columns and other indexes are the model's own
+    """
+    metadata = MetaData()
+    # the foreign key needs its target in the same metadata
+    Category.__table__.to_metadata(metadata)
+    source = Sale.__table__
+    columns = [
+        Column(
+            column.name, column.type, *[ForeignKey(fk.target_fullname) for fk in column.foreign_keys],
+            nullable=column.nullable, autoincrement=column.primary_key
+        )
+        for column in source.columns
+    ]
+    table = Table(
+        source.name, metadata, *columns,
+        PrimaryKeyConstraint(*source.primary_key.columns.keys(), "date"),
+        postgresql_partition_by="RANGE (date)"
+    )
+    for index in source.indexes:
+        names = [column.name for column in index.columns]
+        if index.unique and "date" not in names:
+            names.append("date")
+        Index(index.name, *[table.c[name] for name in names], unique=index.unique)
+    return table
+
+
+def _attached_partitions(db: Session) -> Dict:
+    """
+    month ("YYYY-MM") -> partition name for our partitions attached to sales
+    """
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name)"
+    ), {"name": Sale.__tablename__}).scalars().all()
+    partitions = {}
+    for name in names:
+        month = _partition_month(name)
+        if month is not None:
+            partitions[month] = name
+    return partitions
+
+
+def _create_partition(db: Session, month: str) -> str:
+    name = f"sales_p{month.replace('-', '_')}"
+    month = np.datetime64(month, "M")
+    start = month.astype("datetime64[D]")
+    end = (month + 1).astype("datetime64[D]")
+    db.execute(text(
+        f"CREATE TABLE \"{name}\" PARTITION OF sales FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    return name
+
+
+def _partition_month(name: str) -> Optional[str]:
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return f"{match.group(1)}-{match.group(2)}"
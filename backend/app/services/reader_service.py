@@ -0,0 +1,293 @@
+from typing import BinaryIO, Iterator, Optional
+import pandas as pd
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import os
+
+logger = logging.getLogger(__name__)
+
+# try to import pyarrow, csv uploads still work without it
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow library not installed. parquet and arrow uploads will not work.")
+
+# zstd needs the zstandard package, gzip, bz2 and xz come with python
+try:
+    import zstandard
+    ZSTANDARD_AVAILABLE = True
+except ImportError:
+    ZSTANDARD_AVAILABLE = False
+    logger.warning("zstandard library not installed. .zst uploads will not work.")
+
+# upload formats by file extension
+FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+# compressed csv uploads by suffix, e.g. sales.csv.gz
+COMPRESSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+}
+
+# a compressed upload that inflates more than this many times over is treated as a
+# decompression bomb, the first few mb are always allowed so tiny files aren't flagged
+MAX_DECOMPRESSION_RATIO = int(os.getenv("MAX_DECOMPRESSION_RATIO", "200"))
+DECOMPRESSION_RATIO_GRACE_BYTES = 1024 * 1024
+
+# size of the reads pulled through the decompressor
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class FileReadError(ValueError):
+    """
+    the upload couldn't be read (bad csv, corrupt parquet, ...)
+    """
+
+
+class DecompressedSizeError(FileReadError):
+    """
+    a compressed upload inflated past the size limit or the bomb guard
+    """
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    """
+    upload format from the file name (ignoring a compression suffix), None if it
+    isn't a format we read
+    """
+    if not filename:
+        return None
+    name = filename.lower()
+    compression = detect_compression(name)
+    if compression is not None:
+        name = name[:name.rindex(".")]
+    for extension, fmt in FORMATS.items():
+        if name.endswith(extension):
+            return fmt
+    return None
+
+
+def detect_compression(filename: Optional[str]) -> Optional[str]:
+    """
+    compression codec from the file name suffix, None for an uncompressed file
+    """
+    if not filename:
+        return None
+    name = filename.lower()
+    for extension, compression in COMPRESSIONS.items():
+        if name.endswith(extension):
+            return compression
+    return None
+
+
+def open_upload(fileobj: BinaryIO, compression: Optional[str], max_bytes: Optional[int] = None) -> BinaryIO:
+    """
+    file object that decompresses the upload as it is read, nothing is inflated up front
+    max_bytes caps the decompressed size, and any compressed upload is checked against
+    MAX_DECOMPRESSION_RATIO, both raise DecompressedSizeError while reading
+    uncompressed uploads are returned as they are
+    """
+    if compression is None:
+        return fileobj
+
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    elif compression == "bz2":
+        stream = bz2.BZ2File(fileobj, mode="rb")
+    elif compression == "xz":
+        stream = lzma.LZMAFile(fileobj, mode="rb")
+    elif compression == "zstd":
+        if not ZSTANDARD_AVAILABLE:
+            raise FileReadError("zstandard library not installed, can't read .zst files")
+        stream = zstandard.ZstdDecompressor().stream_reader(fileobj, read_size=READ_BLOCK_SIZE)
+    else:
+        raise FileReadError(f"unsupported compression: {compression}")
+
+    guarded = _GuardedReader(stream, fileobj, max_bytes)
+    return io.BufferedReader(guarded, buffer_size=READ_BLOCK_SIZE)
+
+
+class _GuardedReader(io.RawIOBase):
+    """
+    counts decompressed bytes and stops reading once a limit is crossed
+    """
+
+    def __init__(self, stream, source: BinaryIO, max_bytes: Optional[int]):
+        self._stream = stream
+        self._source = source
+        self._max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        try:
+            count = self._stream.readinto(buffer)
+        except Exception as e:
+            # truncated or corrupt data, each codec has its own exception type
+            raise FileReadError(f"error decompressing upload: {str(e)}")
+        self.bytes_read += count
+        self._check_limits()
+        return count
+
+    def _check_limits(self):
+        if self._max_bytes is not None and self.bytes_read > self._max_bytes:
+            raise DecompressedSizeError(
+                f"decompressed file exceeds {self._max_bytes // (1024 * 1024)}mb limit"
+            )
+        compressed = max(self._source.tell(), 1)
+        if self.bytes_read > DECOMPRESSION_RATIO_GRACE_BYTES and self.bytes_read > compressed * MAX_DECOMPRESSION_RATIO:
+            raise DecompressedSizeError(
+                f"file expands more than {MAX_DECOMPRESSION_RATIO}x when decompressed, rejected as a possible decompression bomb"
+            )
+
+    def close(self):
+        self._stream.close()
+        super().close()
+
+
+def read_frame(fileobj: BinaryIO, fmt: str) -> pd.DataFrame:
+    """
+    read a whole upload into one dataframe
+    raises FileReadError if the file can't be read
+    """
+    if fmt == "csv":
+        try:
+            return pd.read_csv(fileobj)
+        except FileReadError:
+            raise
+        except pd.errors.EmptyDataError:
+            raise FileReadError("csv file is empty")
+        except pd.errors.ParserError as e:
+            raise FileReadError(f"error parsing csv: {str(e)}")
+        except Exception as e:
+            raise FileReadError(f"error reading csv: {str(e)}")
+
+    _require_pyarrow(fmt)
+    try:
+        if fmt == "parquet":
+            table = pq.read_table(fileobj)
+        else:
+            table = _open_ipc(fileobj).read_all()
+        return _to_pandas(table)
+    except FileReadError:
+        raise
+    except Exception as e:
+        raise FileReadError(f"error reading {fmt} file: {str(e)}")
+
+
+def iter_frames(fileobj: BinaryIO, fmt: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    yield the non-empty chunks of an upload, at most chunk_size rows each
+    chunks keep a running index so row numbers in reports match the whole file
+    raises FileReadError when the file can't be opened or breaks mid-stream
+    """
+    if fmt == "csv":
+        yield from _iter_csv(fileobj, chunk_size)
+        return
+
+    _require_pyarrow(fmt)
+    offset = 0
+    for batch in _iter_batches(fileobj, fmt, chunk_size):
+        if batch.num_rows == 0:
+            continue
+        frame = _to_pandas(batch)
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        offset += len(frame)
+        yield frame
+
+
+def _iter_csv(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        reader = pd.read_csv(fileobj, chunksize=chunk_size)
+    except FileReadError:
+        raise
+    except pd.errors.EmptyDataError:
+        raise FileReadError("csv file is empty")
+    except pd.errors.ParserError as e:
+        raise FileReadError(f"error parsing csv: {str(e)}")
+    except Exception as e:
+        raise FileReadError(f"error reading csv: {str(e)}")
+
+    with reader:
+        while True:
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            except FileReadError:
+                raise
+            except pd.errors.ParserError as e:
+                raise FileReadError(f"error parsing csv: {str(e)}")
+            except Exception as e:
+                # bad encoding (UnicodeDecodeError) or anything else the parser trips on midway
+                raise FileReadError(f"error reading csv: {str(e)}")
+            if not chunk.empty:
+                yield chunk
+
+
+def _iter_batches(fileobj: BinaryIO, fmt: str, chunk_size: int):
+    """
+    record batches straight from the file, parquet is read one row group at a time
+    """
+    try:
+        if fmt == "parquet":
+            batches = pq.ParquetFile(fileobj).iter_batches(batch_size=chunk_size)
+        else:
+            reader = _open_ipc(fileobj)
+            if isinstance(reader, ipc.RecordBatchFileReader):
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            else:
+                batches = iter(reader)
+
+        for batch in batches:
+            # ipc batches are however big the writer made them
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size)
+    except FileReadError:
+        raise
+    except Exception as e:
+        raise FileReadError(f"error reading {fmt} file: {str(e)}")
+
+
+def _open_ipc(fileobj: BinaryIO):
+    """
+    arrow ipc comes in two layouts, the random-access file format (.arrow / feather v2)
+    and the streaming format, try the file format first
+    """
+    try:
+        return ipc.open_file(fileobj)
+    except pa.ArrowInvalid:
+        fileobj.seek(0)
+        try:
+            return ipc.open_stream(fileobj)
+        except pa.ArrowInvalid:
+            raise FileReadError("file is not a valid arrow ipc file")
+
+
+def _to_pandas(data) -> pd.DataFrame:
+    # date32 columns become datetime64 instead of python date objects, so validation
+    # can use them as they are
+    return data.to_pandas(date_as_object=False)
+
+
+def _require_pyarrow(fmt: str):
+    if not PYARROW_AVAILABLE:
+        raise FileReadError(f"pyarrow library not installed, can't read {fmt} files")
@@ -0,0 +1,212 @@
+from typing import Dict, List, Optional
+from datetime import date
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+import pandas as pd
+import logging
+from app.models import CustomerTotal, DailyCategoryRevenue, Sale, SalesSummary
+from app.services import stats_cache_service
+
+logger = logging.getLogger(__name__)
+
+# primary key of the only sales_summary row
+SUMMARY_ID = 1
+
+
+def apply_inserted_sales(inserted: pd.DataFrame, db: Session) -> int:
+    """
+    add freshly inserted sales to the aggregate tables (daily rollup, customer totals and
+    the summary row), in the caller's transaction
+    inserted holds only the rows that actually went in (date, amount, category_id, customerID),
+    so skipped duplicates don't inflate the totals
+    returns the number of sales applied
+    """
+    if inserted.empty:
+        return 0
+
+    _apply_daily(inserted, db)
+    new_customers = _apply_customers(inserted, db)
+    db.execute(_upsert_adding(db, SalesSummary, ["id"], ["sale_count", "customer_count", "total_revenue"]), [{
+        "id": SUMMARY_ID,
+        "sale_count": len(inserted),
+        "customer_count": new_customers,
+        "total_revenue": float(inserted['amount'].sum()),
+    }])
+    return len(inserted)
+
+
+def rebuild_rollup(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    """
+    recompute the daily rollup from the sales table, for backfills or after editing sales by hand
+    only days in [start_date, end_date] are rebuilt when a range is given
+    returns the number of rollup rows written
+    """
+    rollup = DailyCategoryRevenue.__table__
+    clear = delete(rollup)
+    source = select(
+        Sale.date,
+        Sale.category_id,
+        func.sum(Sale.amount),
+        func.count(Sale.id)
+    ).group_by(Sale.date, Sale.category_id)
+
+    if start_date is not None:
+        clear = clear.where(rollup.c.date >= start_date)
+        source = source.where(Sale.date >= start_date)
+    if end_date is not None:
+        clear = clear.where(rollup.c.date <= end_date)
+        source = source.where(Sale.date <= end_date)
+
+    db.execute(clear)
+    result = db.execute(
+        insert(rollup).from_select(["date", "category_id", "revenue", "sale_count"], source)
+    )
+    stats_cache_service.mark_changed(db)
+    db.commit()
+    logger.info(f"rebuilt daily rollup: {result.rowcount} rows")
+    return result.rowcount
+
+
+def rebuild_customer_totals(db: Session) -> int:
+    """
+    recompute customer_totals and the summary row from the sales table
+    always a full rebuild, a backfill of any date range changes lifetime totals
+    returns the number of customers
+    """
+    db.execute(delete(CustomerTotal.__table__))
+    source = select(
+        Sale.customerID,
+        func.sum(Sale.amount),
+        func.count(Sale.id),
+        func.min(Sale.date),
+        func.max(Sale.date)
+    ).group_by(Sale.customerID)
+    db.execute(insert(CustomerTotal.__table__).from_select(
+        ["customerID", "total_spent", "transaction_count", "first_purchase", "last_purchase"], source
+    ))
+
+    sale_count, total_revenue = db.query(func.count(Sale.id), func.coalesce(func.sum(Sale.amount), 0.0)).one()
+    customer_count = db.query(func.count(CustomerTotal.customerID)).scalar()
+    summary = db.get(SalesSummary, SUMMARY_ID)
+    if summary is None:
+        summary = SalesSummary(id=SUMMARY_ID)
+        db.add(summary)
+    summary.sale_count = sale_count
+    summary.customer_count = customer_count
+    summary.total_revenue = float(total_revenue)
+    stats_cache_service.mark_changed(db)
+    db.commit()
+    logger.info(f"rebuilt customer totals: {customer_count} customers")
+    return customer_count
+
+
+def ensure_rollup(db: Session) -> bool:
+    """
+    build the aggregate tables on startup if there are sales but no aggregates yet,
+    which is the case right after upgrading an existing database
+    returns True if a rebuild ran
+    """
+    if db.query(Sale.id).first() is None:
+        return False
+
+    rebuilt = False
+    if db.query(DailyCategoryRevenue.date).first() is None:
+        rebuild_rollup(db)
+        rebuilt = True
+    if db.get(SalesSummary, SUMMARY_ID) is None:
+        rebuild_customer_totals(db)
+        rebuilt = True
+    return rebuilt
+
+
+def _apply_daily(inserted: pd.DataFrame, db: Session):
+    grouped = inserted.groupby(
+        [inserted['date'].dt.date, 'category_id'], sort=True
+    )['amount'].agg(['sum', 'count']).reset_index()
+
+    # sorted by key so concurrent uploads lock rollup rows in the same order
+    records = [
+        {"date": day, "category_id": category_id, "revenue": revenue, "sale_count": count}
+        for day, category_id, revenue, count in zip(
+            grouped['date'], grouped['category_id'].tolist(), grouped['sum'].tolist(), grouped['count'].tolist()
+        )
+    ]
+    db.execute(_upsert_adding(db, DailyCategoryRevenue, ["date", "category_id"], ["revenue", "sale_count"]), records)
+
+
+def _apply_customers(inserted: pd.DataFrame, db: Session) -> int:
+    """
+    add the upload to customer_totals, returns how many customers are new
+    new customers are inserted first with ON CONFLICT DO NOTHING RETURNING, which
+    counts them exactly even with concurrent uploads, the rest are added to in place
+    """
+    grouped = inserted.groupby('customerID', sort=True).agg(
+        total_spent=('amount', 'sum'),
+        transaction_count=('amount', 'count'),
+        first_purchase=('date', 'min'),
+        last_purchase=('date', 'max'),
+    )
+    records = [
+        {
+            "customerID": customer_id,
+            "total_spent": total,
+            "transaction_count": count,
+            "first_purchase": first.date(),
+            "last_purchase": last.date(),
+        }
+        for customer_id, total, count, first, last in zip(
+            grouped.index.tolist(),
+            grouped['total_spent'].tolist(),
+            grouped['transaction_count'].tolist(),
+            grouped['first_purchase'],
+            grouped['last_purchase']
+        )
+    ]
+
+    table = CustomerTotal.__table__
+    new_ids = set(db.execute(
+        _dialect_insert(db, table).on_conflict_do_nothing(index_elements=["customerID"]).returning(table.c.customerID),
+        records
+    ).scalars().all())
+
+    existing = [record for record in records if record["customerID"] not in new_ids]
+    if existing:
+        stmt = _dialect_insert(db, table)
+        least, greatest = _min_max_functions(db)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["customerID"],
+            set_={
+                **_adding(table, stmt, ["total_spent", "transaction_count"]),
+                "first_purchase": least(table.c.first_purchase, stmt.excluded.first_purchase),
+                "last_purchase": greatest(table.c.last_purchase, stmt.excluded.last_purchase),
+            }
+        )
+        db.execute(stmt, existing)
+    return len(new_ids)
+
+
+def _upsert_adding(db: Session, model, keys: List[str], counters: List[str]):
+    """
+    insert that adds its counters to an existing row instead of failing on the key
+    """
+    table = model.__table__
+    stmt = _dialect_insert(db, table)
+    return stmt.on_conflict_do_update(index_elements=keys, set_=_adding(table, stmt, counters))
+
+
+def _adding(table, stmt, counters: List[str]) -> Dict:
+    return {name: table.c[name] + stmt.excluded[name] for name in counters}
+
+
+def _dialect_insert(db: Session, table):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def _min_max_functions(db: Session):
+    # sqlite's scalar min()/max() take several arguments, postgres calls them least/greatest
+    if db.get_bind().dialect.name == "postgresql":
+        return func.least, func.greatest
+    return func.min, func.max
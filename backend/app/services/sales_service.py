@@ -1,125 +1,457 @@
-from typing import List
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Date, Integer, bindparam, cast, func, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timedelta, date
-from app.models import Sale
+from app.models import Sale, Category, CustomerTotal, DailyCategoryRevenue, SalesSummary
+from app.services import category_service, columnar_service, partition_service, rollup_service, stats_cache_service, validation_service
 import pandas as pd
+import numpy as np
+import logging
+import os
+import io
 
+logger = logging.getLogger(__name__)
 
-def insert_sales(sales_list: List[dict], db: Session) -> int:
+# rows per executemany round-trip when inserting sales
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "5000"))
+
+# rows per COPY statement on postgres
+COPY_BATCH_SIZE = int(os.getenv("COPY_BATCH_SIZE", "100000"))
+
+# how sales rows get written: "copy" streams them with postgres COPY FROM STDIN,
+# "executemany" uses batched inserts (works everywhere), "auto" picks copy on postgres
+INGEST_MODES = ("auto", "copy", "executemany")
+INGEST_MODE = os.getenv("SALES_INGEST_MODE", "auto")
+
+# mix the row's position in its file into the natural-key hash as well, rows that moved
+# to another line in a re-export are then inserted again (repeat purchases are kept
+# either way, see compute_row_hashes)
+ROW_HASH_INCLUDE_SOURCE_LINE = os.getenv("ROW_HASH_INCLUDE_SOURCE_LINE", "false").lower() == "true"
+
+# stored sales hashed per round trip when row_hash is added to an existing table
+ROW_HASH_BACKFILL_BATCH_SIZE = 50000
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+# time buckets /stats/revenue can group by
+GRANULARITIES = ("day", "week", "month", "quarter")
+
+REQUIRED_COLUMNS = ['date', 'amount', 'category', 'customerID']
+
+# columns written by the COPY path, in csv order
+COPY_COLUMNS = ['date', 'amount', 'category_id', 'customerID', 'row_hash']
+
+
+def prepare_sales_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, int, List[str]]:
     """
-    takes a list of sale dicts and inserts them into the database
-    validates each row and skips invalid ones, returns count of successfully inserted rows
-    """
-    sale_objects = []
-    errors = []
-    
-    for idx, sale_data in enumerate(sales_list, start=1):
-        try:
-            # parse date - handle strings, datetime objects, pandas timestamps
-            sale_date = sale_data["date"]
-            if isinstance(sale_date, str):
-                try:
-                    sale_date = pd.to_datetime(sale_date).date()
-                except:
-                    try:
-                        sale_date = datetime.strptime(sale_date, "%Y-%m-%d").date()
-                    except ValueError:
-                        errors.append(f"row {idx}: invalid date format '{sale_date}'")
-                        continue
-            elif isinstance(sale_date, datetime):
-                sale_date = sale_date.date()
-            elif isinstance(sale_date, pd.Timestamp):
-                sale_date = sale_date.date()
-            else:
-                errors.append(f"row {idx}: invalid date type")
-                continue
-            
-            # validate amount is a positive number
-            try:
-                amount = float(sale_data["amount"])
-                if amount < 0:
-                    errors.append(f"row {idx}: amount cannot be negative")
-                    continue
-            except (ValueError, TypeError):
-                errors.append(f"row {idx}: invalid amount '{sale_data.get('amount')}'")
-                continue
-            
-            # validate category isn't empty
-            category = str(sale_data["category"]).strip()
-            if not category:
-                errors.append(f"row {idx}: category cannot be empty")
-                continue
-            
-            # validate customerID is a positive integer
-            try:
-                customerID = int(sale_data["customerID"])
-                if customerID <= 0:
-                    errors.append(f"row {idx}: customerID must be positive")
-                    continue
-            except (ValueError, TypeError):
-                errors.append(f"row {idx}: invalid customerID '{sale_data.get('customerID')}'")
-                continue
-            
-            sale = Sale(
-                date=sale_date,
-                amount=amount,
-                category=category,
-                customerID=customerID
+    vectorized pre-pass over raw upload rows, uses the same parsing rules as validation_service
+    returns (clean typed frame, number of rejected rows, first few error messages)
+    the clean frame has date (datetime64), amount (float), category (stripped str), customerID (int)
+    and source_line (1-based row number in the upload)
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"missing required fields: {', '.join(missing)}")
+    
+    dates = validation_service.parse_dates(df['date'])
+    amounts, amount_invalid = validation_service.parse_amounts(df['amount'])
+    customer_ids, customer_invalid = validation_service.parse_customer_ids(df['customerID'])
+    categories = df['category'].astype(str).str.strip()
+    category_missing = df['category'].isna().to_numpy() | (categories == "").to_numpy()
+    
+    # first failing check wins, in the same order the old per-row loop used
+    checks = [
+        (np.isnat(dates), "invalid date"),
+        (amount_invalid | np.isnan(amounts), "invalid amount"),
+        (amounts < 0, "amount cannot be negative"),
+        (category_missing, "category cannot be empty"),
+        (customer_invalid | np.isnan(customer_ids), "invalid customerID"),
+        (customer_ids <= 0, "customerID must be positive"),
+    ]
+    rejected = np.zeros(len(df), dtype=bool)
+    reasons = {}
+    for mask, reason in checks:
+        new_failures = np.flatnonzero(mask & ~rejected)
+        for position in new_failures[:5]:
+            reasons[int(position)] = reason
+        rejected |= mask
+    
+    errors = [f"row {position + 1}: {reason}" for position, reason in sorted(reasons.items())[:5]]
+    
+    # chunks of a bigger file keep their original index, so use it for line numbers
+    if pd.api.types.is_integer_dtype(df.index):
+        source_lines = df.index.to_numpy() + 1
+    else:
+        source_lines = np.arange(1, len(df) + 1)
+    
+    keep = ~rejected
+    clean = pd.DataFrame({
+        "date": dates[keep],
+        "amount": amounts[keep],
+        "category": categories.to_numpy()[keep],
+        "customerID": customer_ids[keep].astype(np.int64),
+        "source_line": source_lines[keep],
+    })
+    return clean, int(rejected.sum()), errors
+
+
+class RowOccurrences:
+    """
+    how often each natural key has come up so far in one file, so a file read in
+    chunks numbers its repeat purchases the same way as when it's read at once
+    holds one entry per distinct key of the file
+    """
+
+    def __init__(self):
+        self._seen: Dict[int, int] = {}
+
+    def number(self, keys: np.ndarray) -> np.ndarray:
+        """
+        0 for the first row of every key, 1 for the next one and so on, counting the
+        keys of earlier calls
+        """
+        uniques, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        before = np.fromiter((self._seen.get(key, 0) for key in uniques.tolist()), dtype=np.int64, count=len(uniques))
+        self._seen.update(zip(uniques.tolist(), (before + counts).tolist()))
+        return before[inverse] + _occurrences(inverse)
+
+
+def compute_row_hashes(
+    clean: pd.DataFrame,
+    include_source_line: bool = False,
+    occurrences: Optional[RowOccurrences] = None
+) -> np.ndarray:
+    """
+    natural-key hash of (date, amount, category, customerID[, source_line]) per row
+    the n-th repeat of a key within the file is hashed with n as well, so repeat purchases
+    are all kept while an overlapping re-export hashes the same and is skipped
+    (first occurrences hash exactly like before repeats were numbered)
+    pass one RowOccurrences for all chunks of a file, without it the frame is the file
+    two differently keyed 64-bit pandas hashes are joined into 32 hex chars, all vectorized
+    """
+    key = pd.DataFrame({
+        "date": clean['date'].to_numpy().astype("datetime64[D]").astype(np.int64),
+        "amount": clean['amount'].to_numpy(dtype=float),
+        "category": clean['category'].to_numpy(dtype=object),
+        "customerID": clean['customerID'].to_numpy(dtype=np.int64),
+    })
+    if include_source_line:
+        key["source_line"] = clean['source_line'].to_numpy(dtype=np.int64)
+    
+    high = pd.util.hash_pandas_object(key, index=False, hash_key="sales-row-hash-a").to_numpy()
+    low = pd.util.hash_pandas_object(key, index=False, hash_key="sales-row-hash-b").to_numpy()
+    
+    if occurrences is None:
+        occurrence = _occurrences(pd.factorize(high)[0])
+    else:
+        occurrence = occurrences.number(high)
+    repeats = occurrence > 0
+    if repeats.any():
+        repeated = key[repeats].assign(occurrence=occurrence[repeats])
+        high[repeats] = pd.util.hash_pandas_object(repeated, index=False, hash_key="sales-row-hash-a").to_numpy()
+        low[repeats] = pd.util.hash_pandas_object(repeated, index=False, hash_key="sales-row-hash-b").to_numpy()
+    
+    # big-endian bytes -> hex digits through a lookup table
+    raw = np.column_stack([high, low]).astype(">u8").view(np.uint8).reshape(-1, 16)
+    hex_chars = np.empty((len(raw), 32), dtype=np.uint8)
+    hex_chars[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    hex_chars[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+    return hex_chars.view("S32").ravel().astype(str)
+
+
+def _occurrences(codes: np.ndarray) -> np.ndarray:
+    # running count of each code so far, in row order
+    return pd.Series(codes).groupby(codes, sort=False).cumcount().to_numpy()
+
+
+def migrate_row_hash_column(engine) -> bool:
+    """
+    add row_hash to a sales table from before it existed: hash the stored sales in
+    batches (in id order, as one file, so sales that are stored twice get told apart like
+    repeat purchases) and create the unique index
+    runs in a single transaction, an interrupted migration leaves the table as it was
+    returns True if a migration ran
+    """
+    if "row_hash" in {column["name"] for column in inspect(engine).get_columns("sales")}:
+        return False
+
+    logger.info("adding sales.row_hash and hashing the stored sales")
+    sales = Sale.__table__
+    categories = Category.__table__
+    read = select(
+        sales.c.id, sales.c.date, sales.c.amount, categories.c.name.label("category"), sales.c.customerID
+    ).join(categories, categories.c.id == sales.c.category_id).where(
+        sales.c.id > bindparam("last_id")
+    ).order_by(sales.c.id).limit(ROW_HASH_BACKFILL_BATCH_SIZE)
+    write = update(sales).where(sales.c.id == bindparam("sale_id")).values(row_hash=bindparam("hash"))
+
+    occurrences = RowOccurrences()
+    hashed = 0
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE sales ADD COLUMN row_hash VARCHAR(32)"))
+        last_id = 0
+        while True:
+            batch = pd.DataFrame(
+                conn.execute(read, {"last_id": last_id}).all(),
+                columns=["id", "date", "amount", "category", "customerID"]
             )
-            sale_objects.append(sale)
-        except KeyError as e:
-            errors.append(f"row {idx}: missing required field {str(e)}")
-            continue
-        except Exception as e:
-            errors.append(f"row {idx}: {str(e)}")
-            continue
+            if batch.empty:
+                break
+            batch["date"] = pd.to_datetime(batch["date"])
+            hashes = compute_row_hashes(batch, occurrences=occurrences)
+            conn.execute(write, [
+                {"sale_id": sale_id, "hash": row_hash}
+                for sale_id, row_hash in zip(batch["id"].tolist(), hashes.tolist())
+            ])
+            hashed += len(batch)
+            last_id = int(batch["id"].iloc[-1])
+        for index in sales.indexes:
+            if index.name == "idx_row_hash":
+                index.create(conn)
+    logger.info(f"hashed {hashed} stored sales")
+    return True
+
+
+def resolve_ingest_mode(db: Session, mode: Optional[str] = None) -> str:
+    """
+    turn the requested (or configured) ingest mode into "copy" or "executemany"
+    for the database this session is bound to
+    """
+    mode = mode or INGEST_MODE
+    if mode not in INGEST_MODES:
+        raise ValueError(f"unknown ingest mode '{mode}', expected one of: {', '.join(INGEST_MODES)}")
+    
+    is_postgres = db.get_bind().dialect.name == "postgresql"
+    if mode == "auto":
+        return "copy" if is_postgres else "executemany"
+    if mode == "copy" and not is_postgres:
+        raise ValueError("copy ingest mode requires a postgresql database")
+    return mode
+
+
+def bulk_insert_sales(
+    df: pd.DataFrame,
+    db: Session,
+    batch_size: Optional[int] = None,
+    commit: bool = True,
+    mode: Optional[str] = None,
+    include_source_line: Optional[bool] = None,
+    occurrences: Optional[RowOccurrences] = None
+) -> Dict:
+    """
+    insert a dataframe of sales without building ORM objects
+    rows are checked with a vectorized pre-pass and invalid ones are skipped
+    every row gets a natural-key hash and rows whose hash is already stored are
+    skipped by the unique index (ON CONFLICT DO NOTHING), so re-uploading an
+    overlapping export doesn't duplicate sales
+    a chunk of a bigger file passes the file's RowOccurrences (see compute_row_hashes)
+    on postgres the rows are streamed with COPY, elsewhere with batched executemany
+    returns inserted/rejected/duplicate counts and the mode that was used
+    """
+    clean, rejected, errors = prepare_sales_rows(df, include_source_line, occurrences)
+    return insert_prepared_sales(clean, rejected, errors, db, batch_size=batch_size, commit=commit, mode=mode)
+
+
+def prepare_sales_rows(
+    df: pd.DataFrame,
+    include_source_line: Optional[bool] = None,
+    occurrences: Optional[RowOccurrences] = None
+) -> Tuple[pd.DataFrame, int, List[str]]:
+    """
+    the cpu side of an insert: parse, reject and hash rows, no database needed
+    returns (clean frame with row_hash, number of rejected rows, first few error messages)
+    """
+    clean, rejected, errors = prepare_sales_frame(df)
+    if include_source_line is None:
+        include_source_line = ROW_HASH_INCLUDE_SOURCE_LINE
+    clean['row_hash'] = compute_row_hashes(clean, include_source_line, occurrences)
+    return clean, rejected, errors
+
+
+def insert_prepared_sales(
+    clean: pd.DataFrame,
+    rejected: int,
+    errors: List[str],
+    db: Session,
+    batch_size: Optional[int] = None,
+    commit: bool = True,
+    mode: Optional[str] = None
+) -> Dict:
+    """
+    write rows from prepare_sales_rows, skipping hashes that are already stored
+    the aggregate tables are updated with the rows that went in, in the same transaction,
+    and the in-memory column store (if enabled) gets them and cached stats are dropped
+    once the transaction commits
+    """
+    mode = resolve_ingest_mode(db, mode)
     
     # if all rows were bad, raise an error
-    if errors and not sale_objects:
-        raise ValueError(f"all rows had errors: {'; '.join(errors[:5])}")
+    if clean.empty and rejected:
+        raise ValueError(f"all rows had errors: {'; '.join(errors)}")
     
     # log warnings if some rows were skipped but we have valid ones
-    if errors:
-        import logging
-        logging.warning(f"skipped {len(errors)} invalid rows: {'; '.join(errors[:5])}")
+    if rejected:
+        logger.warning(f"skipped {rejected} invalid rows: {'; '.join(errors)}")
+    
+    # a partitioned sales table needs a partition for every month before rows can go in
+    partition_service.ensure_partitions(db, clean['date'])
+    to_write = clean.assign(category_id=category_service.category_ids(clean['category'], db))
     
-    # bulk insert all the valid sale objects
-    db.add_all(sale_objects)
-    db.commit()
+    if mode == "copy":
+        inserted_hashes = _copy_sales(to_write, db, batch_size or COPY_BATCH_SIZE)
+    else:
+        inserted_hashes = _write_sales(to_write, db, batch_size or INSERT_BATCH_SIZE)
     
-    # refresh to get the database-assigned IDs
-    for sale in sale_objects:
-        db.refresh(sale)
+    # only rows that really went in count towards the aggregates
+    inserted_rows = to_write[to_write['row_hash'].isin(set(inserted_hashes))]
+    rollup_service.apply_inserted_sales(inserted_rows, db)
+    columnar_service.stage_inserted(inserted_rows, db)
+    if not inserted_rows.empty:
+        stats_cache_service.mark_changed(db)
+    
+    if commit:
+        db.commit()
+    
+    inserted = len(inserted_hashes)
+    return {
+        "inserted": inserted,
+        "rejected": rejected,
+        "duplicates": len(clean) - inserted,
+        "errors": errors,
+        "mode": mode
+    }
+
+
+def _insert_skipping_duplicates(db: Session):
+    """
+    insert statement that silently skips rows whose row_hash is already stored
+    and returns the hashes of the rows it did write
+    """
+    table = Sale.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = postgresql.insert(table)
+    else:
+        stmt = sqlite.insert(table)
+    conflict = partition_service.row_hash_conflict_columns(db)
+    return stmt.on_conflict_do_nothing(index_elements=conflict).returning(table.c.row_hash)
+
+
+def _write_sales(clean: pd.DataFrame, db: Session, batch_size: int) -> List[str]:
+    """
+    executemany the clean rows in batches so only one batch of dicts is alive at a time
+    returns the hashes of the rows that were actually inserted
+    """
+    stmt = _insert_skipping_duplicates(db)
+    inserted = []
+    for start in range(0, len(clean), batch_size):
+        batch = clean.iloc[start:start + batch_size]
+        records = [
+            {"date": sale_date, "amount": amount, "category_id": category_id, "customerID": customer_id, "row_hash": row_hash}
+            for sale_date, amount, category_id, customer_id, row_hash in zip(
+                batch['date'].dt.date,
+                batch['amount'].tolist(),
+                batch['category_id'].tolist(),
+                batch['customerID'].tolist(),
+                batch['row_hash'].tolist()
+            )
+        ]
+        inserted.extend(db.execute(stmt, records).scalars().all())
+    return inserted
+
+
+def _copy_sales(clean: pd.DataFrame, db: Session, batch_size: int) -> List[str]:
+    """
+    stream the clean rows into postgres with COPY FROM STDIN, one csv buffer per batch
+    COPY can't skip conflicts, so each batch lands in a temp staging table first and is
+    moved over with INSERT ... SELECT ... ON CONFLICT DO NOTHING
+    runs on the session's own connection so it's part of the same transaction
+    returns the hashes of the rows that were actually inserted
+    """
+    connection = db.connection()
+    preparer = connection.dialect.identifier_preparer
+    sales_table = preparer.format_table(Sale.__table__)
+    columns = ", ".join(preparer.quote(name) for name in COPY_COLUMNS)
+    conflict = ", ".join(preparer.quote(name) for name in partition_service.row_hash_conflict_columns(db))
     
-    return len(sale_objects)
+    cursor = connection.connection.cursor()
+    inserted = []
+    try:
+        # dropped automatically when the transaction ends
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS sales_staging ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {sales_table} WITH NO DATA"
+        )
+        for start in range(0, len(clean), batch_size):
+            batch = clean.iloc[start:start + batch_size]
+            buffer = io.StringIO()
+            batch[COPY_COLUMNS].to_csv(buffer, header=False, index=False, date_format="%Y-%m-%d")
+            buffer.seek(0)
+            cursor.execute("TRUNCATE sales_staging")
+            cursor.copy_expert(f"COPY sales_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO {sales_table} ({columns}) SELECT {columns} FROM sales_staging "
+                f"ON CONFLICT ({conflict}) DO NOTHING RETURNING row_hash"
+            )
+            inserted.extend(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+    return inserted
 
 
-def get_revenue(range_days: int, db: Session):
+def insert_sales(sales_list: List[dict], db: Session) -> int:
     """
-    get daily revenue totals for the last N days
+    takes a list of sale dicts and inserts them into the database
+    skips invalid rows, returns count of successfully inserted rows
+    """
+    if not sales_list:
+        return 0
+    return bulk_insert_sales(pd.DataFrame(sales_list), db)["inserted"]
+
+
+def get_revenue(
+    range_days: int,
+    db: Session,
+    granularity: str = "day",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """
+    get revenue totals for the last N days, or for start_date..end_date when given
+    granularity buckets the totals by day, week (starting monday), month or quarter in
+    the database, each bucket is labelled with its first day and the first and last
+    buckets only cover the part inside the range
     returns list of {date, revenue} dicts
     """
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=range_days)
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    if end_date is None:
+        end_date = datetime.now().date()
+    if start_date is None:
+        start_date = end_date - timedelta(days=range_days)
+    
+    store = columnar_service.active_store(db)
+    if store is not None:
+        return store.revenue(start_date, end_date, granularity)
     
-    # query sales in date range, group by date, sum amounts per day
+    # sum the per-category daily rollup rows, at most days x categories rows to read
+    bucket = _date_bucket(DailyCategoryRevenue.date, granularity, db).label('bucket')
     results = db.query(
-        Sale.date,
-        func.sum(Sale.amount).label('revenue')
+        bucket,
+        func.sum(DailyCategoryRevenue.revenue).label('revenue')
     ).filter(
-        Sale.date >= start_date,
-        Sale.date <= end_date
+        DailyCategoryRevenue.date >= start_date,
+        DailyCategoryRevenue.date <= end_date
     ).group_by(
-        Sale.date
+        bucket
     ).order_by(
-        Sale.date
+        bucket
     ).all()
     
     # format as list of dicts for json response
     revenue_data = [
         {
-            "date": str(result.date),
+            "date": str(result.bucket),
             "revenue": float(result.revenue)
         }
         for result in results
@@ -128,28 +460,59 @@ def get_revenue(range_days: int, db: Session):
     return revenue_data
 
 
+def _date_bucket(column, granularity: str, db: Session):
+    """
+    sql expression for the first day of the bucket a date falls in
+    postgres has date_trunc, sqlite gets there with strftime
+    """
+    if granularity == "day":
+        return column
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc(granularity, column), Date)
+    
+    month = cast(func.strftime('%m', column), Integer)
+    if granularity == "week":
+        # %w is 0 for sunday, step back to monday like date_trunc('week')
+        weekday = (cast(func.strftime('%w', column), Integer) + 6) % 7
+        return func.date(column, func.printf('-%d days', weekday))
+    if granularity == "month":
+        return func.strftime('%Y-%m-01', column)
+    return func.printf('%s-%02d-01', func.strftime('%Y', column), ((month - 1) // 3) * 3 + 1)
+
+
 def get_sales_by_category(db: Session):
     """
     get sales broken down by category with totals and percentages
     """
-    # group by category and sum up the amounts
-    results = db.query(
-        Sale.category,
-        func.sum(Sale.amount).label('total')
-    ).group_by(
-        Sale.category
-    ).all()
+    store = columnar_service.active_store(db)
+    if store is not None:
+        totals = store.category_totals()
+    else:
+        # group the daily rollup on the category id, names are joined onto the few groups
+        grouped = db.query(
+            DailyCategoryRevenue.category_id,
+            func.sum(DailyCategoryRevenue.revenue).label('total')
+        ).group_by(
+            DailyCategoryRevenue.category_id
+        ).subquery()
+        results = db.query(
+            Category.name,
+            grouped.c.total
+        ).join(
+            grouped, grouped.c.category_id == Category.id
+        ).all()
+        totals = {result.name: result.total for result in results}
     
     # calculate total across all categories for percentage math
-    total_revenue = sum(result.total for result in results)
+    total_revenue = sum(totals.values())
     
     # build the response with totals and percentages
     category_data = []
-    for result in results:
-        percentage = (result.total / total_revenue * 100) if total_revenue > 0 else 0
+    for category, total in totals.items():
+        percentage = (total / total_revenue * 100) if total_revenue > 0 else 0
         category_data.append({
-            "category": result.category,
-            "total": float(result.total),
+            "category": category,
+            "total": float(total),
             "percentage": round(percentage, 2)
         })
     
@@ -162,43 +525,41 @@ def get_sales_by_category(db: Session):
     }
 
 
-def get_customer_stats(db: Session):
+def get_customer_stats(db: Session, top_k: int = 5):
     """
-    get customer stats - total customers, avg spending, top 5 customers
+    get customer stats - total customers, avg spending, top k customers
+    counts come from the running summary row and the top customers straight off the
+    total_spent index, so this doesn't depend on how many sales or customers there are
     """
-    # group by customer and calculate total spent and transaction count
-    results = db.query(
-        Sale.customerID,
-        func.sum(Sale.amount).label('total_spent'),
-        func.count(Sale.id).label('transaction_count')
-    ).group_by(
-        Sale.customerID
-    ).all()
+    store = columnar_service.active_store(db)
+    if store is not None:
+        return store.customer_stats(top_k)
+    
+    summary = db.get(SalesSummary, rollup_service.SUMMARY_ID)
+    total_customers = summary.customer_count if summary else 0
+    total_revenue = summary.total_revenue if summary else 0.0
+    avg_spent_per_customer = total_revenue / total_customers if total_customers > 0 else 0
     
-    # convert to list of dicts
-    customer_data = [
+    # highest spenders first, customerID breaks ties so the order is stable
+    results = db.query(CustomerTotal).order_by(
+        CustomerTotal.total_spent.desc(),
+        CustomerTotal.customerID
+    ).limit(top_k).all()
+    
+    top_customers = [
         {
             "customerID": result.customerID,
             "total_spent": float(result.total_spent),
-            "transaction_count": result.transaction_count
+            "transaction_count": result.transaction_count,
+            "first_purchase": str(result.first_purchase),
+            "last_purchase": str(result.last_purchase)
         }
         for result in results
     ]
     
-    # sort by total_spent to get top customers first
-    customer_data.sort(key=lambda x: x["total_spent"], reverse=True)
-    
-    # calculate aggregate stats
-    total_customers = len(customer_data)
-    total_revenue = sum(c["total_spent"] for c in customer_data)
-    avg_spent_per_customer = total_revenue / total_customers if total_customers > 0 else 0
-    
-    # grab top 5 customers
-    top_customers = customer_data[:5]
-    
     return {
         "total_customers": total_customers,
         "total_revenue": float(total_revenue),
         "avg_spent_per_customer": round(float(avg_spent_per_customer), 2),
         "top_customers": top_customers
-    }
\ No newline at end of file
+    }
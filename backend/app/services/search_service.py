@@ -0,0 +1,64 @@
+from typing import Optional, Tuple
+from datetime import date
+from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+import base64
+import json
+import logging
+from app.models import DailyCategoryRevenue
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(sale_date: date, sale_id: int) -> str:
+    """
+    opaque token for the position after a row, pages are ordered by (date, id) descending
+    """
+    raw = json.dumps([sale_date.isoformat(), sale_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[date, int]:
+    """
+    (date, id) from a cursor token, raises ValueError for anything that isn't one
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sale_date, sale_id = json.loads(raw)
+        return date.fromisoformat(sale_date), int(sale_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def rollup_count(
+    db: Session,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None
+) -> int:
+    """
+    exact number of sales in a date range and category, read from the daily rollup
+    instead of counting sales rows
+    """
+    query = db.query(func.coalesce(func.sum(DailyCategoryRevenue.sale_count), 0))
+    if start_date is not None:
+        query = query.filter(DailyCategoryRevenue.date >= start_date)
+    if end_date is not None:
+        query = query.filter(DailyCategoryRevenue.date <= end_date)
+    if category_id is not None:
+        query = query.filter(DailyCategoryRevenue.category_id == category_id)
+    return int(query.scalar())
+
+
+def estimate_count(query: Query, db: Session) -> Optional[int]:
+    """
+    the postgres planner's row estimate for a query, without running it
+    None on other databases, they have no estimate to offer
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, Hashable
+from collections import OrderedDict
+from datetime import date
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import logging
+import os
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# most stats results kept per database, least recently used ones go first, 0 turns the cache off
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "256"))
+
+# seconds a result is served for at most, writes made in this process invalidate it right
+# away, this bounds how long writes from other processes (workers, the cli) go unseen
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "60"))
+
+# key in Session.info marking a transaction that changed sales or the aggregates
+_CHANGED_KEY = "stats_changed"
+
+# engine -> StatsCache
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+class StatsCache:
+    """
+    bounded lru of stats results for one database, keyed on (endpoint, params, version)
+    the version goes up every time a transaction that wrote sales commits, entries from
+    older versions are dropped then, so a result is never served past an upload
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        """
+        (True, value) for a fresh entry, (False, None) otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, version: int, value: Any):
+        with self._lock:
+            # computed from data a commit has replaced since, don't keep it
+            if version != self.version:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def cached(db: Session, endpoint: str, params: tuple, compute: Callable[[], Any]):
+    """
+    the result of compute() for this endpoint and params, served from the cache while no
+    sales were written since it was computed
+    results are shared between requests, callers must not modify them
+    errors aren't cached
+    """
+    if STATS_CACHE_SIZE <= 0:
+        return compute()
+    cache = _cache(db.get_bind())
+    version = cache.version
+    # ranges like "the last 30 days" move at midnight
+    key = (endpoint, params, version, date.today())
+    found, value = cache.get(key)
+    if found:
+        return value
+    value = compute()
+    cache.put(key, version, value)
+    return value
+
+
+def mark_changed(db: Session):
+    """
+    note that this session's transaction changed sales or the aggregates, cached stats
+    for its database are invalidated when it commits
+    """
+    db.info[_CHANGED_KEY] = True
+
+
+def invalidate(bind):
+    """
+    drop every cached result for a database now
+    """
+    _cache(bind).bump()
+
+
+def cache_stats(bind) -> Dict:
+    """
+    hit/miss counters and size of a database's cache
+    """
+    if STATS_CACHE_SIZE <= 0:
+        return {"enabled": False}
+    return _cache(bind).stats()
+
+
+def _cache(bind) -> StatsCache:
+    with _caches_lock:
+        cache = _caches.get(bind)
+        if cache is None:
+            cache = _caches[bind] = StatsCache(STATS_CACHE_SIZE, STATS_CACHE_TTL)
+        return cache
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    if session.info.pop(_CHANGED_KEY, False):
+        invalidate(session.get_bind())
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session):
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,323 @@
+from typing import AsyncIterator, BinaryIO, Callable, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import hashlib
+import io
+import logging
+import os
+import shutil
+import uuid
+from app.models import UploadSession
+from app.services import ingest_service, reader_service
+
+logger = logging.getLogger(__name__)
+
+# parts of open sessions live in STAGING_DIR/sessions/<upload id>/
+SESSIONS_DIR = ingest_service.STAGING_DIR / "sessions"
+
+# largest part accepted, and the most parts one upload can have
+MAX_PART_BYTES = int(os.getenv("MAX_UPLOAD_PART_BYTES", str(512 * 1024 * 1024)))
+MAX_PARTS = 10000
+
+# open sessions that got no part for this long are removed at startup
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "48"))
+
+
+class PartTooLargeError(ValueError):
+    """
+    a part went over MAX_PART_BYTES
+    """
+
+
+def create_session(filename: str, user_id: int, db: Session, total_parts: Optional[int] = None) -> UploadSession:
+    """
+    start a resumable upload, the client then PUTs numbered parts and completes it
+    """
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=filename,
+        total_parts=total_parts,
+        status="open",
+        last_activity_at=_utcnow(),
+    )
+    db.add(session)
+    db.commit()
+    _session_dir(session.id).mkdir(parents=True, exist_ok=True)
+    return session
+
+
+async def save_part(session: UploadSession, part_number: int, body: AsyncIterator[bytes], db: Session) -> Dict:
+    """
+    write one part from the request body, a part that is sent again replaces the old one
+    the part is written to a temp file and renamed at the end, so an interrupted
+    request never leaves a half-written part behind
+    every part received keeps the session from expiring
+    the file and database calls run in the threadpool, only reading the body is async
+    """
+    directory = _session_dir(session.id)
+    final = _part_path(session.id, part_number)
+    tmp = directory / f"{part_number:05d}.{uuid.uuid4().hex}.tmp"
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        out = await run_in_threadpool(_open_part, tmp)
+        try:
+            async for block in body:
+                size += len(block)
+                if size > MAX_PART_BYTES:
+                    raise PartTooLargeError(f"part exceeds {MAX_PART_BYTES // (1024 * 1024)}mb limit")
+                digest.update(block)
+                await run_in_threadpool(out.write, block)
+        finally:
+            await run_in_threadpool(out.close)
+        await run_in_threadpool(os.replace, tmp, final)
+    finally:
+        await run_in_threadpool(_remove, tmp)
+
+    session.last_activity_at = _utcnow()
+    await run_in_threadpool(db.commit)
+
+    return {"part_number": part_number, "size": size, "sha256": digest.hexdigest()}
+
+
+def list_parts(session: UploadSession) -> List[Dict]:
+    """
+    parts received so far, in order
+    """
+    directory = _session_dir(session.id)
+    if not directory.exists():
+        return []
+    parts = []
+    for path in sorted(directory.glob("*.part")):
+        parts.append({"part_number": int(path.stem), "size": path.stat().st_size})
+    return parts
+
+
+def missing_parts(session: UploadSession) -> List[int]:
+    """
+    part numbers that still have to be sent before the upload can be completed
+    without a declared total that's any gap below the highest part received
+    """
+    received = {part["part_number"] for part in list_parts(session)}
+    last = session.total_parts or max(received, default=0)
+    return [number for number in range(1, last + 1) if number not in received]
+
+
+def complete_session(
+    session: UploadSession,
+    db: Session,
+    chunk_size: int = ingest_service.DEFAULT_CHUNK_SIZE,
+    background: bool = False,
+    session_factory: Optional[Callable[[], Session]] = None
+) -> Dict:
+    """
+    check every part arrived and ingest them as one file
+    csv parts are streamed straight into the chunked ingest one after another,
+    parquet and arrow need random access so they're assembled into one file first,
+    background mode always assembles and hands the file to an ingest job
+    raises ValueError for missing parts, and for files that can't be read or ingested
+    """
+    parts = list_parts(session)
+    if not parts:
+        raise ValueError("no parts were uploaded")
+    missing = missing_parts(session)
+    if missing:
+        raise ValueError(f"missing parts: {', '.join(str(number) for number in missing[:20])}")
+
+    paths = [_part_path(session.id, part["part_number"]) for part in parts]
+    file_format = reader_service.detect_format(session.filename)
+    compression = reader_service.detect_compression(session.filename)
+
+    session.fingerprint = _fingerprint_parts(paths)
+    previous = ingest_service.find_uploaded_file(session.fingerprint, db)
+    if previous is not None:
+        result = {"skipped": True, "rows_inserted": 0, "previous_upload": {"filename": previous.filename}}
+        _finish(session, db, "completed", result=result)
+        return result
+
+    if background:
+        path = _assemble(session.id, paths)
+        job = ingest_service.create_staged_ingest_job(
+            path, session.filename, session.user_id, db, chunk_size=chunk_size,
+            fingerprint=session.fingerprint, file_format=file_format, compression=compression
+        )
+        ingest_service.submit_ingest_job(job.id, session_factory)
+        session.job_id = job.id
+        result = {"job_id": job.id, "status": job.status}
+        _finish(session, db, "completed", result=result)
+        return result
+
+    assembled = None
+    try:
+        if file_format == "csv":
+            source = _ConcatReader(paths)
+        else:
+            assembled = _assemble(session.id, paths)
+            source = open(assembled, "rb")
+        with source:
+            result = ingest_service.ingest_stream(
+                reader_service.open_upload(source, compression), db,
+                chunk_size=chunk_size, file_format=file_format
+            )
+    except ValueError as e:
+        _finish(session, db, "failed", error=str(e))
+        raise
+    finally:
+        if assembled is not None:
+            _remove(assembled)
+
+    if ingest_service.fully_ingested(result):
+        ingest_service.record_uploaded_file(
+            session.fingerprint, session.filename, session.user_id, result["rows_inserted"], db
+        )
+    _finish(session, db, "completed", result={key: value for key, value in result.items() if key != "chunks"})
+    return result
+
+
+def abort_session(session: UploadSession, db: Session):
+    """
+    drop an upload and the parts received so far
+    """
+    _finish(session, db, "aborted")
+
+
+def expire_stale_sessions(db: Session) -> int:
+    """
+    abort open sessions that got no part for UPLOAD_SESSION_TTL_HOURS, returns how many
+    """
+    cutoff = _utcnow() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    stale = [
+        session for session in db.query(UploadSession).filter(UploadSession.status == "open").all()
+        # sessions from before activity was tracked go by their age
+        if _as_utc(session.last_activity_at or session.created_at) < cutoff
+    ]
+    for session in stale:
+        _finish(session, db, "aborted", error="upload session expired")
+    if stale:
+        logger.info(f"expired {len(stale)} upload sessions")
+    return len(stale)
+
+
+def session_to_dict(session: UploadSession) -> Dict:
+    """
+    session status with the parts received so far, so a client knows what to resend
+    """
+    parts = list_parts(session) if session.status == "open" else []
+    return {
+        "upload_id": session.id,
+        "filename": session.filename,
+        "status": session.status,
+        "total_parts": session.total_parts,
+        "parts": parts,
+        "bytes_received": sum(part["size"] for part in parts),
+        "missing_parts": missing_parts(session) if session.status == "open" else [],
+        "job_id": session.job_id,
+        "result": session.result,
+        "error": session.error,
+        "created_at": session.created_at.isoformat() if session.created_at else None,
+        "last_activity_at": session.last_activity_at.isoformat() if session.last_activity_at else None,
+        "completed_at": session.completed_at.isoformat() if session.completed_at else None,
+    }
+
+
+class _ConcatReader(io.RawIOBase):
+    """
+    reads the part files back to back as if they were one file
+    """
+
+    def __init__(self, paths: List[Path]):
+        self._paths = list(paths)
+        self._current = None
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return 0
+                self._current = open(self._paths.pop(0), "rb")
+            count = self._current.readinto(buffer)
+            if count:
+                self._position += count
+                return count
+            self._current.close()
+            self._current = None
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+def _assemble(session_id: str, paths: List[Path]) -> Path:
+    """
+    append the parts into one staged file, each part is removed once it's copied so
+    disk usage doesn't double
+    """
+    ingest_service.STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    target = ingest_service.STAGING_DIR / f"{session_id}.upload"
+    with open(target, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as part:
+                shutil.copyfileobj(part, out, length=1024 * 1024)
+            _remove(path)
+    return target
+
+
+def _fingerprint_parts(paths: List[Path]) -> str:
+    # same digest fingerprint_file gives the assembled file
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as part:
+            for block in iter(lambda: part.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _finish(session: UploadSession, db: Session, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+    session.status = status
+    session.result = result
+    session.error = error
+    session.completed_at = _utcnow()
+    db.commit()
+    shutil.rmtree(_session_dir(session.id), ignore_errors=True)
+
+
+def _session_dir(session_id: str) -> Path:
+    return SESSIONS_DIR / session_id
+
+
+def _part_path(session_id: str, part_number: int) -> Path:
+    return _session_dir(session_id) / f"{part_number:05d}.part"
+
+
+def _open_part(tmp: Path) -> BinaryIO:
+    tmp.parent.mkdir(parents=True, exist_ok=True)
+    return open(tmp, "wb")
+
+
+def _remove(path: Path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # sqlite hands datetimes back without a timezone
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -1,10 +1,19 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import logging
+import warnings as warnings_module
 
 logger = logging.getLogger(__name__)
 
+# error types that block an upload outright
+SEVERE_ERROR_TYPES = ['missing_columns', 'empty_data']
+
+# above these percentages type/date problems become errors instead of warnings
+TYPE_ERROR_THRESHOLD = 50
+DATE_ERROR_THRESHOLD = 30
+
 
 def validate_csv_data(df: pd.DataFrame) -> Tuple[List[Dict], List[Dict]]:
     """
@@ -64,140 +73,379 @@ def validate_csv_data(df: pd.DataFrame) -> Tuple[List[Dict], List[Dict]]:
             "severity": "warning"
         })
     
-    # validate each row for type and range issues
-    type_errors = []
-    range_errors = []
-    date_errors = []
+    # validate type and range issues a column at a time
+    date_invalid = _invalid_dates(df['date'])
+    amount_values, amount_invalid = parse_amounts(df['amount'])
+    customer_values, customer_invalid = parse_customer_ids(df['customerID'])
+    category_empty = _empty_categories(df['category'])
     
-    for idx, row in df.iterrows():
-        row_num = idx + 1
-        
-        # check date parsing
-        if pd.notna(row.get('date')):
-            try:
-                pd.to_datetime(row['date'])
-            except (ValueError, TypeError):
-                date_errors.append(row_num)
-        
-        # check amount type and range
-        if pd.notna(row.get('amount')):
-            try:
-                amount = float(row['amount'])
-                if amount < 0:
-                    range_errors.append({
-                        "row": row_num,
-                        "value": amount,
-                        "message": f"row {row_num}: negative amount value: {amount}"
-                    })
-            except (ValueError, TypeError):
-                type_errors.append({
+    amount_negative = ~amount_invalid & (amount_values < 0)
+    customer_not_positive = ~customer_invalid & (customer_values <= 0)
+    
+    # type errors are reported per cell in row order, amount then customerID then category
+    type_entries = _ordered_entries([amount_invalid, customer_invalid, category_empty])
+    if len(type_entries):
+        type_error_count = len(type_entries)
+        examples = []
+        for position, column_index in type_entries[:5]:
+            row_num = _row_number(df, position)
+            if column_index == 0:
+                value = df['amount'].iloc[position]
+                examples.append({
                     "row": row_num,
-                    "value": str(row.get('amount')),
+                    "value": str(value),
                     "column": "amount",
-                    "message": f"row {row_num}: invalid amount type: '{row.get('amount')}'"
+                    "message": f"row {row_num}: invalid amount type: '{value}'"
                 })
-        
-        # check customerID type
-        if pd.notna(row.get('customerID')):
-            try:
-                customer_id = int(row['customerID'])
-                if customer_id <= 0:
-                    range_errors.append({
-                        "row": row_num,
-                        "value": customer_id,
-                        "message": f"row {row_num}: invalid customerID (must be positive): {customer_id}"
-                    })
-            except (ValueError, TypeError):
-                type_errors.append({
+            elif column_index == 1:
+                value = df['customerID'].iloc[position]
+                examples.append({
                     "row": row_num,
-                    "value": str(row.get('customerID')),
+                    "value": str(value),
                     "column": "customerID",
-                    "message": f"row {row_num}: invalid customerID type: '{row.get('customerID')}'"
+                    "message": f"row {row_num}: invalid customerID type: '{value}'"
                 })
-        
-        # check category type
-        if pd.notna(row.get('category')):
-            category = str(row['category']).strip()
-            if not category:
-                type_errors.append({
+            else:
+                examples.append({
                     "row": row_num,
                     "value": "",
                     "column": "category",
                     "message": f"row {row_num}: empty category value"
                 })
+        _append_issue(warnings, errors, "type_errors", type_error_count, total_rows, examples)
     
-    # aggregate type errors
-    if type_errors:
-        type_error_count = len(type_errors)
-        type_error_percentage = (type_error_count / total_rows) * 100
-        
-        # if more than 50% of rows have type errors, treat as error
-        if type_error_percentage > 50:
-            errors.append({
-                "type": "type_errors",
-                "count": type_error_count,
-                "percentage": round(type_error_percentage, 2),
-                "message": f"found {type_error_count} rows with type errors ({type_error_percentage:.2f}% of data)",
-                "severity": "error",
-                "examples": type_errors[:5]  # show first 5 examples
-            })
-        else:
-            warnings.append({
-                "type": "type_errors",
-                "count": type_error_count,
-                "percentage": round(type_error_percentage, 2),
-                "message": f"found {type_error_count} rows with type errors ({type_error_percentage:.2f}% of data)",
-                "severity": "warning",
-                "examples": type_errors[:5]
-            })
+    # range errors, negative amounts then non-positive customer ids
+    range_entries = _ordered_entries([amount_negative, customer_not_positive])
+    if len(range_entries):
+        examples = []
+        for position, column_index in range_entries[:5]:
+            row_num = _row_number(df, position)
+            if column_index == 0:
+                amount = float(amount_values[position])
+                examples.append({
+                    "row": row_num,
+                    "value": amount,
+                    "message": f"row {row_num}: negative amount value: {amount}"
+                })
+            else:
+                customer_id = int(customer_values[position])
+                examples.append({
+                    "row": row_num,
+                    "value": customer_id,
+                    "message": f"row {row_num}: invalid customerID (must be positive): {customer_id}"
+                })
+        _append_issue(warnings, errors, "range_errors", len(range_entries), total_rows, examples)
+    
+    # date errors
+    date_positions = np.flatnonzero(date_invalid)
+    if len(date_positions):
+        examples = [{"row": _row_number(df, position)} for position in date_positions[:5]]
+        _append_issue(warnings, errors, "date_errors", len(date_positions), total_rows, examples)
     
-    # aggregate range errors
-    if range_errors:
-        range_error_count = len(range_errors)
-        range_error_percentage = (range_error_count / total_rows) * 100
+    return warnings, errors
+
+
+def _row_number(df: pd.DataFrame, position: int) -> int:
+    """
+    1-based row number taken from the index, so chunks of a larger file keep
+    their position in the original file
+    """
+    return int(df.index[position]) + 1
+
+
+def _ordered_entries(masks: List[np.ndarray]) -> np.ndarray:
+    """
+    (row position, column index) pairs for every flagged cell, ordered the way a
+    row-by-row scan would find them
+    """
+    positions = []
+    columns = []
+    for column_index, mask in enumerate(masks):
+        flagged = np.flatnonzero(mask)
+        positions.append(flagged)
+        columns.append(np.full(len(flagged), column_index))
+    positions = np.concatenate(positions)
+    columns = np.concatenate(columns)
+    order = np.lexsort((columns, positions))
+    return np.column_stack((positions[order], columns[order]))
+
+
+def _append_issue(warnings: List[Dict], errors: List[Dict], issue_type: str, count: int, total_rows: int, examples: List[Dict]):
+    """
+    add an aggregated issue to warnings or errors depending on how much of the data it hits
+    """
+    percentage = (count / total_rows) * 100
+    issue = {
+        "type": issue_type,
+        "count": int(count),
+        "percentage": round(percentage, 2),
+    }
+    severity = _issue_severity(issue_type, percentage)
+    issue["message"] = _issue_message(issue, percentage)
+    issue["severity"] = severity
+    issue["examples"] = examples
+    if severity == "error":
+        errors.append(issue)
+    else:
+        warnings.append(issue)
+
+
+def parse_dates(series: pd.Series) -> np.ndarray:
+    """
+    parse a date column the way pd.to_datetime would parse each cell on its own
+    returns naive datetime64[ns] values, NaT for empty or unparseable cells
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return _naive_datetimes(series)
+    
+    result = np.full(len(series), np.datetime64("NaT"), dtype="datetime64[ns]")
+    present = series.notna().to_numpy()
+    values = series[present]
+    if values.empty:
+        return result
+    
+    with warnings_module.catch_warnings():
+        warnings_module.simplefilter("ignore")
+        try:
+            # fast path, pandas infers one format from the first value
+            parsed = _naive_datetimes(pd.to_datetime(values, errors='coerce'))
+        except (ValueError, TypeError, OverflowError):
+            parsed = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[ns]")
         
-        warnings.append({
-            "type": "range_errors",
-            "count": range_error_count,
-            "percentage": round(range_error_percentage, 2),
-            "message": f"found {range_error_count} rows with out-of-range values ({range_error_percentage:.2f}% of data)",
-            "severity": "warning",
-            "examples": range_errors[:5]
-        })
+        # values in a different format than the first one get parsed individually
+        failed = np.isnat(parsed)
+        if failed.any():
+            leftovers = values[failed]
+            try:
+                parsed[failed] = _naive_datetimes(pd.to_datetime(leftovers, errors='coerce', format='mixed'))
+            except (ValueError, TypeError, OverflowError):
+                parsed[failed] = [_parse_date_or_nat(value) for value in leftovers]
+    
+    result[present] = parsed
+    return result
+
+
+def _naive_datetimes(values) -> np.ndarray:
+    """
+    datetime64[ns] array with any timezone dropped (keeping the wall-clock time)
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        values = values.dt.tz_localize(None)
+    elif not pd.api.types.is_datetime64_dtype(values):
+        # mixed timezones come back as an object column of timestamps
+        values = pd.to_datetime(values.map(_parse_date_or_nat))
+    return values.to_numpy(dtype="datetime64[ns]")
+
+
+def _parse_date_or_nat(value):
+    try:
+        timestamp = pd.to_datetime(value)
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+    if timestamp is not pd.NaT and timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_localize(None)
+    return timestamp
+
+
+def _invalid_dates(series: pd.Series) -> np.ndarray:
+    """
+    mask of non-empty cells that can't be parsed as a date
+    """
+    return series.notna().to_numpy() & np.isnat(parse_dates(series))
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError, OverflowError):
+        return np.nan
+
+
+def parse_amounts(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    float values and a mask of non-empty cells that aren't numbers
+    """
+    present = series.notna().to_numpy()
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=float, na_value=np.nan), np.zeros(len(series), dtype=bool)
+    
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    failed = present & np.isnan(values)
+    
+    # pandas is stricter than float() about a few spellings ('nan', '1_000', ...), so
+    # give the leftovers a second chance one by one
+    if failed.any():
+        retried = series[failed].map(_to_float).to_numpy(dtype=float)
+        values[failed] = retried
+        recovered = ~np.isnan(retried) | series[failed].map(_is_nan_spelling).to_numpy(dtype=bool)
+        failed[np.flatnonzero(failed)[recovered]] = False
+    
+    return values, failed
+
+
+def _is_nan_spelling(value) -> bool:
+    return isinstance(value, str) and value.strip().lower() in ("nan", "+nan", "-nan")
+
+
+_INTEGER_PATTERN = r"\s*[+-]?\d+(?:_\d+)*\s*"
+
+
+def parse_customer_ids(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    integer values (as floats) and a mask of non-empty cells int() would reject
+    """
+    present = series.notna().to_numpy()
+    values = np.full(len(series), np.nan)
+    failed = np.zeros(len(series), dtype=bool)
     
-    # aggregate date errors
-    if date_errors:
-        date_error_count = len(date_errors)
-        date_error_percentage = (date_error_count / total_rows) * 100
+    if pd.api.types.is_numeric_dtype(series):
+        numbers = series.to_numpy(dtype=float, na_value=np.nan)
+        finite = np.isfinite(numbers)
+        values[finite] = np.trunc(numbers[finite])
+        failed = present & ~finite
+        return values, failed
+    
+    if pd.api.types.infer_dtype(series, skipna=True) == "string":
+        is_string = present
+    else:
+        is_string = series.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    
+    # strings have to look like an integer, "12.0" is rejected just like int("12.0")
+    strings = series[is_string]
+    if not strings.empty:
+        text = strings.to_numpy(dtype=str)
+        string_values = np.full(len(text), np.nan)
         
-        # if more than 30% of dates are invalid, treat as error
-        if date_error_percentage > 30:
-            errors.append({
-                "type": "date_errors",
-                "count": date_error_count,
-                "percentage": round(date_error_percentage, 2),
-                "message": f"found {date_error_count} rows with invalid date formats ({date_error_percentage:.2f}% of data)",
-                "severity": "error",
-                "examples": [{"row": row} for row in date_errors[:5]]
-            })
+        # plain digit strings are the common case and convert without a regex
+        plain = np.char.isdigit(text)
+        string_values[plain] = text[plain].astype(float)
+        
+        other = np.flatnonzero(~plain)
+        matches = plain.copy()
+        if len(other):
+            other_text = strings.iloc[other]
+            other_matches = other_text.str.fullmatch(_INTEGER_PATTERN).to_numpy(dtype=bool)
+            parsed = pd.to_numeric(other_text[other_matches].str.replace("_", "", regex=False), errors='coerce')
+            string_values[other[other_matches]] = parsed.to_numpy(dtype=float, na_value=np.nan)
+            matches[other] = other_matches
+        
+        values[is_string] = string_values
+        failed[is_string] = ~matches
+    
+    # anything else (numbers mixed into an object column) is truncated like int() does
+    others = present & ~is_string
+    if others.any():
+        numbers = series[others].map(_to_float).to_numpy(dtype=float)
+        finite = np.isfinite(numbers)
+        numbers[finite] = np.trunc(numbers[finite])
+        values[others] = numbers
+        failed[others] = ~finite
+    
+    return values, failed
+
+
+def _empty_categories(series: pd.Series) -> np.ndarray:
+    """
+    mask of non-empty cells that are blank once stripped
+    """
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return np.zeros(len(series), dtype=bool)
+    try:
+        # non-string values come back as NaN from .str and can never be blank
+        return series.str.strip().eq("").to_numpy(dtype=bool)
+    except AttributeError:
+        # object column without any strings in it
+        present = series.notna().to_numpy()
+        return present & (series.astype(str).str.strip() == "").to_numpy(dtype=bool)
+
+
+def has_severe_errors(errors: List[Dict]) -> bool:
+    """
+    true if any error should block the upload entirely
+    """
+    return any(error.get('type') in SEVERE_ERROR_TYPES for error in errors)
+
+
+def _issue_message(issue: Dict, percentage: float) -> str:
+    """
+    rebuild the human readable message for an aggregated issue
+    """
+    count = issue["count"]
+    issue_type = issue["type"]
+    if issue_type == "missing_values":
+        return f"column '{issue['column']}' has {count} missing values ({percentage:.2f}%)"
+    if issue_type == "duplicates":
+        return f"found {count} duplicate rows"
+    if issue_type == "type_errors":
+        return f"found {count} rows with type errors ({percentage:.2f}% of data)"
+    if issue_type == "range_errors":
+        return f"found {count} rows with out-of-range values ({percentage:.2f}% of data)"
+    return f"found {count} rows with invalid date formats ({percentage:.2f}% of data)"
+
+
+def _issue_severity(issue_type: str, percentage: float) -> str:
+    if issue_type == "type_errors" and percentage > TYPE_ERROR_THRESHOLD:
+        return "error"
+    if issue_type == "date_errors" and percentage > DATE_ERROR_THRESHOLD:
+        return "error"
+    return "warning"
+
+
+def merge_validation_results(
+    merged: Tuple[List[Dict], List[Dict]],
+    new: Tuple[List[Dict], List[Dict]],
+    total_rows: int
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    fold the (warnings, errors) of one chunk into the running result for a whole file
+    counts are summed per issue type/column, percentages and severity are recomputed
+    against total_rows and only the first 5 examples are kept
+    note: duplicates are only detected within a chunk, not across chunks
+    """
+    combined = {}
+    for issue in merged[0] + merged[1] + new[0] + new[1]:
+        key = (issue.get("type"), issue.get("column"))
+        existing = combined.get(key)
+        if existing is None:
+            combined[key] = dict(issue)
+            if "examples" in issue:
+                combined[key]["examples"] = list(issue["examples"])
+        elif "count" in issue:
+            existing["count"] += issue["count"]
+            if "examples" in issue:
+                existing["examples"] = (existing.get("examples", []) + issue["examples"])[:5]
+    
+    warnings = []
+    errors = []
+    for issue in combined.values():
+        # issues without a count (missing columns etc) are passed through untouched
+        if "count" in issue:
+            percentage = (issue["count"] / total_rows) * 100 if total_rows else 0
+            if "percentage" in issue:
+                issue["percentage"] = round(percentage, 2)
+            issue["message"] = _issue_message(issue, percentage)
+            issue["severity"] = _issue_severity(issue["type"], percentage)
+        if issue.get("severity") == "error":
+            errors.append(issue)
         else:
-            warnings.append({
-                "type": "date_errors",
-                "count": date_error_count,
-                "percentage": round(date_error_percentage, 2),
-                "message": f"found {date_error_count} rows with invalid date formats ({date_error_percentage:.2f}% of data)",
-                "severity": "warning",
-                "examples": [{"row": row} for row in date_errors[:5]]
-            })
+            warnings.append(issue)
     
     return warnings, errors
 
 
-def get_validation_summary(df: pd.DataFrame, warnings: List[Dict], errors: List[Dict]) -> Dict:
+def get_validation_summary(
+    df: Optional[pd.DataFrame],
+    warnings: List[Dict],
+    errors: List[Dict],
+    total_rows: Optional[int] = None
+) -> Dict:
     """
     generate a summary of validation results
+    pass total_rows instead of a dataframe when the file was validated in chunks
     """
-    total_rows = len(df)
+    if total_rows is None:
+        total_rows = len(df)
     valid_rows = total_rows
     
     # subtract rows with errors from valid count
@@ -0,0 +1,103 @@
+"""
+compare the forecasting engines (prophet and the numpy holt-winters ets) on the sample
+datasets and a synthetic year of daily revenue: each series is cut before its last
+--holdout days, both engines forecast the cut and are scored against what happened
+
+usage (from the backend directory):
+    python -m benchmarks.bench_forecast --holdout 14 --repeat 3
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from app.services import forecast_service
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def load_sample(path: Path) -> pd.DataFrame:
+    """
+    daily revenue of a sample csv, in the ds/y shape the engines take, missing days are 0
+    """
+    sales = pd.read_csv(path, parse_dates=['date'])
+    daily = sales.groupby('date')['amount'].sum()
+    daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq='D'), fill_value=0)
+    return pd.DataFrame({'ds': daily.index, 'y': daily.to_numpy(dtype=np.float64)})
+
+
+def make_year(seed: int = 0) -> pd.DataFrame:
+    """
+    a year of revenue with a trend, a weekly pattern, a slow yearly wave and noise
+    """
+    rng = np.random.default_rng(seed)
+    days = np.arange(365)
+    weekly = np.array([0.9, 0.8, 0.85, 0.95, 1.1, 1.4, 1.3])
+    y = (2000 + days * 3) * weekly[days % 7] * (1 + 0.1 * np.sin(days / 365 * 2 * np.pi)) + rng.normal(0, 150, 365)
+    return pd.DataFrame({'ds': pd.date_range('2024-01-01', periods=365, freq='D'), 'y': np.maximum(y, 0)})
+
+
+def prophet_forecast(history: pd.DataFrame, period_days: int):
+    _, forecast = forecast_service.fit_forecast(history, forecast_service.model_settings(history), period_days)
+    return forecast
+
+
+def ets_forecast(history: pd.DataFrame, period_days: int):
+    return forecast_service.ets_forecast(history, period_days)
+
+
+def score(forecast, actual: np.ndarray):
+    predicted = np.asarray(forecast["predicted"])
+    lower = np.asarray(forecast["lower"])
+    upper = np.asarray(forecast["upper"])
+    mae = np.mean(np.abs(predicted - actual))
+    smape = np.mean(2 * np.abs(predicted - actual) / np.maximum(np.abs(predicted) + np.abs(actual), 1e-9)) * 100
+    coverage = np.mean((actual >= lower) & (actual <= upper)) * 100
+    return mae, smape, coverage
+
+
+def _time(fn, history: pd.DataFrame, period_days: int, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(history, period_days)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdout", type=int, default=14, help="days held back and forecast")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+    datasets = {path.name: load_sample(path) for path in sorted(SAMPLE_DIR.glob("sample*.csv"))}
+    datasets["synthetic year"] = make_year()
+
+    start = time.perf_counter()
+    import prophet  # noqa: F401
+    print(f"prophet import: {time.perf_counter() - start:.2f}s (paid once per process, ets needs only numpy)\n")
+
+    print(f"{'dataset':<30} {'days':>5} {'engine':<8} {'fit+predict':>12} {'mae':>10} {'smape':>7} {'95% cover':>10}")
+    for name, series in datasets.items():
+        # at least two weeks to learn from, like the weekly season needs
+        holdout = min(args.holdout, len(series) // 4)
+        if len(series) - holdout < 14 or holdout < 1:
+            print(f"{name:<30} {len(series):>5} skipped, too short to hold days back")
+            continue
+        history, actual = series.iloc[:-holdout], series['y'].to_numpy()[-holdout:]
+        for engine, fn in (("prophet", prophet_forecast), ("ets", ets_forecast)):
+            elapsed, forecast = _time(fn, history, holdout, args.repeat)
+            mae, smape, coverage = score(forecast, actual)
+            print(
+                f"{name:<30} {len(history):>5} {engine:<8} {elapsed * 1000:>10.1f}ms "
+                f"{mae:>10.1f} {smape:>6.1f}% {coverage:>9.0f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from app.main import app
 from app.database import get_db
-from app.models import Sale, Base
+from app.models import Category, Sale, Base
 from datetime import date, timedelta
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -31,6 +31,9 @@ client = TestClient(app)
 def test_forecast_data(db: Session):
     """create enough historical data for forecasting (need at least 7 days)"""
     today = date.today()
+    category = Category(name="Electronics")
+    db.add(category)
+    db.flush()
     sales = []
     # create 10 days of data
     for i in range(10):
@@ -38,7 +41,7 @@ def test_forecast_data(db: Session):
             Sale(
                 date=today - timedelta(days=i),
                 amount=100.0 + (i * 10),  # increasing trend
-                category="Electronics",
+                category_id=category.id,
                 customerID=1
             )
         )
@@ -100,3 +103,223 @@ def test_forecast_insufficient_data():
     assert response.status_code == 400
     assert "insufficient" in response.json()["detail"].lower() or "data" in response.json()["detail"].lower()
 
+
+
+def test_forecast_served_from_model_store(tmp_path, monkeypatch):
+    """test one fit serves every period, and a repeat is read back from the store"""
+    from app.models import DailyCategoryRevenue
+    from app.services import fitting_service, forecast_service
+    
+    memory_engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=memory_engine)
+    db = sessionmaker(bind=memory_engine)()
+    category = Category(name="Garden")
+    db.add(category)
+    db.flush()
+    today = date.today()
+    db.add_all([
+        DailyCategoryRevenue(date=today - timedelta(days=i), category_id=category.id, revenue=200.0 + (i % 7) * 15, sale_count=3)
+        for i in range(60)
+    ])
+    db.commit()
+    
+    monkeypatch.setattr(forecast_service, "MODEL_STORE_DIR", tmp_path)
+    # fit in this process so the counter sees it
+    monkeypatch.setattr(fitting_service, "FIT_WORKERS", 0)
+    fits = []
+    fit_model = forecast_service._fit_model
+    monkeypatch.setattr(forecast_service, "_fit_model", lambda *args: fits.append(1) or fit_model(*args))
+    
+    def forecast(period):
+        result = forecast_service.forecast_revenue(period, db, engine="prophet")
+        assert result.pop("engine") == "prophet"
+        return result
+    
+    longest = forecast(90)
+    assert len(longest["dates"]) == 90
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    
+    week = forecast(7)
+    assert week == {key: values[:7] for key, values in longest.items()}
+    
+    # a fresh process only has the files
+    forecast_service._recent.clear()
+    assert forecast(30) == {key: values[:30] for key, values in longest.items()}
+    assert len(fits) == 1
+    
+    # new data is a new fingerprint
+    db.add(DailyCategoryRevenue(date=today - timedelta(days=60), category_id=category.id, revenue=50.0, sale_count=1))
+    db.commit()
+    forecast(7)
+    assert len(fits) == 2
+    db.close()
+
+
+def test_fitting_runs_in_worker_with_timeout_and_cancel(monkeypatch):
+    """test fits run in a worker process, long ones are stopped without touching other fits"""
+    import os
+    import threading
+    import time
+    from app.services import fitting_service
+    
+    monkeypatch.setattr(fitting_service, "FIT_WORKERS", 2)
+    monkeypatch.setattr(fitting_service, "_pool", None)
+    assert fitting_service.run(os.getpid) != os.getpid()
+    pool = fitting_service._pool
+    
+    # the worker stops the fit itself
+    started = time.monotonic()
+    with pytest.raises(fitting_service.FitTimeoutError):
+        fitting_service.run(time.sleep, 30, timeout=1)
+    assert time.monotonic() - started < 5
+    
+    # cancelling one fit leaves a fit running next to it alone
+    outcome = {}
+    
+    def fit_alongside():
+        try:
+            outcome["result"] = fitting_service.run(time.sleep, 2)
+        except Exception as e:
+            outcome["error"] = e
+    
+    thread = threading.Thread(target=fit_alongside)
+    thread.start()
+    cancelled = threading.Event()
+    threading.Timer(0.5, cancelled.set).start()
+    with pytest.raises(fitting_service.FitCancelledError):
+        fitting_service.run(time.sleep, 3, cancelled=cancelled)
+    assert time.monotonic() - started < 10
+    thread.join()
+    assert outcome == {"result": None}
+    assert fitting_service._pool is pool
+    
+    assert fitting_service.run(pow, 2, 10) == 1024
+    
+    # time spent queued behind busy workers doesn't count against a fit's timeout
+    monkeypatch.setattr(fitting_service, "FIT_TIMEOUT_SECONDS", 3)
+    monkeypatch.setattr(fitting_service, "_TIMEOUT_GRACE_SECONDS", 0.5)
+    busy = [threading.Thread(target=fitting_service.run, args=(time.sleep, 2)) for _ in range(2)]
+    for worker in busy:
+        worker.start()
+    while fitting_service._active < 2:
+        time.sleep(0.05)
+    assert fitting_service.run(pow, 2, 3, timeout=0.5) == 8
+    for worker in busy:
+        worker.join()
+    
+    # a batch runs side by side, a failing call doesn't take the others with it
+    results = fitting_service.run_many(pow, [(2, 3), (2, "x"), (3, 2)])
+    assert results[0] == 8 and results[2] == 9
+    assert isinstance(results[1], TypeError)
+    
+    pool.shutdown(wait=True)
+
+
+def test_ets_forecast_follows_weekly_pattern():
+    """test holt-winters picks up a weekly pattern and its intervals widen with the horizon"""
+    import numpy as np
+    from app.services import ets_service
+    
+    rng = np.random.default_rng(7)
+    weekly = np.array([120.0, 80.0, 90.0, 100.0, 110.0, 160.0, 200.0])
+    days = np.arange(126)
+    series = weekly[days % 7] + days * 0.5 + rng.normal(0, 5, len(days))
+    
+    model = ets_service.fit_ets(series[:112])
+    bounds = model.forecast(14)
+    actual = series[112:]
+    assert np.mean(np.abs(bounds["predicted"] - actual)) < 15
+    assert np.all(bounds["lower"] <= bounds["predicted"]) and np.all(bounds["predicted"] <= bounds["upper"])
+    assert np.mean((actual >= bounds["lower"]) & (actual <= bounds["upper"])) >= 0.8
+    width = bounds["upper"] - bounds["lower"]
+    assert width[-1] > width[0]
+    
+    # under two weeks there's no season to start from, it still forecasts
+    assert len(ets_service.fit_ets(series[:9]).forecast(7)["predicted"]) == 7
+    with pytest.raises(ValueError):
+        ets_service.fit_ets(series[:5])
+
+
+def test_auto_engine_picks_ets(monkeypatch):
+    """test auto uses ets for short histories and when prophet can't be used"""
+    from app.models import DailyCategoryRevenue
+    from app.services import fitting_service, forecast_service
+    
+    memory_engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=memory_engine)
+    db = sessionmaker(bind=memory_engine)()
+    category = Category(name="Tools")
+    db.add(category)
+    db.flush()
+    today = date.today()
+    db.add_all([
+        DailyCategoryRevenue(date=today - timedelta(days=i), category_id=category.id, revenue=300.0 + (i % 7) * 20, sale_count=2)
+        for i in range(120)
+    ])
+    db.commit()
+    
+    monkeypatch.setattr(fitting_service, "FIT_WORKERS", 0)
+    monkeypatch.setattr(forecast_service, "AUTO_PROPHET_MIN_DAYS", 365)
+    result = forecast_service.forecast_revenue(30, db, engine="auto")
+    assert result["engine"] == "ets"
+    assert len(result["dates"]) == 30 and result["dates"][0] == str(today + timedelta(days=1))
+    assert forecast_service.forecast_revenue(30, db, engine="ets") == result
+    
+    def broken_prophet(*args):
+        raise forecast_service.ProphetUnavailableError("Forecasting service configuration error.")
+    
+    monkeypatch.setattr(forecast_service, "AUTO_PROPHET_MIN_DAYS", 90)
+    monkeypatch.setattr(forecast_service, "_load_forecast", lambda *args: None)
+    monkeypatch.setattr(forecast_service, "fit_forecast", broken_prophet)
+    assert forecast_service.forecast_revenue(30, db, engine="auto")["engine"] == "ets"
+    with pytest.raises(ValueError):
+        forecast_service.forecast_revenue(30, db, engine="prophet")
+    with pytest.raises(ValueError):
+        forecast_service.forecast_revenue(30, db, engine="arima")
+    db.close()
+
+
+def test_forecast_by_category_fits_only_changed_series(tmp_path, monkeypatch):
+    """test every category is forecast in one call and unchanged ones aren't refit"""
+    from app.models import DailyCategoryRevenue
+    from app.services import fitting_service, forecast_service
+    
+    memory_engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=memory_engine)
+    db = sessionmaker(bind=memory_engine)()
+    categories = [Category(name=name) for name in ("Books", "Lamps", "Rugs")]
+    db.add_all(categories)
+    db.flush()
+    today = date.today()
+    # lamps started selling later and rugs only sold on three days
+    days = {"Books": 120, "Lamps": 40, "Rugs": 3}
+    db.add_all([
+        DailyCategoryRevenue(date=today - timedelta(days=i), category_id=category.id, revenue=50.0 + (i % 7) * 10 + category.id, sale_count=1)
+        for category in categories
+        for i in range(days[category.name])
+    ])
+    db.commit()
+    
+    histories = forecast_service.get_category_revenue_data(db)
+    assert {name: len(history) for name, history in histories.items()} == days
+    
+    monkeypatch.setattr(forecast_service, "MODEL_STORE_DIR", tmp_path)
+    monkeypatch.setattr(fitting_service, "FIT_WORKERS", 0)
+    monkeypatch.setattr(forecast_service, "AUTO_PROPHET_MIN_DAYS", 90)
+    forecast_service._recent.clear()
+    result = forecast_service.forecast_by_category(14, db, engine="auto")
+    by_name = {entry["category"]: entry for entry in result["categories"]}
+    assert [entry["category"] for entry in result["categories"]] == ["Books", "Lamps", "Rugs"]
+    assert by_name["Books"]["engine"] == "prophet"
+    assert by_name["Lamps"]["engine"] == "ets"
+    assert len(by_name["Lamps"]["dates"]) == 14 and by_name["Lamps"]["dates"][0] == str(today + timedelta(days=1))
+    assert "insufficient" in by_name["Rugs"]["error"]
+    assert (result["fitted"], result["cached"]) == (2, 0)
+    
+    # only the category with a new day of sales is forecast again
+    db.add(DailyCategoryRevenue(date=today - timedelta(days=40), category_id=categories[1].id, revenue=70.0, sale_count=1))
+    db.commit()
+    again = forecast_service.forecast_by_category(14, db, engine="auto")
+    assert (again["fitted"], again["cached"]) == (1, 1)
+    assert again["categories"][0] == result["categories"][0]
+    db.close()
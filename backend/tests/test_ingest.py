@@ -0,0 +1,552 @@
+import os
+import uuid
+from datetime import date
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, func, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Category, Sale, CustomerTotal, DailyCategoryRevenue
+from app.services import partition_service, rollup_service, sales_service
+
+# point this at a throwaway postgres database to run the COPY tests, e.g.
+# TEST_POSTGRES_URL=postgresql://postgres@localhost/postgres pytest tests/test_ingest.py
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def make_sales_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "date": [f"2024-01-{(i % 28) + 1:02d}" for i in range(rows)],
+        "amount": [f"{10 + i * 0.25:.2f}" for i in range(rows)],
+        "category": ['Home, "Garden"' if i % 3 == 0 else "Electronics" for i in range(rows)],
+        "customerID": [str(i % 50 + 1) for i in range(rows)],
+    })
+
+
+def rollup_rows(db):
+    rows = db.query(DailyCategoryRevenue).order_by(DailyCategoryRevenue.date, DailyCategoryRevenue.category_id).all()
+    return [(str(row.date), row.category_id, round(row.revenue, 6), row.sale_count) for row in rows]
+
+
+def grouped_sales(db):
+    rows = db.query(
+        Sale.date, Sale.category_id, func.sum(Sale.amount), func.count(Sale.id)
+    ).group_by(Sale.date, Sale.category_id).order_by(Sale.date, Sale.category_id).all()
+    return [(str(day), category, round(total, 6), count) for day, category, total, count in rows]
+
+
+@pytest.fixture
+def sqlite_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+
+
+def postgres_schema_session(partitioned=False):
+    """session on a scratch schema that is dropped afterwards"""
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    schema = f"test_ingest_{uuid.uuid4().hex[:8]}"
+    engine = create_engine(TEST_POSTGRES_URL, connect_args={"options": f"-csearch_path={schema}"})
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    except Exception as e:
+        pytest.skip(f"postgres not reachable: {e}")
+    if partitioned:
+        partition_service.create_partitioned_sales(engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+    engine.dispose()
+
+
+@pytest.fixture
+def postgres_session():
+    yield from postgres_schema_session()
+
+
+@pytest.fixture
+def partitioned_session():
+    yield from postgres_schema_session(partitioned=True)
+
+
+def test_executemany_mode_on_sqlite(sqlite_session):
+    """test that sqlite uses batched inserts and skips invalid rows"""
+    df = make_sales_frame(250)
+    df.loc[3, "amount"] = "-1"
+    result = sales_service.bulk_insert_sales(df, sqlite_session, batch_size=100)
+    assert result["mode"] == "executemany"
+    assert result["inserted"] == 249
+    assert result["rejected"] == 1
+    assert sqlite_session.query(func.count(Sale.id)).scalar() == 249
+
+
+def test_copy_mode_rejected_on_sqlite(sqlite_session):
+    """test that forcing copy on a non-postgres database is an error"""
+    with pytest.raises(ValueError):
+        sales_service.bulk_insert_sales(make_sales_frame(5), sqlite_session, mode="copy")
+
+
+def test_copy_mode_on_postgres(postgres_session):
+    """test COPY ingest round-trips dates, amounts and quoted categories"""
+    df = make_sales_frame(1000)
+    result = sales_service.bulk_insert_sales(df, postgres_session, batch_size=300)
+    assert result["mode"] == "copy"
+    assert result["inserted"] == 1000
+
+    assert postgres_session.query(func.count(Sale.id)).scalar() == 1000
+    total = postgres_session.query(func.sum(Sale.amount)).scalar()
+    assert total == pytest.approx(sum(10 + i * 0.25 for i in range(1000)))
+    assert postgres_session.query(Sale).join(Category).filter(Category.name == 'Home, "Garden"').count() == 334
+    first = postgres_session.query(Sale).order_by(Sale.id).first()
+    assert str(first.date) == "2024-01-01"
+
+
+def test_copy_and_executemany_agree_on_postgres(postgres_session):
+    """test that both write paths produce the same row hashes, so they dedupe against each other"""
+    df = make_sales_frame(200)
+    first = sales_service.bulk_insert_sales(df, postgres_session, mode="copy")
+    second = sales_service.bulk_insert_sales(df, postgres_session, mode="executemany")
+    assert first["inserted"] == 200
+    assert second["inserted"] == 0
+    assert second["duplicates"] == 200
+
+    # and the other way around
+    more = make_sales_frame(300)
+    third = sales_service.bulk_insert_sales(more.iloc[200:], postgres_session, mode="executemany")
+    fourth = sales_service.bulk_insert_sales(more, postgres_session, mode="copy")
+    assert third["inserted"] == 100
+    assert fourth["inserted"] == 0
+    assert postgres_session.query(func.count(Sale.id)).scalar() == 300
+
+
+def test_duplicate_rows_skipped_on_sqlite(sqlite_session):
+    """test that rows already stored are not inserted again, but repeats within an upload are"""
+    df = make_sales_frame(50)
+    doubled = pd.concat([df, df.iloc[:10]], ignore_index=True)
+    result = sales_service.bulk_insert_sales(doubled, sqlite_session)
+    assert result["inserted"] == 60
+    assert result["duplicates"] == 0
+
+    # the same export again, and one that overlaps it
+    result = sales_service.bulk_insert_sales(doubled, sqlite_session)
+    assert result["inserted"] == 0
+    assert result["duplicates"] == 60
+    result = sales_service.bulk_insert_sales(make_sales_frame(60), sqlite_session)
+    assert result["inserted"] == 10
+    assert result["duplicates"] == 50
+    assert sqlite_session.query(func.count(Sale.id)).scalar() == 70
+
+
+def test_repeat_purchases_kept_across_chunks(sqlite_session):
+    """test repeat purchases count the same whether a file is read whole or in chunks"""
+    import io
+    from pathlib import Path
+    from app.services import ingest_service
+
+    sample = Path(__file__).resolve().parents[2] / "sample_last_7_days.csv"
+    content = sample.read_bytes()
+    rows = len(pd.read_csv(sample))
+
+    result = ingest_service.ingest_stream(io.BytesIO(content), sqlite_session, chunk_size=10)
+    assert result["rows_inserted"] == rows
+    # read whole, and in chunks that split the repeats differently, it's the same file
+    assert sales_service.bulk_insert_sales(pd.read_csv(sample), sqlite_session)["inserted"] == 0
+    result = ingest_service.ingest_stream(io.BytesIO(content), sqlite_session, chunk_size=7)
+    assert result["rows_inserted"] == 0
+    assert result["rows_duplicate"] == rows
+    assert sqlite_session.query(func.count(Sale.id)).scalar() == rows
+
+
+def test_rollup_follows_inserts_on_sqlite(sqlite_session):
+    """test the daily rollup counts inserted rows only and matches a rebuild"""
+    df = make_sales_frame(120)
+    sales_service.bulk_insert_sales(df, sqlite_session)
+    # overlapping upload, only the 30 new rows may be added to the rollup
+    sales_service.bulk_insert_sales(make_sales_frame(150), sqlite_session)
+
+    assert rollup_rows(sqlite_session) == grouped_sales(sqlite_session)
+    assert sum(row[3] for row in rollup_rows(sqlite_session)) == 150
+
+    before = rollup_rows(sqlite_session)
+    sqlite_session.query(DailyCategoryRevenue).delete()
+    sqlite_session.commit()
+    assert rollup_service.rebuild_rollup(sqlite_session) == len(before)
+    assert rollup_rows(sqlite_session) == before
+
+
+def test_rollup_follows_copy_on_postgres(postgres_session):
+    """test the COPY path keeps the rollup in step with the sales table"""
+    sales_service.bulk_insert_sales(make_sales_frame(500), postgres_session, mode="copy")
+    sales_service.bulk_insert_sales(make_sales_frame(700), postgres_session, mode="copy")
+    assert rollup_rows(postgres_session) == grouped_sales(postgres_session)
+
+
+def customer_rows(db):
+    rows = db.query(CustomerTotal).order_by(CustomerTotal.customerID).all()
+    return [
+        (row.customerID, round(row.total_spent, 6), row.transaction_count, str(row.first_purchase), str(row.last_purchase))
+        for row in rows
+    ]
+
+
+def test_customer_totals_follow_inserts_on_sqlite(sqlite_session):
+    """test customer totals and the summary count against a rebuild from sales"""
+    sales_service.bulk_insert_sales(make_sales_frame(40), sqlite_session)
+    later = make_sales_frame(140)
+    later["date"] = [f"2024-02-{(i % 28) + 1:02d}" for i in range(140)]
+    sales_service.bulk_insert_sales(later, sqlite_session)
+
+    stats = sales_service.get_customer_stats(sqlite_session, top_k=3)
+    assert stats["total_customers"] == 50
+    assert len(stats["top_customers"]) == 3
+    spent = [customer["total_spent"] for customer in stats["top_customers"]]
+    assert spent == sorted(spent, reverse=True)
+
+    incremental = customer_rows(sqlite_session)
+    assert incremental[0][3:] == ("2024-01-01", "2024-02-23")
+    rollup_service.rebuild_customer_totals(sqlite_session)
+    assert customer_rows(sqlite_session) == incremental
+    assert sales_service.get_customer_stats(sqlite_session, top_k=3) == stats
+
+
+def test_customer_totals_on_postgres(postgres_session):
+    """test the postgres upsert path (least/greatest) matches a rebuild"""
+    sales_service.bulk_insert_sales(make_sales_frame(300), postgres_session, mode="copy")
+    sales_service.bulk_insert_sales(make_sales_frame(500), postgres_session, mode="executemany")
+    incremental = customer_rows(postgres_session)
+    stats = sales_service.get_customer_stats(postgres_session)
+    rollup_service.rebuild_customer_totals(postgres_session)
+    assert customer_rows(postgres_session) == incremental
+    assert sales_service.get_customer_stats(postgres_session) == stats
+
+
+def test_column_store_matches_sql(sqlite_session, monkeypatch):
+    """test the in-memory column store gives the same stats as the sql path"""
+    from datetime import date, timedelta
+    from app.services import columnar_service
+
+    recent = make_sales_frame(300)
+    recent["date"] = [str(date.today() - timedelta(days=i % 40)) for i in range(300)]
+    sales_service.bulk_insert_sales(recent, sqlite_session)
+
+    sql_results = lambda: (
+        sales_service.get_revenue(30, sqlite_session),
+        sales_service.get_sales_by_category(sqlite_session),
+        sales_service.get_customer_stats(sqlite_session, top_k=7),
+    )
+
+    monkeypatch.setattr(columnar_service, "COLUMNAR_STORE_ENABLED", True)
+    monkeypatch.setattr(columnar_service, "_store", None)
+    columnar_service.load_store(sqlite_session)
+
+    # appended after commit, rolled back inserts never reach the store
+    more = make_sales_frame(400).iloc[300:].copy()
+    more["date"] = str(date.today())
+    sales_service.bulk_insert_sales(more, sqlite_session, commit=False)
+    sqlite_session.rollback()
+    sales_service.bulk_insert_sales(more, sqlite_session)
+
+    store = columnar_service.active_store(sqlite_session)
+    assert store is not None and store.size == 400
+    from_store = sql_results()
+
+    monkeypatch.setattr(columnar_service, "COLUMNAR_STORE_ENABLED", False)
+    from_sql = sql_results()
+    assert from_store[0] == pytest.approx(from_sql[0])
+    assert from_store[1]["categories"] == from_sql[1]["categories"]
+    assert from_store[2]["top_customers"] == from_sql[2]["top_customers"]
+    assert from_store[2]["total_customers"] == from_sql[2]["total_customers"]
+
+
+def bucketed_frame():
+    """sales spread over two years, so weeks, months and quarters cross year boundaries"""
+    df = make_sales_frame(730)
+    days = pd.date_range("2023-01-01", periods=730, freq="D")
+    df["date"] = days.strftime("%Y-%m-%d")
+    return df
+
+
+def expected_buckets(df, granularity, start, end):
+    days = pd.to_datetime(df["date"])
+    frame = pd.DataFrame({"day": days, "amount": df["amount"].astype(float)})
+    frame = frame[(frame["day"] >= start) & (frame["day"] <= end)]
+    if granularity == "week":
+        buckets = frame["day"] - pd.to_timedelta(frame["day"].dt.weekday, unit="D")
+    elif granularity == "month":
+        buckets = frame["day"].dt.to_period("M").dt.start_time
+    elif granularity == "quarter":
+        buckets = frame["day"].dt.to_period("Q").dt.start_time
+    else:
+        buckets = frame["day"]
+    totals = frame.groupby(buckets.dt.strftime("%Y-%m-%d"))["amount"].sum()
+    return [{"date": day, "revenue": pytest.approx(total)} for day, total in totals.items()]
+
+
+@pytest.mark.parametrize("granularity", sales_service.GRANULARITIES)
+def test_revenue_granularity_on_sqlite(sqlite_session, monkeypatch, granularity):
+    """test sql buckets and the column store buckets against pandas"""
+    from datetime import date
+    from app.services import columnar_service
+
+    df = bucketed_frame()
+    sales_service.bulk_insert_sales(df, sqlite_session)
+    start, end = date(2023, 2, 15), date(2024, 11, 20)
+    expected = expected_buckets(df, granularity, pd.Timestamp(start), pd.Timestamp(end))
+
+    result = sales_service.get_revenue(0, sqlite_session, granularity=granularity, start_date=start, end_date=end)
+    assert result == expected
+
+    monkeypatch.setattr(columnar_service, "COLUMNAR_STORE_ENABLED", True)
+    monkeypatch.setattr(columnar_service, "_store", None)
+    columnar_service.load_store(sqlite_session)
+    assert columnar_service.active_store(sqlite_session) is not None
+    result = sales_service.get_revenue(0, sqlite_session, granularity=granularity, start_date=start, end_date=end)
+    assert result == expected
+    # a reversed range is empty, not an error
+    assert sales_service.get_revenue(0, sqlite_session, granularity=granularity, start_date=end, end_date=start) == []
+
+
+def test_revenue_granularity_on_postgres(postgres_session):
+    """test date_trunc buckets on postgres"""
+    from datetime import date
+
+    df = bucketed_frame()
+    sales_service.bulk_insert_sales(df, postgres_session)
+    start, end = date(2023, 2, 15), date(2024, 11, 20)
+    for granularity in sales_service.GRANULARITIES:
+        result = sales_service.get_revenue(
+            0, postgres_session, granularity=granularity, start_date=start, end_date=end
+        )
+        assert result == expected_buckets(df, granularity, pd.Timestamp(start), pd.Timestamp(end))
+
+
+def test_partitioned_sales_on_postgres(partitioned_session):
+    """test uploads create monthly partitions, dedupe, and old months can be detached"""
+    db = partitioned_session
+    df = bucketed_frame().iloc[:120]
+    assert partition_service.is_partitioned(db)
+    # built from the model, so it has the same columns and indexes
+    inspector = inspect(db.connection())
+    assert [column["name"] for column in inspector.get_columns("sales")] == Sale.__table__.columns.keys()
+    assert {index["name"] for index in inspector.get_indexes("sales")} == {index.name for index in Sale.__table__.indexes}
+    first = sales_service.bulk_insert_sales(df, db, mode="copy")
+    again = sales_service.bulk_insert_sales(df, db, mode="executemany")
+    assert first["inserted"] == 120
+    assert again["inserted"] == 0
+
+    months = [partition["month"] for partition in partition_service.list_partitions(db)]
+    assert months == ["2023-01", "2023-02", "2023-03", "2023-04"]
+    assert rollup_rows(db) == grouped_sales(db)
+
+    # the planner only reads the partition for the range
+    plan = "\n".join(db.execute(text(
+        "EXPLAIN SELECT sum(amount) FROM sales WHERE date >= '2023-02-01' AND date < '2023-03-01'"
+    )).scalars())
+    assert "sales_p2023_02" in plan
+    assert "sales_p2023_01" not in plan and "sales_p2023_03" not in plan
+
+    removed = partition_service.detach_partitions(db, date(2023, 3, 1))
+    assert removed == ["sales_p2023_01", "sales_p2023_02"]
+    assert db.query(func.count(Sale.id)).scalar() == 120 - 31 - 28
+    assert rollup_rows(db) == grouped_sales(db)
+    stats = sales_service.get_customer_stats(db)
+    assert stats["total_revenue"] == pytest.approx(db.query(func.sum(Sale.amount)).scalar())
+
+    # a detached month gets a new partition when sales for it come in again
+    sales_service.bulk_insert_sales(df.iloc[:5], db)
+    assert "2023-01" in [partition["month"] for partition in partition_service.list_partitions(db)]
+
+
+def test_category_ids_cached_after_commit(sqlite_session):
+    """test names map to stable ids and rolled back ids never reach the cache"""
+    from app.services import category_service
+
+    sales_service.bulk_insert_sales(make_sales_frame(30), sqlite_session)
+    names = {category.name: category.id for category in sqlite_session.query(Category).all()}
+    assert set(names) == {'Home, "Garden"', "Electronics"}
+    assert sqlite_session.query(func.count(Sale.id)).filter(Sale.category_id == names["Electronics"]).scalar() == 20
+
+    rolled_back = make_sales_frame(31).iloc[30:].copy()
+    rolled_back["category"] = "Toys"
+    sales_service.bulk_insert_sales(rolled_back, sqlite_session, commit=False)
+    sqlite_session.rollback()
+    assert category_service.find_category_id("Toys", sqlite_session) is None
+
+    sales_service.bulk_insert_sales(rolled_back, sqlite_session)
+    toys = category_service.find_category_id("Toys", sqlite_session)
+    assert toys is not None
+    by_category = sales_service.get_sales_by_category(sqlite_session)["categories"]
+    assert {row["category"] for row in by_category} == {'Home, "Garden"', "Electronics", "Toys"}
+
+
+def test_stats_cache_invalidated_on_commit(sqlite_session):
+    """test cached stats are served until an insert commits, never after"""
+    from app.services import stats_cache_service
+
+    def category_totals():
+        return stats_cache_service.cached(
+            sqlite_session, "by-category", (), lambda: sales_service.get_sales_by_category(sqlite_session)
+        )
+
+    bind = sqlite_session.get_bind()
+    sales_service.bulk_insert_sales(make_sales_frame(30), sqlite_session)
+    first = category_totals()
+    assert category_totals() is first
+    counters = stats_cache_service.cache_stats(bind)
+    assert (counters["hits"], counters["misses"]) == (1, 1)
+
+    # a rolled back insert leaves the cache alone
+    extra = make_sales_frame(31).iloc[30:].copy()
+    extra["category"] = "Toys"
+    sales_service.bulk_insert_sales(extra, sqlite_session, commit=False)
+    sqlite_session.rollback()
+    assert category_totals() is first
+    version = stats_cache_service.cache_stats(bind)["version"]
+
+    sales_service.bulk_insert_sales(extra, sqlite_session)
+    assert stats_cache_service.cache_stats(bind)["version"] == version + 1
+    assert "Toys" in {row["category"] for row in category_totals()["categories"]}
+
+    # a re-upload that inserts nothing keeps the cache
+    sales_service.bulk_insert_sales(extra, sqlite_session)
+    assert stats_cache_service.cache_stats(bind)["version"] == version + 1
+
+
+def test_stats_cache_evicts_least_recently_used():
+    """test the cache stays within max_entries and drops the oldest entries first"""
+    from app.services.stats_cache_service import StatsCache
+
+    cache = StatsCache(max_entries=2, ttl=60)
+    cache.put("a", 0, 1)
+    cache.put("b", 0, 2)
+    assert cache.get("a") == (True, 1)
+    cache.put("c", 0, 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+    # a value computed before a bump is never stored
+    cache.bump()
+    cache.put("d", 0, 4)
+    assert cache.get("d") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_ingest_job_runs_in_one_process_only(sqlite_session, tmp_path, monkeypatch):
+    """test a job whose staged file another process has claimed is left to that process"""
+    import io
+    from app.services import ingest_service
+    fcntl = pytest.importorskip("fcntl")
+
+    monkeypatch.setattr(ingest_service, "STAGING_DIR", tmp_path)
+    content = make_sales_frame(30).to_csv(index=False).encode()
+    job = ingest_service.create_ingest_job(io.BytesIO(content), "jobs.csv", 1, sqlite_session, chunk_size=10)
+    factory = sessionmaker(bind=sqlite_session.get_bind())
+
+    with open(job.file_path, "rb") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        ingest_service.run_ingest_job(job.id, factory)
+        sqlite_session.refresh(job)
+        assert job.status == "queued"
+        assert job.rows_inserted == 0
+
+    ingest_service.run_ingest_job(job.id, factory)
+    sqlite_session.refresh(job)
+    assert job.status == "completed"
+    assert job.rows_inserted == 30
+
+    # a second resume of the same job finds it finished
+    ingest_service.run_ingest_job(job.id, factory)
+    sqlite_session.refresh(job)
+    assert job.status == "completed"
+    assert sqlite_session.query(func.count(Sale.id)).scalar() == 30
+
+
+def test_migrate_category_column_on_sqlite(sqlite_session):
+    """test a sales table with the old text column is moved over to category ids"""
+    from app.services import category_service
+
+    engine = sqlite_session.get_bind()
+    sqlite_session.close()
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE sales"))
+        conn.execute(text("DROP TABLE daily_category_revenue"))
+        conn.execute(text(
+            "CREATE TABLE sales (id INTEGER PRIMARY KEY, date DATE NOT NULL, amount FLOAT NOT NULL, "
+            "category VARCHAR NOT NULL, customerID INTEGER NOT NULL, row_hash VARCHAR(32))"
+        ))
+        conn.execute(text("CREATE INDEX idx_category ON sales (category)"))
+        conn.execute(text("CREATE TABLE daily_category_revenue (date DATE, category VARCHAR, revenue FLOAT, sale_count BIGINT)"))
+        conn.execute(text(
+            "INSERT INTO sales (date, amount, category, customerID) VALUES "
+            "('2024-01-01', 10, 'Books', 1), ('2024-01-02', 20, 'Toys', 2), ('2024-01-02', 5, 'Books', 3)"
+        ))
+
+    assert category_service.migrate_category_column(engine)
+    assert not category_service.migrate_category_column(engine)
+    assert rollup_service.ensure_rollup(sqlite_session)
+    totals = {row["category"]: row["total"] for row in sales_service.get_sales_by_category(sqlite_session)["categories"]}
+    assert totals == {"Books": 15.0, "Toys": 20.0}
+
+
+def test_migrate_baseline_sales_table_on_sqlite(sqlite_session):
+    """test a sales table with neither category ids nor row hashes is migrated and takes uploads"""
+    from app.services import category_service
+
+    engine = sqlite_session.get_bind()
+    sqlite_session.close()
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE sales"))
+        conn.execute(text(
+            "CREATE TABLE sales (id INTEGER PRIMARY KEY, date DATE NOT NULL, amount FLOAT NOT NULL, "
+            "category VARCHAR NOT NULL, customerID INTEGER NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX idx_category ON sales (category)"))
+        # the same sale stored twice, the old schema had nothing against it
+        conn.execute(text(
+            "INSERT INTO sales (date, amount, category, customerID) VALUES "
+            "('2024-01-01', 10.5, 'Books', 1), ('2024-01-01', 10.5, 'Books', 1), ('2024-01-02', 20, 'Toys', 2)"
+        ))
+
+    assert category_service.migrate_category_column(engine)
+    assert sales_service.migrate_row_hash_column(engine)
+    assert not sales_service.migrate_row_hash_column(engine)
+    assert sqlite_session.query(Sale).filter(Sale.row_hash.is_(None)).count() == 0
+    with engine.connect() as conn:
+        indexes = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'idx_row_hash'")).scalar()
+    assert "UNIQUE" in indexes
+
+    # the stored rows hash like the upload they came from, so it's skipped
+    df = pd.DataFrame({
+        "date": ["2024-01-01", "2024-01-01", "2024-01-02", "2024-01-03"],
+        "amount": ["10.50", "10.5", "20", "7"],
+        "category": ["Books", "Books", "Toys", "Toys"],
+        "customerID": ["1", "1", "2", "3"],
+    })
+    result = sales_service.bulk_insert_sales(df, sqlite_session)
+    assert result["inserted"] == 1
+    assert result["duplicates"] == 3
+    assert sqlite_session.query(func.count(Sale.id)).scalar() == 4
+
+
+def test_search_counts_on_postgres(postgres_session):
+    """test the rollup count is exact and the planner estimate is in the right ballpark"""
+    from app.services import search_service
+
+    db = postgres_session
+    sales_service.bulk_insert_sales(make_sales_frame(600), db)
+    db.execute(text("ANALYZE sales"))
+    electronics = db.query(Category.id).filter(Category.name == "Electronics").scalar()
+    assert search_service.rollup_count(db, date(2024, 1, 1), date(2024, 1, 10), electronics) == (
+        db.query(Sale).filter(Sale.category_id == electronics, Sale.date <= date(2024, 1, 10)).count()
+    )
+
+    query = db.query(Sale.id).filter(Sale.amount >= 100)
+    estimate = search_service.estimate_count(query, db)
+    assert 0.5 * query.count() <= estimate <= 2 * query.count()
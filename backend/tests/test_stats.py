@@ -52,6 +52,22 @@ def test_get_revenue_stats():
     assert data["range_days"] == 30
 
 
+def test_get_revenue_start_after_default_end():
+    """test a start_date after today is refused when end_date defaults to today"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_revenue_future@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    
+    tomorrow = date.today() + timedelta(days=1)
+    response = client.get(
+        f"/stats/revenue?start_date={tomorrow.isoformat()}",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 400
+
+
 def test_get_revenue_requires_auth():
     """test that revenue endpoint requires authentication"""
     response = client.get("/stats/revenue?range=30")
@@ -79,3 +79,794 @@ def test_upload_csv_invalid_file_type():
     assert response.status_code == 400
     assert "csv" in response.json()["detail"].lower()
 
+
+
+def test_upload_csv_stream_mode():
+    """test chunked upload reports per-chunk and total counts"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_stream@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    
+    # 25 rows, one of them with a negative amount that insert_sales will skip
+    rows = [f"2024-01-{(i % 28) + 1:02d},{10 + i}.5,Electronics,{i + 1}" for i in range(24)]
+    rows.append("2024-02-01,-5,Clothing,99")
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    
+    response = client.post(
+        "/upload/csv?stream=true&chunk_size=10",
+        headers={"Authorization": f"Bearer {token}"},
+        files={"file": ("big.csv", csv_content, "text/csv")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["mode"] == "stream"
+    assert len(data["chunks"]) == 3
+    assert [chunk["rows"] for chunk in data["chunks"]] == [10, 10, 5]
+    assert data["rows_inserted"] == 24
+    assert data["rows_rejected"] == 1
+    assert data["summary"]["total_rows"] == 25
+
+
+def test_upload_stream_with_failed_chunk_can_be_retried(monkeypatch):
+    """test a stream upload that lost a chunk isn't recorded, so sending it again fills the gap"""
+    from app.services import sales_service
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_stream_retry@example.com", "password": "testpass123"}
+    )
+    headers = {"Authorization": f"Bearer {register_response.json()['access_token']}"}
+    rows = [f"2022-06-{(i % 28) + 1:02d},{40 + i}.25,Garden,{i + 1}" for i in range(20)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    
+    insert = sales_service.bulk_insert_sales
+    calls = []
+    
+    def flaky_insert(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return insert(*args, **kwargs)
+    
+    monkeypatch.setattr(sales_service, "bulk_insert_sales", flaky_insert)
+    response = client.post(
+        "/upload/csv?stream=true&chunk_size=10",
+        headers=headers,
+        files={"file": ("june.csv", csv_content, "text/csv")}
+    )
+    data = response.json()
+    assert data["rows_inserted"] == 10
+    assert "error" in data["chunks"][1]
+    assert "could not be inserted" in data["message"]
+    
+    monkeypatch.setattr(sales_service, "bulk_insert_sales", insert)
+    response = client.post(
+        "/upload/csv?stream=true&chunk_size=10",
+        headers=headers,
+        files={"file": ("june.csv", csv_content, "text/csv")}
+    )
+    data = response.json()
+    assert "skipped" not in data
+    assert data["rows_inserted"] == 10
+    assert data["rows_duplicate"] == 10
+    
+    # now it's all in, the next identical upload is skipped
+    response = client.post(
+        "/upload/csv?stream=true&chunk_size=10",
+        headers=headers,
+        files={"file": ("june.csv", csv_content, "text/csv")}
+    )
+    assert response.json()["skipped"] is True
+
+
+def test_upload_too_large_refused_before_hashing(monkeypatch):
+    """test an oversized in-memory upload is refused without reading it"""
+    from app.routers import upload
+    from app.services import ingest_service
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_too_large@example.com", "password": "testpass123"}
+    )
+    headers = {"Authorization": f"Bearer {register_response.json()['access_token']}"}
+    
+    hashed = []
+    monkeypatch.setattr(upload, "MAX_UPLOAD_BYTES", 50)
+    monkeypatch.setattr(ingest_service, "fingerprint_file", lambda fileobj: hashed.append(1))
+    csv_content = "date,amount,category,customerID\n" + "2021-01-01,1,Toys,1\n" * 10
+    response = client.post("/upload/csv", headers=headers, files={"file": ("big.csv", csv_content, "text/csv")})
+    assert response.status_code == 400
+    assert "exceeds" in response.json()["detail"]
+    assert hashed == []
+
+
+def test_upload_csv_bulk_insert_counts():
+    """test that invalid rows are skipped and counted by the bulk insert path"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_bulk@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    
+    csv_content = (
+        "date,amount,category,customerID\n"
+        "2024-01-01,100.50,Electronics,1\n"
+        "2024-01-02,250.75,Clothing,2\n"
+        "2024-01-03,-10,Clothing,3\n"
+        "2024-01-04,20,Food,0\n"
+    )
+    response = client.post(
+        "/upload/csv",
+        headers={"Authorization": f"Bearer {token}"},
+        files={"file": ("sales.csv", csv_content, "text/csv")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_inserted"] == 2
+    assert data["rows_rejected"] == 2
+
+
+def test_upload_csv_background_job():
+    """test background upload returns a job id and the job can be polled to completion"""
+    import time
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_jobs@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    rows = [f"2024-03-{(i % 28) + 1:02d},{5 + i},Books,{i + 1}" for i in range(30)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    
+    response = client.post(
+        "/upload/csv?background=true&chunk_size=10",
+        headers=headers,
+        files={"file": ("nightly.csv", csv_content, "text/csv")}
+    )
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    
+    # poll until the worker is done
+    for _ in range(100):
+        job = client.get(f"/upload/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.1)
+    
+    assert job["status"] == "completed"
+    assert job["rows_processed"] == 30
+    assert job["rows_inserted"] == 30
+    assert job["chunks_processed"] == 3
+    assert job["summary"]["total_rows"] == 30
+    
+    listed = client.get("/upload/jobs", headers=headers).json()["jobs"]
+    assert [j["job_id"] for j in listed] == [job_id]
+
+
+def test_upload_same_file_twice_is_idempotent():
+    """test that an identical file is skipped and overlapping rows are not duplicated"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_idempotent@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    first = "date,amount,category,customerID\n2023-05-01,11.11,Toys,501\n2023-05-02,22.22,Toys,502\n"
+    response = client.post("/upload/csv", headers=headers, files={"file": ("may.csv", first, "text/csv")})
+    assert response.json()["rows_inserted"] == 2
+    
+    # byte-identical file is skipped outright
+    response = client.post("/upload/csv", headers=headers, files={"file": ("may_copy.csv", first, "text/csv")})
+    data = response.json()
+    assert data["skipped"] is True
+    assert data["previous_upload"]["filename"] == "may.csv"
+    
+    # overlapping export: one old row (with different formatting) and one new row
+    overlapping = "date,amount,category,customerID\n2023-05-02,22.220,Toys,502\n2023-05-03,33.33,Toys,503\n"
+    response = client.post("/upload/csv", headers=headers, files={"file": ("may_2.csv", overlapping, "text/csv")})
+    data = response.json()
+    assert data["rows_inserted"] == 1
+    assert data["rows_duplicate"] == 1
+
+
+def test_upload_parquet_stream_by_row_group():
+    """test that a typed parquet file streams through the same pipeline as csv"""
+    import io
+    import datetime
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_parquet@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    table = pa.table({
+        "date": pa.array([datetime.date(2022, 2, (i % 28) + 1) for i in range(25)], type=pa.date32()),
+        "amount": pa.array([float(i) - 1 for i in range(25)]),
+        "category": pa.array(["Garden"] * 25),
+        "customerID": pa.array([i + 1 for i in range(25)], type=pa.int64()),
+    })
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=10)
+    
+    response = client.post(
+        "/upload/csv?stream=true&chunk_size=10",
+        headers=headers,
+        files={"file": ("warehouse.parquet", buffer.getvalue(), "application/octet-stream")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_inserted"] == 24
+    assert data["rows_rejected"] == 1
+    assert [chunk["start_row"] for chunk in data["chunks"]] == [1, 11, 21]
+
+
+def test_upload_arrow_ipc_file():
+    """test arrow ipc uploads, and that the same rows from a csv dedupe against them"""
+    import io
+    import pyarrow as pa
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_arrow@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    table = pa.table({
+        "date": pa.array(["2022-03-01", "2022-03-02"]).cast(pa.timestamp("ms")),
+        "amount": pa.array([12.5, 30.0]),
+        "category": pa.array(["Garden", "Garden"]),
+        "customerID": pa.array([7, 8]),
+    })
+    sink = io.BytesIO()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    
+    response = client.post(
+        "/upload/csv",
+        headers=headers,
+        files={"file": ("warehouse.arrow", sink.getvalue(), "application/octet-stream")}
+    )
+    assert response.status_code == 200
+    assert response.json()["rows_inserted"] == 2
+    
+    csv_content = "date,amount,category,customerID\n2022-03-02,30,Garden,8\n"
+    response = client.post("/upload/csv", headers=headers, files={"file": ("march.csv", csv_content, "text/csv")})
+    assert response.json()["rows_duplicate"] == 1
+    
+    # a file that only has the right extension is rejected
+    response = client.post(
+        "/upload/csv",
+        headers=headers,
+        files={"file": ("broken.parquet", b"not really parquet", "application/octet-stream")}
+    )
+    assert response.status_code == 400
+
+
+def test_upload_compressed_csv():
+    """test gzip and zstd csv uploads, and that a decompression bomb is rejected"""
+    import gzip
+    import zstandard
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_compressed@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    rows = [f"2021-06-{(i % 28) + 1:02d},{3 + i},Music,{i + 1}" for i in range(40)]
+    csv_content = ("date,amount,category,customerID\n" + "\n".join(rows)).encode()
+    
+    response = client.post(
+        "/upload/csv",
+        headers=headers,
+        files={"file": ("june.csv.gz", gzip.compress(csv_content[:600]), "application/gzip")}
+    )
+    assert response.status_code == 200
+    first = response.json()["rows_inserted"]
+    assert first > 0
+    
+    response = client.post(
+        "/upload/csv?stream=true&chunk_size=10",
+        headers=headers,
+        files={"file": ("june.csv.zst", zstandard.compress(csv_content), "application/zstd")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_inserted"] + data["rows_duplicate"] == 40
+    assert data["rows_duplicate"] == first
+    
+    # ~100mb of repeated rows squeezes into a few hundred kb
+    bomb = gzip.compress(b"date,amount,category,customerID\n" + b"2021-06-01,1,Music,1\n" * 5_000_000)
+    response = client.post("/upload/csv", headers=headers, files={"file": ("bomb.csv.gz", bomb, "application/gzip")})
+    assert response.status_code == 400
+    assert "decompression bomb" in response.json()["detail"]
+    
+    # stream mode stops as soon as the guard trips, like any other mid-stream read error
+    response = client.post(
+        "/upload/csv?stream=true",
+        headers=headers,
+        files={"file": ("bomb_2.csv.gz", bomb, "application/gzip")}
+    )
+    assert "decompression bomb" in response.json()["aborted"]
+
+
+def test_upload_bad_encoding_is_a_read_error():
+    """test invalid utf-8 in a csv is reported like any other unreadable file, not a 500"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_encoding@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    rows = [f"2021-07-{(i % 28) + 1:02d},{3 + i},Music,{i + 1}".encode() for i in range(30)]
+    rows.append(b"2021-07-02,4,M\xfcsic,99")
+    csv_content = b"date,amount,category,customerID\n" + b"\n".join(rows)
+    
+    response = client.post("/upload/csv", headers=headers, files={"file": ("latin.csv", csv_content, "text/csv")})
+    assert response.status_code == 400
+    assert "error reading csv" in response.json()["detail"]
+    
+    # past the parser's first read buffer the bad byte only turns up mid-stream
+    rows = [f"2021-08-{(i % 28) + 1:02d},{3 + i},Music,{i + 1}".encode() for i in range(20000)]
+    rows.append(b"2021-08-02,4,M\xfcsic,99")
+    csv_content = b"date,amount,category,customerID\n" + b"\n".join(rows)
+    response = client.post(
+        "/upload/csv?stream=true&chunk_size=1000",
+        headers=headers,
+        files={"file": ("latin_2.csv", csv_content, "text/csv")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_inserted"] > 0
+    assert "error reading csv" in data["aborted"]
+
+
+def test_upload_batch_files_and_zip():
+    """test batch upload reports per file, including zip members and bad files"""
+    import io
+    import zipfile
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_batch@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    def daily(day):
+        rows = [f"2020-09-{day:02d},{10 + i},Outdoor,{i + 1}" for i in range(5)]
+        return "date,amount,category,customerID\n" + "\n".join(rows) + "\n"
+    
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("days/03.csv", daily(3))
+        zf.writestr("days/04.csv", daily(4))
+        zf.writestr("readme.txt", "not sales")
+    
+    response = client.post(
+        "/upload/batch",
+        headers=headers,
+        files=[
+            ("files", ("01.csv", daily(1), "text/csv")),
+            ("files", ("02.csv", daily(2), "text/csv")),
+            ("files", ("01_again.csv", daily(1), "text/csv")),
+            ("files", ("bad.csv", "foo,bar\n1,2\n", "text/csv")),
+            ("files", ("september.zip", archive.getvalue(), "application/zip")),
+        ]
+    )
+    assert response.status_code == 200
+    data = response.json()
+    statuses = {report["filename"]: report["status"] for report in data["files"]}
+    assert statuses == {
+        "01.csv": "inserted",
+        "02.csv": "inserted",
+        "01_again.csv": "skipped",
+        "bad.csv": "failed",
+        "september.zip/days/03.csv": "inserted",
+        "september.zip/days/04.csv": "inserted",
+        "september.zip/readme.txt": "failed",
+    }
+    assert data["totals"]["rows_inserted"] == 20
+    assert data["totals"]["files_failed"] == 2
+
+
+def test_upload_batch_limits_stop_staging_early(monkeypatch):
+    """test a batch over the file count or size limit is refused before the rest is staged"""
+    import io
+    import zipfile
+    from app.services import batch_service
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_batch_limits@example.com", "password": "testpass123"}
+    )
+    headers = {"Authorization": f"Bearer {register_response.json()['access_token']}"}
+    
+    copy = batch_service._copy_limited
+    copied = []
+    
+    def counting_copy(*args):
+        copied.append(1)
+        return copy(*args)
+    
+    monkeypatch.setattr(batch_service, "_copy_limited", counting_copy)
+    monkeypatch.setattr(batch_service, "MAX_BATCH_FILES", 3)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for day in range(1, 51):
+            zf.writestr(f"{day:02d}.csv", f"date,amount,category,customerID\n2020-10-{day % 28 + 1:02d},{day},Toys,1\n")
+    response = client.post(
+        "/upload/batch",
+        headers=headers,
+        files=[("files", ("october.zip", archive.getvalue(), "application/zip"))]
+    )
+    assert response.status_code == 413
+    assert "more than 3 files" in response.json()["detail"]
+    assert len(copied) == 3
+    
+    monkeypatch.setattr(batch_service, "MAX_BATCH_FILES", 100)
+    monkeypatch.setattr(batch_service, "MAX_BATCH_BYTES", 100)
+    day = "date,amount,category,customerID\n2020-10-01,5,Toys,1\n2020-10-02,6,Toys,2\n"
+    response = client.post(
+        "/upload/batch",
+        headers=headers,
+        files=[("files", ("a.csv", day, "text/csv")), ("files", ("b.csv", day, "text/csv"))]
+    )
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+
+
+def test_resumable_upload_session():
+    """test initiate, out-of-order and repeated parts, missing part check and complete"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_resumable@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    rows = [f"2019-11-{(i % 28) + 1:02d},{20 + i},Tools,{i + 1}" for i in range(30)]
+    content = ("date,amount,category,customerID\n" + "\n".join(rows) + "\n").encode()
+    # split mid-line on purpose, parts are just bytes
+    parts = [content[:200], content[200:450], content[450:]]
+    
+    response = client.post("/upload/sessions", headers=headers, json={"filename": "big.csv", "total_parts": 3})
+    assert response.status_code == 200
+    upload_id = response.json()["upload_id"]
+    
+    client.put(f"/upload/sessions/{upload_id}/parts/3", headers=headers, content=parts[2])
+    client.put(f"/upload/sessions/{upload_id}/parts/1", headers=headers, content=b"garbage")
+    
+    session = client.get(f"/upload/sessions/{upload_id}", headers=headers).json()
+    assert [part["part_number"] for part in session["parts"]] == [1, 3]
+    assert session["missing_parts"] == [2]
+    
+    response = client.post(f"/upload/sessions/{upload_id}/complete", headers=headers)
+    assert response.status_code == 400
+    assert "missing parts: 2" in response.json()["detail"]
+    
+    # resending a part replaces it
+    client.put(f"/upload/sessions/{upload_id}/parts/1", headers=headers, content=parts[0])
+    response = client.put(f"/upload/sessions/{upload_id}/parts/2", headers=headers, content=parts[1])
+    assert response.json()["size"] == len(parts[1])
+    
+    response = client.post(f"/upload/sessions/{upload_id}/complete?chunk_size=10", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["rows_inserted"] == 30
+    
+    session = client.get(f"/upload/sessions/{upload_id}", headers=headers).json()
+    assert session["status"] == "completed"
+    response = client.put(f"/upload/sessions/{upload_id}/parts/1", headers=headers, content=parts[0])
+    assert response.status_code == 409
+
+
+def test_upload_session_expires_on_inactivity():
+    """test a long upload that is still receiving parts isn't expired, an idle one is"""
+    from datetime import datetime, timedelta, timezone
+    from app.models import UploadSession
+    from app.services import upload_session_service
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_session_expiry@example.com", "password": "testpass123"}
+    )
+    headers = {"Authorization": f"Bearer {register_response.json()['access_token']}"}
+    
+    upload_id = client.post("/upload/sessions", headers=headers, json={"filename": "slow.csv"}).json()["upload_id"]
+    long_ago = datetime.now(timezone.utc) - timedelta(hours=upload_session_service.UPLOAD_SESSION_TTL_HOURS + 1)
+    db = TestingSessionLocal()
+    try:
+        db.get(UploadSession, upload_id).created_at = long_ago
+        db.get(UploadSession, upload_id).last_activity_at = long_ago
+        db.commit()
+        
+        # a part arriving now keeps the old session alive
+        client.put(f"/upload/sessions/{upload_id}/parts/1", headers=headers, content=b"date,amount\n")
+        db.expire_all()
+        upload_session_service.expire_stale_sessions(db)
+        assert db.get(UploadSession, upload_id).status == "open"
+        
+        db.get(UploadSession, upload_id).last_activity_at = long_ago
+        db.commit()
+        upload_session_service.expire_stale_sessions(db)
+        assert db.get(UploadSession, upload_id).status == "aborted"
+    finally:
+        db.close()
+
+
+def test_search_cursor_pagination():
+    """test following next_cursor walks every match once, newest first"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_cursor@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # two sales per day, so the id has to break ties inside a date
+    rows = [f"2019-03-{(i // 2) + 1:02d},{5 + i},Kites,{900 + i}" for i in range(25)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    response = client.post("/upload/csv", headers=headers, files={"file": ("kites.csv", csv_content, "text/csv")})
+    assert response.json()["rows_inserted"] == 25
+    
+    seen = []
+    params = {"category": "Kites", "limit": 10}
+    while True:
+        data = client.get("/sales/search", headers=headers, params=params).json()
+        assert data["total"] == 25
+        assert data["total_is_estimate"] is False
+        seen.extend((sale["date"], sale["id"]) for sale in data["results"])
+        if not data["has_more"]:
+            assert data["next_cursor"] is None
+            break
+        params = {"category": "Kites", "limit": 10, "after": data["next_cursor"]}
+    
+    assert len(seen) == 25
+    assert seen == sorted(seen, reverse=True)
+    
+    # offset pages agree with the cursor pages
+    data = client.get("/sales/search", headers=headers, params={"category": "Kites", "limit": 10, "offset": 10}).json()
+    assert [(sale["date"], sale["id"]) for sale in data["results"]] == seen[10:20]
+    
+    # filters the rollup can't count fall back to counting on sqlite
+    data = client.get("/sales/search", headers=headers, params={"category": "Kites", "min_amount": 20}).json()
+    assert data["total"] == 10
+    
+    response = client.get("/sales/search", headers=headers, params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+    response = client.get("/sales/search", headers=headers, params={"after": data["results"][0]["id"], "offset": 5})
+    assert response.status_code == 400
+
+
+def test_export_streams_csv():
+    """test the export is written in batches and keeps every filtered row"""
+    import csv
+    import io
+    from app.models import Category
+    from app.services import export_service
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_export@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    rows = [f"2018-07-{(i % 28) + 1:02d},{10 + i}.5,Lanterns,{1200 + i}" for i in range(57)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    response = client.post("/upload/csv", headers=headers, files={"file": ("lanterns.csv", csv_content, "text/csv")})
+    assert response.json()["rows_inserted"] == 57
+    
+    chunks = list(export_service.stream_csv(
+        export_service.export_statement([Category.name == "Lanterns"]),
+        engine, batch_size=10
+    ))
+    # header, then one chunk per batch
+    assert len(chunks) == 1 + 6
+    
+    response = client.get("/sales/export", params={"category": "lanterns", "start_date": "2018-07-01", "end_date": "2018-07-31"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    exported = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(exported) == 57
+    assert list(exported[0]) == ["id", "date", "amount", "category", "customerID"]
+    assert exported[0]["date"] == "2018-07-28"
+    assert sorted(float(row["amount"]) for row in exported) == [10.5 + i for i in range(57)]
+    
+    response = client.get("/sales/export", params={"category": "no-such-category"})
+    assert response.status_code == 404
+
+
+def test_export_binary_formats():
+    """test parquet, arrow and ndjson exports keep dates and amounts typed"""
+    import io
+    import json
+    import datetime
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_export_formats@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    rows = [f"2017-02-{(i % 28) + 1:02d},{20 + i}.25,Sleds,{1400 + i}" for i in range(40)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    response = client.post("/upload/csv", headers=headers, files={"file": ("sleds.csv", csv_content, "text/csv")})
+    assert response.json()["rows_inserted"] == 40
+    params = {"category": "Sleds"}
+    
+    response = client.get("/sales/export", params={**params, "format": "parquet"})
+    assert response.status_code == 200
+    assert ".parquet" in response.headers["content-disposition"]
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 40
+    assert table.schema.field("date").type == pa.date32()
+    assert table.schema.field("amount").type == pa.float64()
+    assert table.column("date")[0].as_py() == datetime.date(2017, 2, 28)
+    
+    response = client.get("/sales/export", params={**params, "format": "arrow"})
+    arrow_table = ipc.open_stream(response.content).read_all()
+    assert arrow_table.equals(table)
+    
+    response = client.get("/sales/export", params={**params, "format": "ndjson"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 40
+    assert [
+        {**line, "date": datetime.date.fromisoformat(line["date"])} for line in lines
+    ] == table.to_pylist()
+    
+    response = client.get("/sales/export", params={**params, "format": "xlsx"})
+    assert response.status_code == 400
+
+
+def test_dashboard_bundle_matches_endpoints():
+    """test the dashboard bundle returns what the individual stats endpoints do"""
+    from datetime import date, timedelta
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_dashboard@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    today = date.today()
+    rows = [f"{today - timedelta(days=i)},{100 + i * 3},Lanterns,{1300 + i % 4}" for i in range(20)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    response = client.post("/upload/csv", headers=headers, files={"file": ("lanterns.csv", csv_content, "text/csv")})
+    assert response.json()["rows_inserted"] == 20
+    
+    data = client.get("/stats/dashboard", headers=headers, params={"range_days": 30, "top_k": 3}).json()
+    assert set(data) == {"revenue", "by_category", "customers", "anomalies", "anomalies_error"}
+    assert data["revenue"] == client.get("/stats/revenue", headers=headers, params={"range_days": 30}).json()
+    assert data["by_category"] == client.get("/stats/by-category", headers=headers).json()
+    assert data["customers"] == client.get("/stats/customers", headers=headers, params={"top_k": 3}).json()
+    assert data["anomalies"] == client.get("/stats/anomalies", headers=headers, params={"range_days": 30}).json()
+    assert data["anomalies_error"] is None
+    
+    # too little data for anomalies leaves the rest of the bundle alone
+    data = client.get("/stats/dashboard", headers=headers, params={"range_days": 3}).json()
+    assert 0 < len(data["revenue"]["data"]) < 7
+    assert data["anomalies"] is None
+    assert "insufficient data" in data["anomalies_error"]
+    
+    data = client.get("/stats/dashboard", headers=headers, params={"include_anomalies": "false"}).json()
+    assert data["anomalies"] is None and data["anomalies_error"] is None
+    assert client.get("/stats/dashboard").status_code == 403
+
+
+def test_stats_cache_hits_and_upload_invalidation():
+    """test repeated stats reads hit the cache and an upload shows up right away"""
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_stats_cache@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    before = client.get("/stats/by-category", headers=headers).json()
+    hits = client.get("/stats/cache", headers=headers).json()["hits"]
+    assert client.get("/stats/by-category", headers=headers).json() == before
+    assert client.get("/stats/cache", headers=headers).json()["hits"] == hits + 1
+    
+    csv_content = "date,amount,category,customerID\n2018-07-01,42.5,Hammocks,1401"
+    response = client.post("/upload/csv", headers=headers, files={"file": ("hammocks.csv", csv_content, "text/csv")})
+    assert response.json()["rows_inserted"] == 1
+    
+    after = client.get("/stats/by-category", headers=headers).json()
+    assert {"category": "Hammocks", "total": 42.5} == {
+        key: value for row in after["categories"] if row["category"] == "Hammocks"
+        for key, value in row.items() if key != "percentage"
+    }
+    assert after["total_revenue"] == pytest.approx(before["total_revenue"] + 42.5)
+
+
+def test_forecast_job_submit_and_poll():
+    """test a background forecast job finishes with the same shape as /stats/forecast"""
+    import time
+    from datetime import date, timedelta
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_forecast_job@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    today = date.today()
+    rows = [f"{today - timedelta(days=i)},{80 + (i % 7) * 5},Umbrellas,{1500 + i % 3}" for i in range(40)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    response = client.post("/upload/csv", headers=headers, files={"file": ("umbrellas.csv", csv_content, "text/csv")})
+    assert response.json()["rows_inserted"] == 40
+    
+    response = client.post("/stats/forecast/jobs", headers=headers, params={"period": 14, "engine": "prophet"})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    
+    deadline = time.monotonic() + 120
+    while True:
+        job = client.get(f"/stats/forecast/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("completed", "failed", "cancelled") or time.monotonic() > deadline:
+            break
+        time.sleep(0.2)
+    assert job["status"] == "completed", job["error"]
+    assert len(job["result"]["dates"]) == 14
+    assert set(job["result"]) == {"dates", "predicted", "lower", "upper", "engine"}
+    assert job["result"]["engine"] == "prophet"
+    
+    # the fitted model is reused by the synchronous endpoint
+    assert client.get("/stats/forecast", headers=headers, params={"period": 14, "engine": "prophet"}).json() == job["result"]
+    assert [listed["job_id"] for listed in client.get("/stats/forecast/jobs", headers=headers).json()["jobs"]] == [job_id]
+    
+    other = client.post("/auth/register", json={"email": "test_forecast_job2@example.com", "password": "testpass123"})
+    other_headers = {"Authorization": f"Bearer {other.json()['access_token']}"}
+    assert client.get(f"/stats/forecast/jobs/{job_id}", headers=other_headers).status_code == 404
+    assert client.delete(f"/stats/forecast/jobs/{job_id}", headers=other_headers).status_code == 404
+
+
+def test_forecast_by_category_endpoint():
+    """test every category with recent sales gets a forecast in one payload"""
+    from datetime import date, timedelta
+    register_response = client.post(
+        "/auth/register",
+        json={"email": "test_forecast_categories@example.com", "password": "testpass123"}
+    )
+    token = register_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    today = date.today()
+    rows = [f"{today - timedelta(days=i)},{60 + (i % 7) * 4},Teapots,{1600 + i % 5}" for i in range(30)]
+    rows += [f"{today - timedelta(days=i)},{90 + (i % 3) * 7},Kettles,{1700 + i % 5}" for i in range(30)]
+    csv_content = "date,amount,category,customerID\n" + "\n".join(rows)
+    response = client.post("/upload/csv", headers=headers, files={"file": ("kitchen.csv", csv_content, "text/csv")})
+    assert response.json()["rows_inserted"] == 60
+    
+    response = client.get("/stats/forecast/by-category", headers=headers, params={"period": 7, "engine": "prophet"})
+    assert response.status_code == 200
+    data = response.json()
+    by_name = {entry["category"]: entry for entry in data["categories"]}
+    for name in ("Teapots", "Kettles"):
+        assert by_name[name]["engine"] == "prophet"
+        assert len(by_name[name]["predicted"]) == 7
+    
+    # nothing changed, nothing is refit
+    again = client.get("/stats/forecast/by-category", headers=headers, params={"period": 7, "engine": "prophet"}).json()
+    assert again["fitted"] == 0
+    assert again["categories"] == data["categories"]
+    
+    response = client.get("/stats/forecast/by-category", headers=headers, params={"engine": "arima"})
+    assert response.status_code == 400
@@ -0,0 +1,48 @@
+import pandas as pd
+from app.services import validation_service
+
+
+def test_validate_reports_row_numbers_in_order():
+    """test type and range examples come back in row order with 1-based row numbers"""
+    df = pd.DataFrame({
+        "date": ["2024-01-01", "not a date", "2024-01-03", "01/04/2024"],
+        "amount": ["10.5", "abc", "-3", "7"],
+        "category": ["Electronics", " ", "Food", "Books"],
+        "customerID": ["1", "2", "x", "-4"],
+    })
+    warnings, errors = validation_service.validate_csv_data(df)
+    issues = {issue["type"]: issue for issue in warnings + errors}
+    
+    assert issues["type_errors"]["count"] == 3
+    assert [(e["row"], e["column"]) for e in issues["type_errors"]["examples"]] == [
+        (2, "amount"), (2, "category"), (3, "customerID")
+    ]
+    assert [e["row"] for e in issues["range_errors"]["examples"]] == [3, 4]
+    assert issues["range_errors"]["examples"][0]["value"] == -3.0
+    # mixed formats are fine, only the garbage value is flagged
+    assert issues["date_errors"]["count"] == 1
+    assert issues["date_errors"]["examples"] == [{"row": 2}]
+
+
+def test_validate_majority_bad_dates_is_error():
+    """test that more than 30% invalid dates blocks the data"""
+    df = pd.DataFrame({
+        "date": ["nope", "bad", "2024-01-01"],
+        "amount": [1, 2, 3],
+        "category": ["A", "B", "C"],
+        "customerID": [1, 2, 3],
+    })
+    warnings, errors = validation_service.validate_csv_data(df)
+    assert [error["type"] for error in errors] == ["date_errors"]
+    assert errors[0]["severity"] == "error"
+
+
+def test_validate_uses_index_for_chunk_row_numbers():
+    """test that chunks of a bigger file keep their original row numbers"""
+    df = pd.DataFrame(
+        {"date": ["2024-01-01", "2024-01-02"], "amount": [5, -1], "category": ["A", "B"], "customerID": [1, 2]},
+        index=[50000, 50001]
+    )
+    warnings, errors = validation_service.validate_csv_data(df)
+    assert warnings[0]["type"] == "range_errors"
+    assert warnings[0]["examples"][0]["row"] == 50002
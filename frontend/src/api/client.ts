@@ -1,5 +1,5 @@
 import axios from "axios";
-import { TransformPreviewResponse, InsightsRequest, InsightsResponse } from "../types";
+import { TransformPreviewResponse, InsightsRequest, InsightsResponse, ForecastJob, ForecastEngine, CategoryForecastResponse } from "../types";
 
 const API_BASE_URL = "http://localhost:8000";
 
@@ -32,9 +32,18 @@ export const uploadCSV = async (file: File) => {
   return response.data;
 };
 
-export const getRevenue = async (rangeDays: number = 30) => {
+export type Granularity = 'day' | 'week' | 'month' | 'quarter';
+
+export const getRevenue = async (rangeDays: number = 30, granularity: Granularity = 'day') => {
   const response = await apiClient.get('/stats/revenue', {
-    params: { range_days: rangeDays },
+    params: { range_days: rangeDays, granularity },
+  });
+  return response.data;
+};
+
+export const getDashboard = async (rangeDays: number = 30, includeAnomalies: boolean = true) => {
+  const response = await apiClient.get('/stats/dashboard', {
+    params: { range_days: rangeDays, include_anomalies: includeAnomalies },
   });
   return response.data;
 };
@@ -49,13 +58,40 @@ export const getCustomerStats = async () => {
   return response.data;
 };
 
-export const getForecast = async (period: number = 30) => {
+export const getForecast = async (period: number = 30, engine?: ForecastEngine) => {
   const response = await apiClient.get('/stats/forecast', {
-    params: { period },
+    params: { period, engine },
   });
   return response.data;
 };
 
+export const getForecastByCategory = async (
+  period: number = 30,
+  engine?: ForecastEngine
+): Promise<CategoryForecastResponse> => {
+  const response = await apiClient.get('/stats/forecast/by-category', {
+    params: { period, engine },
+  });
+  return response.data;
+};
+
+export const submitForecastJob = async (period: number = 30, engine?: ForecastEngine): Promise<ForecastJob> => {
+  const response = await apiClient.post('/stats/forecast/jobs', null, {
+    params: { period, engine },
+  });
+  return response.data;
+};
+
+export const getForecastJob = async (jobId: string): Promise<ForecastJob> => {
+  const response = await apiClient.get(`/stats/forecast/jobs/${jobId}`);
+  return response.data;
+};
+
+export const cancelForecastJob = async (jobId: string): Promise<ForecastJob> => {
+  const response = await apiClient.delete(`/stats/forecast/jobs/${jobId}`);
+  return response.data;
+};
+
 export const getAnomalies = async (rangeDays: number = 90) => {
   const response = await apiClient.get('/stats/anomalies', {
     params: { range_days: rangeDays },
@@ -73,6 +109,8 @@ export interface SearchSalesParams {
   max_amount?: number;
   limit?: number;
   offset?: number;
+  after?: string;
+  exact_total?: boolean;
 }
 
 export const searchSales = async (params: SearchSalesParams = {}) => {
@@ -80,7 +118,9 @@ export const searchSales = async (params: SearchSalesParams = {}) => {
   return response.data;
 };
 
-export const exportSales = async (params: SearchSalesParams = {}) => {
+export type ExportFormat = 'csv' | 'ndjson' | 'parquet' | 'arrow';
+
+export const exportSales = async (params: SearchSalesParams & { format?: ExportFormat } = {}) => {
   const response = await apiClient.get('/sales/export', {
     params,
     responseType: 'blob',
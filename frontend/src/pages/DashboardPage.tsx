@@ -1,11 +1,12 @@
 import { useState, useEffect, useMemo } from "react";
 import { DollarSign, TrendingUp, Users, Layers, Sparkles, AlertTriangle } from "lucide-react";
-import { getRevenue, getSalesByCategory, getCustomerStats, generateInsights, getAnomalies } from "../api/client";
+import { getDashboard, getAnomalies, generateInsights } from "../api/client";
 import {
     RevenueResponse, 
     CategoryResponse, 
     CustomerStatsResponse,
     AnomalyResponse,
+    DashboardResponse,
 } from "../types";
 import RevenueChart from "../components/RevenueChart";
 import CategoryChart from "../components/CategoryChart";
@@ -30,6 +31,8 @@ export default function DashboardPage() {
     const [insightsLoading, setInsightsLoading] = useState(false);
     const [showAnomalies, setShowAnomalies] = useState(false);
     const [anomalyData, setAnomalyData] = useState<AnomalyResponse | null>(null);
+    // range the loaded anomalies belong to, so toggling them back on can reuse them
+    const [anomalyRangeDays, setAnomalyRangeDays] = useState<number | null>(null);
     const [anomalyErrorShown, setAnomalyErrorShown] = useState(false);
     const [drawerOpen, setDrawerOpen] = useState(false);
     const [drawerFilterType, setDrawerFilterType] = useState<"date" | "category" | null>(null);
@@ -44,20 +47,34 @@ export default function DashboardPage() {
         return "Good evening";
     }, []);
 
+    const showAnomalyError = (message: string) => {
+        // Only show error once per toggle session
+        if (!anomalyErrorShown) {
+            showToast(message, 'error');
+            setAnomalyErrorShown(true);
+        }
+    };
+
     useEffect(() => {
         const fetchData = async () => {
             setLoading(true);
             
             try {
-                const [revenue, category, customers] = await Promise.all([
-                    getRevenue(rangeDays),
-                    getSalesByCategory(),
-                    getCustomerStats(),
-                ]);
+                // revenue, categories, customers (and anomalies if shown) come back in one request
+                const dashboard: DashboardResponse = await getDashboard(rangeDays, showAnomalies);
                 
-                setRevenueData(revenue);
-                setCategoryData(category);
-                setCustomerStats(customers);
+                setRevenueData(dashboard.revenue);
+                setCategoryData(dashboard.by_category);
+                setCustomerStats(dashboard.customers);
+                if (showAnomalies) {
+                    setAnomalyData(dashboard.anomalies);
+                    setAnomalyRangeDays(rangeDays);
+                    if (dashboard.anomalies_error) {
+                        showAnomalyError(dashboard.anomalies_error);
+                    } else {
+                        setAnomalyErrorShown(false); // Reset on success
+                    }
+                }
             } catch (err: any) {
                 showToast(err.response?.data?.detail || 'Failed to load dashboard data', 'error');
             } finally {
@@ -66,35 +83,35 @@ export default function DashboardPage() {
         };
 
         fetchData();
+        // eslint-disable-next-line react-hooks/exhaustive-deps
     }, [rangeDays, showToast]);
 
     useEffect(() => {
-        if (!showAnomalies || !revenueData) {
+        if (!showAnomalies) {
             // Reset error flag when anomalies are turned off
-            if (!showAnomalies) {
-                setAnomalyErrorShown(false);
-            }
+            setAnomalyErrorShown(false);
+            return;
+        }
+        // a load in flight picks them up itself or we come back once it's done
+        if (loading || anomalyRangeDays === rangeDays) {
             return;
         }
 
+        // turning anomalies on only fetches them, the rest of the dashboard stays as it is
         const fetchAnomalies = async () => {
             try {
-                const anomalies = await getAnomalies(rangeDays);
+                const anomalies: AnomalyResponse = await getAnomalies(rangeDays);
                 setAnomalyData(anomalies);
+                setAnomalyRangeDays(rangeDays);
                 setAnomalyErrorShown(false); // Reset on success
             } catch (err: any) {
-                const errorMessage = err.response?.data?.detail || 'Failed to load anomalies';
-                // Only show error once per toggle session
-                if (!anomalyErrorShown) {
-                    showToast(errorMessage, 'error');
-                    setAnomalyErrorShown(true);
-                }
+                showAnomalyError(err.response?.data?.detail || 'Failed to load anomalies');
             }
         };
 
         fetchAnomalies();
         // eslint-disable-next-line react-hooks/exhaustive-deps
-    }, [showAnomalies, rangeDays, revenueData]);
+    }, [showAnomalies, loading]);
 
     const handleDateClick = (date: string) => {
         setDrawerFilterType("date");
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { CalendarDays, TrendingUp } from 'lucide-react';
-import { getForecast } from '../api/client';
-import { ForecastResponse } from '../types';
+import { submitForecastJob, getForecastJob, cancelForecastJob } from '../api/client';
+import { ForecastResponse, ForecastJob } from '../types';
 import ForecastChart from '../components/ForecastChart';
 import { ChartSkeleton } from '../components/LoadingSkeleton';
 import { useToast } from '../contexts/ToastContext';
@@ -11,31 +11,58 @@ export default function ForecastPage() {
   const [loading, setLoading] = useState(true);
   const [period, setPeriod] = useState(30);
   const [forecastErrorShown, setForecastErrorShown] = useState(false);
+  const [job, setJob] = useState<ForecastJob | null>(null);
   const { showToast } = useToast();
 
   useEffect(() => {
+    let active = true;
+    let jobId: string | null = null;
+
+    const showError = (errorMessage: string) => {
+      // Only show error once per period change
+      if (!forecastErrorShown) {
+        showToast(errorMessage, 'error');
+        setForecastErrorShown(true);
+      }
+      setForecastData(null); // Clear data on error
+    };
+
     const fetchForecast = async () => {
       setLoading(true);
       setForecastErrorShown(false); // Reset error flag when period changes
 
       try {
-        const data = await getForecast(period);
-        setForecastData(data);
-        setForecastErrorShown(false); // Reset on success
-      } catch (err: any) {
-        const errorMessage = err.response?.data?.detail || 'Failed to load forecast';
-        // Only show error once per period change
-        if (!forecastErrorShown) {
-          showToast(errorMessage, 'error');
-          setForecastErrorShown(true);
+        // the model is fitted in the background, poll the job instead of holding a request open
+        let current = await submitForecastJob(period);
+        jobId = current.job_id;
+        while (active && (current.status === 'queued' || current.status === 'running')) {
+          setJob(current);
+          await new Promise((resolve) => setTimeout(resolve, 500));
+          current = await getForecastJob(current.job_id);
+        }
+        if (!active) return;
+        jobId = null;
+        setJob(current);
+
+        if (current.status === 'completed' && current.result) {
+          setForecastData(current.result);
+          setForecastErrorShown(false); // Reset on success
+        } else if (current.status === 'failed') {
+          showError(current.error || 'Failed to load forecast');
         }
-        setForecastData(null); // Clear data on error
+      } catch (err: any) {
+        if (active) showError(err.response?.data?.detail || 'Failed to load forecast');
       } finally {
-        setLoading(false);
+        if (active) setLoading(false);
       }
     };
 
     fetchForecast();
+    return () => {
+      // the period changed or the page closed, nobody wants this fit anymore
+      active = false;
+      if (jobId) cancelForecastJob(jobId).catch(() => undefined);
+    };
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [period]);
 
@@ -77,7 +104,9 @@ export default function ForecastPage() {
             <CalendarDays className="h-6 w-6" />
           </div>
           <div>
-            <h2 className="text-lg font-semibold">Prophet time-series model</h2>
+            <h2 className="text-lg font-semibold">
+              {forecastData?.engine === 'ets' ? 'Holt-Winters (ETS) model' : 'Prophet time-series model'}
+            </h2>
             <p className="text-sm text-muted-foreground">
               The shaded area indicates the 95% confidence interval based on historical revenue patterns.
             </p>
@@ -86,7 +115,15 @@ export default function ForecastPage() {
       </div>
 
       {loading ? (
-        <ChartSkeleton />
+        <div className="space-y-2">
+          {job && (
+            <p className="text-sm text-muted-foreground">
+              {job.status === 'queued' ? 'Waiting for a free model worker...' : 'Fitting the model...'}
+              {job.elapsed_seconds !== null && ` ${job.elapsed_seconds.toFixed(1)}s`}
+            </p>
+          )}
+          <ChartSkeleton />
+        </div>
       ) : forecastData ? (
         <div className="space-y-6">
           <div className="rounded-xl border bg-card p-6 shadow-sm">
@@ -65,11 +65,42 @@ export interface UploadResponse {
   summary?: ValidationSummary;
 }
 
+export type ForecastEngine = 'prophet' | 'ets' | 'auto';
+
 export interface ForecastResponse {
   dates: string[];
   predicted: number[];
   lower: number[];
   upper: number[];
+  engine: Exclude<ForecastEngine, 'auto'>;
+}
+
+export interface CategoryForecast extends Partial<ForecastResponse> {
+  category: string;
+  error?: string;
+}
+
+export interface CategoryForecastResponse {
+  period: number;
+  categories: CategoryForecast[];
+  fitted: number;
+  cached: number;
+}
+
+export type ForecastJobStatus = 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+
+export interface ForecastJob {
+  job_id: string;
+  status: ForecastJobStatus;
+  period: number;
+  engine: ForecastEngine | null;
+  cancel_requested: boolean;
+  elapsed_seconds: number | null;
+  result: ForecastResponse | null;
+  error: string | null;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
 }
 
 export interface AnomalyData {
@@ -84,6 +115,14 @@ export interface AnomalyResponse {
   anomalies: AnomalyData[];
 }
 
+export interface DashboardResponse {
+  revenue: RevenueResponse;
+  by_category: CategoryResponse;
+  customers: CustomerStatsResponse;
+  anomalies: AnomalyResponse | null;
+  anomalies_error: string | null;
+}
+
 export interface Sale {
   id: number;
   date: string;